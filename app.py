@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, send_file, send_from_directory, make_response, Response, stream_with_context
 import os
 import json
 from datetime import datetime, timedelta
@@ -6,21 +6,47 @@ from math import ceil
 import requests
 import io
 import xlsxwriter
+from jinja2 import meta as jinja_meta
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_accept_header
+from werkzeug.security import safe_join
 from functools import lru_cache, wraps
+from contextlib import contextmanager
 import threading
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
-import schedule
 import time
 import copy
 import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
 import random
 import traceback
+import bisect
+import heapq
+import sqlite3
+import socket
+import atexit
+from collections import Counter, OrderedDict, deque
+import hashlib
+import tempfile
+import shutil
+import csv
+import zlib
+import re
+import zipfile
+import mimetypes
 from urllib.parse import quote
 
+# Brotli необязателен: без него ответы и статика сжимаются только в gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Определение декоратора login_required для защиты административных маршрутов
 def login_required(f):
     @wraps(f)
@@ -43,7 +69,7 @@ SETTINGS_FILE = os.environ.get('SETTINGS_FILE', os.path.join(os.path.dirname(__f
 
 # Добавляем блокировку для безопасной работы с данными при конкурентном доступе
 data_lock = threading.Lock()
-settings_lock = threading.Lock()
+settings_lock = threading.RLock()
 
 # Создаем файл настроек, если он не существует
 if not os.path.exists(SETTINGS_FILE):
@@ -55,16 +81,195 @@ if not os.path.exists(SETTINGS_FILE):
                 "whatsapp_link": "https://chat.whatsapp.com/EIa4wkifsVQDttzjOKlOY3"
             }, f, ensure_ascii=False, indent=4)
 
+# Каталог и файлы с данными участников
+DATA_DIR = os.environ.get('DATA_DIR', 'data')
+PARTICIPANTS_FILE = os.environ.get('DATA_FILE', os.path.join(DATA_DIR, 'participants.json'))
+# Сведения о снимке участников: ревизия журнала, на которой он записан, и хэш содержимого
+PARTICIPANTS_META_FILE = os.path.splitext(PARTICIPANTS_FILE)[0] + '.meta.json'
+
+# Локальная база состояния (журнал изменений участников), общая для всех процессов сервера
+STATE_DB = os.path.join(DATA_DIR, 'state.db')
+state_db_local = threading.local()
+
 # Кэш для участников
 PARTICIPANTS_CACHE = None
 PARTICIPANTS_CACHE_TTL = 60  # 60 секунд
 
-# Кэш для настроек с временем жизни
+# Состояние кэша относительно журнала изменений
+participants_state = {
+    'revision': 0,                   # последняя применённая ревизия журнала
+    'latest': deque(maxlen=20),      # последние зарегистрированные участники (кольцевой буфер)
+    'sync_error': None,              # ошибка последней синхронизации с журналом, для /readyz
+    'tombstones': set()              # номера удаленных участников, еще не убранных из списка кэша
+}
+sync_lock = threading.Lock()
+
+# Прогрев воркера: загрузка участников (возможно, с Яндекс.Диска) идет в фоне,
+# балансировщик направляет запросы только после ответа 200 от /readyz
+warmup_state = {'status': 'pending', 'error': None, 'started_at': None, 'finished_at': None, 'thread': None}
+# Холодную загрузку выполняет один поток процесса (обычно прогрев), запросы,
+# пришедшие до ее окончания, ждут на блокировке и получают готовый кэш
+participants_load_lock = threading.RLock()
+
+# Сколько последних записей журнала изменений хранить для дельта-запросов
+CHANGES_RETENTION = 100000
+
+# Журнал событий для потока Server-Sent Events админки
+EVENTS_RETENTION = 10000
+EVENTS_POLL_INTERVAL = 1       # секунды между проверками журнала событий другими процессами
+EVENTS_HEARTBEAT_INTERVAL = 15 # секунды между служебными сообщениями для прокси
+EVENTS_STREAM_DURATION = 300   # секунды, после которых браузер переподключается с Last-Event-ID
+# Каждый поток событий занимает поток воркера gthread на все время соединения:
+# сверх EVENTS_MAX_STREAMS соединений процесс отвечает 503, и админка
+# переподключается через EVENTS_RETRY_AFTER секунд, а пока опрашивает дельту
+EVENTS_MAX_STREAMS = 4
+EVENTS_RETRY_AFTER = 10
+events_condition = threading.Condition()
+events_streams = {'active': 0, 'rejected': 0}
+
+# Индексы для постраничного вывода участников в админке (keyset-пагинация)
+participants_index = {
+    'by_ticket': {},         # номер участника -> участник
+    'tickets': [],           # отсортированные номера участников
+    'times': [],             # отсортированные пары (время регистрации, номер участника)
+    'genders': Counter(),    # количество участников по полу
+    'ages': [],              # отсортированные пары (возраст, номер участника)
+    'by_city': {},           # город -> множество номеров участников
+    'by_gender': {},         # пол -> множество номеров участников
+    'by_source': {}          # источник города (browser, ip, unknown) -> множество номеров
+}
+
+# Размер страницы таблицы участников
+ADMIN_PAGE_SIZE = 50
+ADMIN_MAX_PAGE_SIZE = 500
+
+# Сериализованные JSON-ответы админки по (ревизия, страница, фильтры) с ETag
+ADMIN_RESPONSE_CACHE_SIZE = 128
+BACKUP_STATUS_ETAG_TTL = 30  # секунды, на которые фиксируется текст "следующий бэкап через ..."
+admin_response_cache = OrderedDict()
+admin_response_cache_lock = threading.Lock()
+
+# Готовые страницы без данных посетителя (главная, успешная регистрация): тело,
+# ETag и сжатые варианты хранятся, пока не изменятся входные данные из настроек
+# или (при auto_reload шаблонов) файлы шаблонов страницы
+page_cache = {}
+page_cache_lock = threading.Lock()
+
+# Выгрузки участников отдаются клиенту частями
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_BATCH_SIZE = 1000  # участников, которые берутся из индекса за одну блокировку
+
+# Столбцы Excel-файлов: заголовок, ширина, тип значения и функция получения значения.
+# Типы: string - строка, number - число, datetime - дата и время, index - номер строки
+EXCEL_EXPORT_COLUMNS = [
+    {'header': 'Имя', 'width': 25, 'type': 'string', 'value': lambda p: p.get('full_name')},
+    {'header': 'Номер участника', 'width': 10, 'type': 'number', 'value': lambda p: p.get('ticket_number')},
+    {'header': 'Телефон', 'width': 20, 'type': 'string', 'value': lambda p: p.get('phone')},
+    {'header': 'Возраст', 'width': 10, 'type': 'number', 'value': lambda p: p.get('age')},
+    {'header': 'Пол', 'width': 15, 'type': 'string', 'value': lambda p: get_gender_label(p)},
+    {'header': 'Город', 'width': 20, 'type': 'string', 'value': lambda p: get_participant_city(p).capitalize()},
+    {'header': 'Регион', 'width': 20, 'type': 'string', 'value': lambda p: get_location_field(p, 'region').capitalize()},
+    {'header': 'Страна', 'width': 20, 'type': 'string', 'value': lambda p: get_location_field(p, 'country').capitalize()},
+    {'header': 'Время регистрации', 'width': 25, 'type': 'datetime', 'value': lambda p: p.get('registration_time')},
+    {'header': 'Координаты', 'width': 30, 'type': 'string', 'value': lambda p: get_coordinates_label(p)},
+    {'header': 'IP-адрес', 'width': 20, 'type': 'string', 'value': lambda p: p.get('ip_address')}
+]
+
+# Форматы ячеек Excel по типам столбцов
+EXCEL_TYPE_FORMATS = {
+    'string': {'border': 1},
+    'number': {'border': 1},
+    'index': {'border': 1},
+    'datetime': {'border': 1, 'num_format': 'dd.mm.yyyy hh:mm:ss'}
+}
+
+# Столбцы Excel-файлов резервных копий: ручной и плановой
+BACKUP_EXCEL_COLUMNS = [
+    {'header': '№', 'width': 5, 'type': 'index'},
+    {'header': 'Номер участника', 'width': 15, 'type': 'number', 'value': lambda p: p.get('ticket_number')},
+    {'header': 'ФИО', 'width': 25, 'type': 'string', 'value': lambda p: p.get('full_name')},
+    {'header': 'Телефон', 'width': 15, 'type': 'string', 'value': lambda p: p.get('phone')},
+    {'header': 'Возраст', 'width': 8, 'type': 'number', 'value': lambda p: p.get('age')},
+    {'header': 'Пол', 'width': 10, 'type': 'string', 'value': lambda p: get_gender_label(p)},
+    {'header': 'Город', 'width': 15, 'type': 'string', 'value': lambda p: get_participant_city(p)},
+    {'header': 'Дата регистрации', 'width': 20, 'type': 'datetime', 'value': lambda p: p.get('registration_time')},
+    {'header': 'IP-адрес', 'width': 15, 'type': 'string', 'value': lambda p: p.get('ip_address')}
+]
+FULL_BACKUP_EXCEL_COLUMNS = [
+    {'header': '№ участника', 'width': 12, 'type': 'number', 'value': lambda p: p.get('ticket_number')},
+    {'header': 'ФИО', 'width': 25, 'type': 'string', 'value': lambda p: p.get('full_name')},
+    {'header': 'Телефон', 'width': 15, 'type': 'string', 'value': lambda p: p.get('phone')},
+    {'header': 'Возраст', 'width': 8, 'type': 'number', 'value': lambda p: p.get('age')},
+    {'header': 'Пол', 'width': 10, 'type': 'string', 'value': lambda p: get_gender_label(p)},
+    {'header': 'Город', 'width': 15, 'type': 'string', 'value': lambda p: get_participant_city(p)},
+    {'header': 'Дата регистрации', 'width': 20, 'type': 'datetime', 'value': lambda p: p.get('registration_time')},
+    {'header': 'IP-адрес', 'width': 15, 'type': 'string', 'value': lambda p: p.get('ip_address')},
+    {'header': 'Координаты', 'width': 25, 'type': 'string', 'value': lambda p: get_coordinates_label(p)},
+    {'header': 'Источник города', 'width': 15, 'type': 'string',
+     'value': lambda p: {'browser': 'Браузер', 'ip': 'IP'}.get(get_location_source(p)[0], '')}
+]
+
+# Кэш готовых файлов выгрузок на диске по (ревизия, формат, фильтры, столбцы)
+EXPORT_CACHE_DIR = os.path.join(DATA_DIR, 'exports')
+EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+export_cache_lock = threading.Lock()
+
+# Фоновые задания выгрузок: сборка файлов в отдельных процессах, вне GIL процесса веб-сервера
+EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 1))
+EXPORT_JOB_MAX_PENDING = 10          # заданий в очереди одного процесса, сверх этого - 429
+EXPORT_JOB_TIMEOUT = 1800            # секунды ожидания задания синхронными вызовами (копии)
+EXPORT_DOWNLOAD_WAIT = 5             # секунды ожидания задания запросом скачивания, затем - 202 со ссылкой на задание
+EXPORT_JOB_RETENTION_DAYS = 7
+EXPORT_JOB_PROGRESS_INTERVAL = 0.5   # секунды между записями прогресса в базу
+export_jobs = {
+    'executor': None,    # пул процессов (создается при первом задании)
+    'partition_executor': None,  # пул для частей секционированных выгрузок
+    'futures': {},       # id задания -> Future в этом процессе
+    'current': None,     # id задания, которое выполняет этот процесс пула
+    'processed': 0,
+    'reported_at': 0
+}
+export_jobs_lock = threading.Lock()
+
+# Секционированная выгрузка в Excel: отдельная книга на город, день регистрации
+# или диапазон номеров, книги собираются параллельно и отдаются ZIP-архивом
+EXPORT_PARTITION_WORKERS = int(os.environ.get('EXPORT_PARTITION_WORKERS', os.cpu_count() or 1))
+EXPORT_PARTITION_SIZE = 50000        # участников в части при разбиении по номерам
+EXPORT_PARTITION_MIN_SIZE = 1000
+EXPORT_MAX_PARTITIONS = 1000
+EXPORT_PARTITION_MODES = ('city', 'date', 'tickets')
+
+# Столбцы выгрузки в CSV
+EXPORT_CSV_COLUMNS = [
+    'ticket_number', 'full_name', 'phone', 'age', 'gender', 'city', 'location_source',
+    'region', 'country', 'registration_time', 'latitude', 'longitude', 'ip_address'
+]
+
+# Предрасчитанные счетчики регистраций по минутам, часам и дням
+TIMESERIES_STEPS = {
+    'minute': (16, timedelta(minutes=1), '%Y-%m-%d %H:%M'),   # длина префикса времени, шаг, формат ключа
+    'hour': (13, timedelta(hours=1), '%Y-%m-%d %H'),
+    'day': (10, timedelta(days=1), '%Y-%m-%d')
+}
+TIMESERIES_RETENTION = {
+    'minute': timedelta(hours=48),   # поминутные счетчики старше 48 часов сворачиваются в часовые
+    'hour': timedelta(days=90),
+    'day': None
+}
+TIMESERIES_MAX_POINTS = 5000
+TIMESERIES_COMPACT_INTERVAL = 600  # секунды между фоновыми сжатиями
+timeseries_rollups = {step: {} for step in TIMESERIES_STEPS}
+timeseries_compactor = {'thread': None}
+
+# Кэш настроек: данные, их версия (поле _version, растет с каждой записью) и отпечаток
+# файла (inode, время изменения, размер), по которому замечается запись из другого процесса
 settings_cache = {
     'data': None,
-    'timestamp': 0
+    'version': 0,
+    'stat': None
 }
-SETTINGS_CACHE_TTL = 60  # 60 секунд
+# Функции, которые вызываются с новыми настройками после каждого их изменения
+settings_subscribers = []
 
 # Настройки для резервного копирования
 BACKUP_SETTINGS = {
@@ -76,45 +281,174 @@ BACKUP_SETTINGS = {
     'custom_unit': 'hours' # Единица измерения: seconds, minutes, hours, days, weeks
 }
 
-# Добавляем событие для сигнализации об изменении настроек планировщика
-scheduler_event = threading.Event()
+# Плановые копии: полный снимок, затем дельты (добавленные и удаленные участники)
+# до следующего снимка. Цепочки описываются в app:/backups/manifest.json
+BACKUP_FULL_SNAPSHOT_EVERY = 100               # дельт между полными снимками (backup_settings.full_every)
+BACKUP_FULL_SNAPSHOT_MAX_AGE = timedelta(days=1)
+BACKUP_MANIFEST_CHAINS = 10                    # цепочек (снимок и его дельты) в манифесте
+BACKUP_MANIFEST_PATH = 'app:/backups/manifest.json'
+BACKUP_MANUAL_FOLDER = '/kvdarit_avto35_backup'  # ручные копии send_backup_to_yadisk
+
+# Восстановление из копий: каталог файлов копий хранится в базе состояния
+RESTORE_DOWNLOAD_WORKERS = 4
+
+# Выгрузка файлов копий на Яндекс.Диск: файлы одной копии загружаются параллельно,
+# неудавшаяся загрузка повторяется с новой ссылкой (докачки API Диска не поддерживает)
+YADISK_UPLOAD_WORKERS = 4
+YADISK_UPLOAD_RETRIES = 3
+YADISK_UPLOAD_RETRY_DELAY = 2      # секунды, удваивается с каждой попыткой
+YADISK_UPLOAD_TIMEOUT = (10, 300)  # подключение и ожидание ответа, секунды
+
+# История запусков копий (таблица backup_runs): этапы, объем, исход и ошибка каждого запуска
+BACKUP_RUNS_RETENTION = 5000
+BACKUP_HISTORY_PAGE_SIZE = 50
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # для сбора метрик без сессии админа
+backup_run_local = threading.local()
+RESTORE_DIR = os.path.join(DATA_DIR, 'restore')
+
+# Планировщик: куча задач (срок, номер, имя, функция) и условие, на котором поток
+# ждет срока ближайшей задачи или изменения настроек
+scheduler_condition = threading.Condition()
+scheduler_jobs = []
+scheduler_state = {'seq': 0, 'settings_changed': False, 'leader': False, 'backup_settings': None, 'running': False}
+SCHEDULER_MAX_WAIT = 3600    # секунды, страховка от перевода системных часов
+BACKUP_JITTER_SECONDS = 30   # случайный сдвиг срока копии, не больше 10% периода
+BACKUP_RETRY_DELAY = 60      # секунды до повтора неудавшейся копии
+BACKUP_UNITS = ('seconds', 'minutes', 'hours', 'days', 'weeks')
+# Плановые задачи выполняет один процесс на развертывание - владелец аренды
+# в базе состояния; без продления аренду через SCHEDULER_LEASE_TTL забирает другой воркер
+SCHEDULER_LEASE_NAME = 'scheduler'
+SCHEDULER_LEASE_TTL = 300    # секунды
+SCHEDULER_LEASE_RENEW = 60   # период продления и попыток захвата аренды
+# Копии и запись хранилища идут в отдельных потоках: поток планировщика только
+# раздает задачи по срокам и продлевает аренду, поэтому долгая копия не задерживает
+# ни продление, ни запись хранилища после удалений
+SCHEDULER_JOB_POOLS = {'backup': 'backup', 'debounced-backup': 'backup', 'startup-backup': 'backup', 'store-sync': 'store'}
+scheduler_executors = {}
+# Копия после регистраций: выполняется, когда регистрации стихли на
+# BACKUP_DEBOUNCE_QUIET секунд, но не позже BACKUP_DEBOUNCE_MAX_DELAY после
+# первой несохраненной (backup_settings.debounce_quiet и debounce_max_delay).
+# Отметка и срок общие для всех воркеров (таблица meta базы состояния), копию
+# делает только владелец аренды планировщика: свои отметки он ставит в кучу
+# сразу, отметки других воркеров замечает не позже чем через BACKUP_DEBOUNCE_POLL
+BACKUP_DEBOUNCE_QUIET = 30
+BACKUP_DEBOUNCE_MAX_DELAY = 300
+BACKUP_DEBOUNCE_POLL = 5
+# Одновременно во всем развертывании идет не больше одной плановой копии
+BACKUP_RUN_LEASE_NAME = 'backup'
+BACKUP_RUN_LEASE_TTL = 1800
+# Локальный файл и participants.json на Яндекс.Диске после удалений переписываются
+# одной фоновой задачей: через STORE_SYNC_DELAY после последнего удаления,
+# но не позже STORE_SYNC_MAX_DELAY после первого
+STORE_SYNC_DELAY = 5
+STORE_SYNC_MAX_DELAY = 60
+store_sync_state = {'dirty_since': None, 'requests': 0, 'runs': 0, 'failed': 0, 'last_run': None}
+store_sync_lock = threading.Lock()
+backup_trigger = {'triggers': 0, 'coalesced': 0, 'runs': 0, 'busy': 0, 'failed': 0, 'last_run': None}
+backup_trigger_lock = threading.Lock()
+
+def get_settings_stat():
+    """Отпечаток файла настроек: при атомарной записи меняется inode, поэтому замена видна всегда"""
+    try:
+        stat = os.stat(SETTINGS_FILE)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    except OSError:
+        return None
+
+def read_settings_file():
+    """Настройки из файла; если файла нет или он поврежден - настройки по умолчанию"""
+    try:
+        with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {
+            "whatsapp_link": "https://chat.whatsapp.com/EIa4wkifsVQDttzjOKlOY3"
+        }
 
 def load_settings():
-    """Загрузка настроек из файла с кэшированием"""
-    global settings_cache
-    current_time = datetime.now().timestamp()
-    
-    # Если есть актуальные данные в кэше, возвращаем их
-    if settings_cache['data'] is not None and current_time - settings_cache['timestamp'] < SETTINGS_CACHE_TTL:
+    """Загрузка настроек: файл перечитывается, только если изменился его отпечаток.
+
+    Вместо времени жизни кэша - один os.stat на вызов, поэтому запись из
+    другого воркера видна сразу. Возвращаемый словарь общий для всех
+    потоков: изменять настройки нужно через update_settings.
+    """
+    stat = get_settings_stat()
+    if settings_cache['data'] is not None and stat == settings_cache['stat']:
         return settings_cache['data']
     
-    # Иначе загружаем из файла
     with settings_lock:
-        try:
-            with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-                # Обновляем кэш
-                settings_cache['data'] = settings
-                settings_cache['timestamp'] = current_time
-                return settings
-        except:
-            # В случае ошибки возвращаем настройки по умолчанию
-            default_settings = {
-                "whatsapp_link": "https://chat.whatsapp.com/EIa4wkifsVQDttzjOKlOY3"
-            }
-            settings_cache['data'] = default_settings
-            settings_cache['timestamp'] = current_time
-            return default_settings
+        if settings_cache['data'] is not None and stat == settings_cache['stat']:
+            return settings_cache['data']
+        changed = settings_cache['data'] is not None
+        settings = read_settings_file()
+        settings_cache.update(data=settings, version=settings.get('_version', 0), stat=stat)
+    
+    # Настройки изменил другой процесс - подписчики узнают об этом при первом чтении
+    if changed:
+        notify_settings_subscribers(settings)
+    return settings
 
-def save_settings(settings_data):
-    """Сохранение настроек в файл"""
-    with settings_lock:
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
+def write_settings_file(settings_data):
+    """Атомарная запись: временный файл в том же каталоге, fsync и os.replace"""
+    directory = os.path.dirname(os.path.abspath(SETTINGS_FILE))
+    fd, tmp_path = tempfile.mkstemp(prefix='.settings-', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
             json.dump(settings_data, f, ensure_ascii=False, indent=4)
-        
-        # Обновляем кэш
-        settings_cache['data'] = settings_data
-        settings_cache['timestamp'] = datetime.now().timestamp()
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(SETTINGS_FILE):
+            os.chmod(tmp_path, os.stat(SETTINGS_FILE).st_mode & 0o777)
+        os.replace(tmp_path, SETTINGS_FILE)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def update_settings(update, expected_version=None):
+    """Изменение настроек: update(settings) правит свежую копию из файла, результат записывается атомарно.
+
+    Чтение и запись идут под транзакцией BEGIN IMMEDIATE в базе состояния,
+    поэтому одновременные изменения из разных воркеров (например,
+    last_backup от планировщика и настройки из админки) не затирают друг
+    друга. С expected_version запись выполняется, только если версия в
+    файле не изменилась (compare-and-swap), иначе возвращается None.
+    Возвращает записанные настройки.
+    """
+    with settings_lock:
+        db = get_state_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            settings = read_settings_file()
+            version = settings.get('_version', 0)
+            if expected_version is not None and version != expected_version:
+                return None
+            update(settings)
+            settings['_version'] = version + 1
+            write_settings_file(settings)
+            settings_cache.update(data=settings, version=version + 1, stat=get_settings_stat())
+        finally:
+            db.execute('COMMIT')
+    notify_settings_subscribers(settings)
+    return settings
+
+def save_settings(settings_data, expected_version=None):
+    """Запись настроек целиком; False, если версия в файле не равна expected_version"""
+    def replace(settings):
+        settings.clear()
+        settings.update(settings_data)
+    return update_settings(replace, expected_version) is not None
+
+def subscribe_settings(callback):
+    """Подписка на изменение настроек: callback(settings) после записи в этом процессе или в другом"""
+    settings_subscribers.append(callback)
+
+def notify_settings_subscribers(settings):
+    for callback in list(settings_subscribers):
+        try:
+            callback(settings)
+        except Exception as e:
+            app.logger.error(f"Ошибка в подписчике на изменение настроек: {str(e)}")
 
 # Список допустимых городов и районов
 ALLOWED_CITIES = [
@@ -220,60 +554,63 @@ def get_location_from_coordinates(lat, lng):
 
 def load_participants(force_reload=False):
     """Загружает данные участников из файла JSON или с Яндекс.Диска"""
-    global PARTICIPANTS_CACHE
-    
-    # Если данные уже загружены и не требуется принудительная перезагрузка, возвращаем кэш
+    # Если данные уже загружены и не требуется принудительная перезагрузка,
+    # догоняем кэш по журналу изменений и возвращаем его
     if PARTICIPANTS_CACHE is not None and not force_reload:
+        sync_participants()
+        # Список отдается без удаленных участников: надгробия накопленных
+        # удалений сжимаются одним проходом при первом чтении после них
+        if participants_state['tombstones']:
+            with sync_lock:
+                compact_participants_cache()
         return PARTICIPANTS_CACHE
     
+    with participants_load_lock:
+        # Кэш уже загрузил поток, которого мы ждали
+        if PARTICIPANTS_CACHE is not None and not force_reload:
+            return load_participants()
+        return read_participants_store(force_reload)
+
+def read_participants_store(force_reload=False):
+    """Полная загрузка кэша из снимка (локального или с Яндекс.Диска) и журнала (под participants_load_lock)"""
+    global PARTICIPANTS_CACHE
+    
+    # Перед принудительной перезагрузкой отложенная запись хранилища выполняется
+    # сразу, чтобы снимок в файле и на Яндекс.Диске учитывал все удаления
+    if PARTICIPANTS_CACHE is not None:
+        run_store_sync()
+    
+    # Текущая ревизия журнала - на случай, если ревизия снимка неизвестна
+    current_revision = get_data_revision()
+    
     try:
         # Получаем токен Яндекс.Диска из настроек
         settings = load_settings()
         yandex_token = settings.get('backup_settings', {}).get('yandex_token')
         
-        participants = []
-        
-        # Сначала пробуем загрузить с Яндекс.Диска если есть токен
-        if yandex_token:
+        # Локальный снимок с известной ревизией уже учитывает все изменения до нее;
+        # иначе, как и раньше, сначала пробуем Яндекс.Диск, затем локальный файл
+        participants, revision = read_local_snapshot()
+        if revision is None and yandex_token:
             try:
-                # Проверяем существование файла
-                url = "https://cloud-api.yandex.net/v1/disk/resources"
-                headers = {"Authorization": f"OAuth {yandex_token}"}
-                params = {"path": "app:/participants.json"}
-                
-                file_check = requests.get(url, headers=headers, params=params)
-                
-                if file_check.status_code == 200:
-                    # URL файла на Яндекс.Диске для скачивания
-                    download_url = "https://cloud-api.yandex.net/v1/disk/resources/download"
-                    download_params = {"path": "app:/participants.json"}
-                    
-                    response = requests.get(download_url, headers=headers, params=download_params)
-                    
-                    if response.status_code == 200:
-                        # Получаем ссылку на скачивание
-                        download_link = response.json().get("href")
-                        
-                        # Скачиваем файл с данными с явным указанием UTF-8
-                        data_response = requests.get(
-                            download_link, 
-                            headers={'Accept-Charset': 'utf-8'}
-                        )
-                        
-                        if data_response.status_code == 200:
-                            # Устанавливаем кодировку UTF-8 для ответа
-                            data_response.encoding = 'utf-8'
-                            # Парсим JSON-данные
-                            participants = data_response.json()
-                            app.logger.info(f"Загружено {len(participants)} участников с Яндекс.Диска")
+                remote, remote_revision = download_yadisk_snapshot(yandex_token)
+                if remote or remote_revision is not None:
+                    participants, revision = remote, remote_revision
+                    app.logger.info(f"Загружено {len(participants)} участников с Яндекс.Диска")
             except Exception as e:
                 app.logger.error(f"Ошибка при загрузке с Яндекс.Диска: {str(e)}")
         
-        # Если не удалось загрузить с Яндекс.Диска или нет токена, пробуем локальный файл
-        if not participants and os.path.exists('data/participants.json'):
-            with open('data/participants.json', 'r', encoding='utf-8') as file:
-                participants = json.load(file)
-                app.logger.info(f"Загружено {len(participants)} участников из локального файла")
+        # Изменения после ревизии снимка применяются из журнала. Снимок без ревизии
+        # (старый файл, другая база состояния) или старше хранимого журнала
+        # считается актуальным на текущую ревизию
+        adopted = revision is None or not is_revision_replayable(revision, current_revision)
+        if adopted:
+            if PARTICIPANTS_CACHE is not None:
+                # Снимок неизвестной давности не заменяет прогретый кэш:
+                # удаления и регистрации после него были бы потеряны
+                app.logger.warning("Ревизия снимка участников неизвестна, перезагрузка пропущена")
+                return load_participants()
+            revision = current_revision
         
         # Проверяем и исправляем кодировку для всех текстовых полей
         for participant in participants:
@@ -305,15 +642,902 @@ def load_participants(force_reload=False):
                                     except:
                                         value[nested_key] = nested_value.encode('utf-8', errors='replace').decode('utf-8')
         
-        # Обновляем кэш и возвращаем данные
+        # Обновляем кэш, индексы и возвращаем данные
         PARTICIPANTS_CACHE = participants
-        return participants
-                
+        rebuild_participants_index(participants)
+        reset_participants_state(participants, revision)
+        sync_participants()
+        with sync_lock:
+            compact_participants_cache()
+            snapshot, snapshot_revision = list(PARTICIPANTS_CACHE), participants_state['revision']
+        
+        # Снимок без сведений записывается со своей ревизией: следующие холодные
+        # загрузки применят изменения после нее, даже если хранилище не успели переписать
+        if adopted:
+            try:
+                write_participants_file(snapshot, snapshot_revision)
+            except OSError as e:
+                app.logger.error(f"Ошибка при записи снимка участников: {str(e)}")
+        return PARTICIPANTS_CACHE
+
     except Exception as e:
         app.logger.error(f"Ошибка при загрузке данных участников: {str(e)}")
+        if PARTICIPANTS_CACHE is not None:
+            return load_participants()
         PARTICIPANTS_CACHE = []
+        rebuild_participants_index([])
+        reset_participants_state([], current_revision)
         return []
 
+def get_state_db():
+    """Соединение с локальной базой состояния (своё для каждого потока)"""
+    conn = getattr(state_db_local, 'conn', None)
+    if conn is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        conn = sqlite3.connect(STATE_DB, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute("""CREATE TABLE IF NOT EXISTS changes (
+            revision INTEGER PRIMARY KEY AUTOINCREMENT,
+            op TEXT NOT NULL,
+            ticket_number INTEGER,
+            payload TEXT,
+            created_at TEXT NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            created_at TEXT NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            processed INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            path TEXT,
+            size INTEGER,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS backups (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            base_revision INTEGER,
+            path TEXT NOT NULL,
+            excel_path TEXT,
+            sha256 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            records INTEGER NOT NULL,
+            removed INTEGER NOT NULL DEFAULT 0,
+            previous TEXT,
+            created_at TEXT NOT NULL,
+            content_sha256 TEXT
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS backup_catalog (
+            path TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            type TEXT NOT NULL,
+            chain TEXT,
+            revision INTEGER,
+            base_revision INTEGER,
+            sha256 TEXT,
+            md5 TEXT,
+            size INTEGER,
+            created_at TEXT NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS backup_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            trigger TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            type TEXT,
+            revision INTEGER,
+            records INTEGER,
+            removed INTEGER,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            timings TEXT NOT NULL,
+            error TEXT,
+            pid INTEGER NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            renewed_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS export_artifacts (
+            cache_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            revision INTEGER NOT NULL,
+            last_ticket INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            last_used REAL NOT NULL
+        )""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )""")
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('state_id', ?)", (os.urandom(16).hex(),))
+        state_db_local.conn = conn
+    return conn
+
+def get_data_revision():
+    """Текущая ревизия данных участников (последняя запись журнала изменений)"""
+    try:
+        row = get_state_db().execute('SELECT MAX(revision) FROM changes').fetchone()
+        return row[0] or 0
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при чтении журнала изменений: {str(e)}")
+        return participants_state['revision']
+
+def get_state_id():
+    """Идентификатор базы состояния: ревизии снимков имеют смысл только для журнала этой базы"""
+    row = get_state_db().execute("SELECT value FROM meta WHERE key = 'state_id'").fetchone()
+    return row[0]
+
+def is_revision_replayable(revision, current_revision):
+    """Журнал хранит все изменения после ревизии - их можно применить к снимку"""
+    if revision > current_revision:
+        return False
+    oldest = get_state_db().execute('SELECT MIN(revision) FROM changes').fetchone()[0]
+    return oldest is None or revision >= oldest - 1
+
+def get_snapshot_meta(data, revision):
+    """Сведения о снимке участников: ревизия журнала, база состояния и хэш содержимого"""
+    return {'revision': revision, 'state_id': get_state_id(), 'sha256': hashlib.sha256(data).hexdigest()}
+
+def get_snapshot_revision(data, meta):
+    """Ревизия, на которой записан снимок, или None, если сведения не от этой базы или от другого содержимого"""
+    if not isinstance(meta, dict) or meta.get('state_id') != get_state_id():
+        return None
+    if meta.get('sha256') != hashlib.sha256(data).hexdigest() or not isinstance(meta.get('revision'), int):
+        return None
+    return meta['revision']
+
+def read_local_snapshot():
+    """Участники из локального файла и ревизия снимка (None, если неизвестна)"""
+    if not os.path.exists(PARTICIPANTS_FILE):
+        return [], None
+    with open(PARTICIPANTS_FILE, 'rb') as file:
+        data = file.read()
+    participants = json.loads(data.decode('utf-8'))
+    app.logger.info(f"Загружено {len(participants)} участников из локального файла")
+    try:
+        with open(PARTICIPANTS_META_FILE, 'r', encoding='utf-8') as file:
+            return participants, get_snapshot_revision(data, json.load(file))
+    except (OSError, ValueError):
+        return participants, None
+
+def download_yadisk_snapshot(token):
+    """Участники с Яндекс.Диска и ревизия снимка (None, если неизвестна)"""
+    headers = {"Authorization": f"OAuth {token}"}
+    download_link = get_yadisk_download_link(headers, "app:/participants.json")
+    if not download_link:
+        return [], None
+    data_response = requests.get(download_link, headers={'Accept-Charset': 'utf-8'})
+    if data_response.status_code != 200:
+        raise RuntimeError(f"Ошибка при скачивании данных участников: {data_response.status_code}")
+    data = data_response.content
+    participants = json.loads(data.decode('utf-8'))
+    
+    try:
+        meta_link = get_yadisk_download_link(headers, "app:/participants.meta.json")
+        meta_response = requests.get(meta_link) if meta_link else None
+        if meta_response is not None and meta_response.status_code == 200:
+            return participants, get_snapshot_revision(data, meta_response.json())
+    except (requests.RequestException, RuntimeError, ValueError) as e:
+        app.logger.error(f"Ошибка при загрузке сведений о снимке с Яндекс.Диска: {str(e)}")
+    return participants, None
+
+@contextmanager
+def participants_store_lock():
+    """Межпроцессная блокировка записи хранилища: транзакция BEGIN IMMEDIATE в базе состояния.
+
+    Под ней пишутся локальный файл участников и запись журнала, поэтому
+    регистрация в другом воркере не вклинится между ними при восстановлении.
+    """
+    db = get_state_db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    finally:
+        db.execute('COMMIT')
+
+def record_change(op, ticket_number=None, participant=None):
+    """Запись изменения участников в журнал: added, deleted, cleared или restored (participant - весь список)"""
+    try:
+        payload = json.dumps(participant, ensure_ascii=False) if participant is not None else None
+        db = get_state_db()
+        cursor = db.execute(
+            'INSERT INTO changes (op, ticket_number, payload, created_at) VALUES (?, ?, ?, ?)',
+            (op, ticket_number, payload, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        revision = cursor.lastrowid
+        
+        # Периодически удаляем старые записи журнала
+        if revision % 1000 == 0:
+            db.execute('DELETE FROM changes WHERE revision <= ?', (revision - CHANGES_RETENTION,))
+        
+        # Свои изменения уже применены к кэшу, догоняем только чужие
+        sync_participants()
+        return revision
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при записи в журнал изменений: {str(e)}")
+        return None
+
+def record_deletions(tickets):
+    """Записи deleted (надгробия) для нескольких участников одной транзакцией; возвращает последнюю ревизию"""
+    try:
+        db = get_state_db()
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for ticket_number in tickets:
+                revision = db.execute(
+                    'INSERT INTO changes (op, ticket_number, payload, created_at) VALUES (?, ?, ?, ?)',
+                    ('deleted', ticket_number, None, created_at)
+                ).lastrowid
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        
+        if revision // 1000 != (revision - len(tickets)) // 1000:
+            db.execute('DELETE FROM changes WHERE revision <= ?', (revision - CHANGES_RETENTION,))
+        
+        # Индексы обновляются при применении своих же записей из журнала
+        sync_participants()
+        return revision
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при записи удалений в журнал изменений: {str(e)}")
+        return None
+
+def publish_event(event_type, data):
+    """Публикация события для потока /admin/events во всех процессах сервера"""
+    try:
+        db = get_state_db()
+        cursor = db.execute(
+            'INSERT INTO events (type, data, created_at) VALUES (?, ?, ?)',
+            (event_type, json.dumps(data, ensure_ascii=False), datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+        event_id = cursor.lastrowid
+        if event_id % 1000 == 0:
+            db.execute('DELETE FROM events WHERE id <= ?', (event_id - EVENTS_RETENTION,))
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при публикации события {event_type}: {str(e)}")
+        return None
+    
+    # Потоки этого процесса просыпаются сразу, остальные процессы увидят событие при следующей проверке
+    with events_condition:
+        events_condition.notify_all()
+    return event_id
+
+def publish_participant_events(event_type, participant, revision):
+    """События registered/deleted и изменение статистики для одного участника"""
+    sign = 1 if event_type == 'registered' else -1
+    publish_event(event_type, {
+        'revision': revision,
+        'ticket_number': participant.get('ticket_number'),
+        'participant': participant if sign > 0 else None
+    })
+    publish_event('stats', {
+        'total': sign,
+        'male': sign if participant.get('gender') == 'male' else 0,
+        'female': sign if participant.get('gender') == 'female' else 0
+    })
+
+def read_events_since(last_id):
+    """События после указанного идентификатора (None - если они уже удалены из журнала)"""
+    db = get_state_db()
+    oldest = db.execute('SELECT MIN(id) FROM events').fetchone()[0]
+    if oldest is not None and last_id < oldest - 1:
+        return None
+    return db.execute(
+        'SELECT id, type, data FROM events WHERE id > ? ORDER BY id LIMIT 500', (last_id,)
+    ).fetchall()
+
+def get_last_event_id():
+    """Идентификатор последнего опубликованного события"""
+    row = get_state_db().execute('SELECT MAX(id) FROM events').fetchone()
+    return row[0] or 0
+
+def get_latest_participants(participants):
+    """Последние зарегистрированные участники для буфера latest (от старых к новым)"""
+    latest = heapq.nlargest(
+        participants_state['latest'].maxlen, participants,
+        key=lambda p: (str(p.get('registration_time', '')), get_ticket_key(p))
+    )
+    return list(reversed(latest))
+
+def reset_participants_state(participants, revision):
+    """Сброс ревизии и буфера последних участников после полной загрузки"""
+    latest = get_latest_participants(participants)
+    with sync_lock:
+        participants_state['revision'] = revision
+        participants_state['tombstones'].clear()
+        participants_state['latest'].clear()
+        participants_state['latest'].extend(latest)
+
+def apply_change(op, ticket_number, participant):
+    """Применение одной записи журнала к кэшу участников (повторное применение безопасно)"""
+    global PARTICIPANTS_CACHE
+    latest = participants_state['latest']
+    
+    if op == 'added':
+        if ticket_number not in participants_index['by_ticket']:
+            # Номер удаленного участника занят снова - надгробие нужно снять до добавления
+            if ticket_number in participants_state['tombstones']:
+                compact_participants_cache()
+            PARTICIPANTS_CACHE.append(participant)
+            index_participant(participant)
+            latest.append(participant)
+    elif op == 'deleted':
+        participant = participants_index['by_ticket'].get(ticket_number)
+        if participant is not None:
+            # Из индексов участник убирается сразу, из списка - при сжатии по надгробиям
+            unindex_participant(participant)
+            participants_state['tombstones'].add(ticket_number)
+            for p in [p for p in latest if get_ticket_key(p) == ticket_number]:
+                latest.remove(p)
+    elif op == 'cleared':
+        PARTICIPANTS_CACHE[:] = []
+        participants_state['tombstones'].clear()
+        rebuild_participants_index(PARTICIPANTS_CACHE)
+        latest.clear()
+    elif op == 'restored':
+        # Хранилище заменено восстановленной копией: участники берутся из самой
+        # записи журнала, а не из рабочего файла, который мог переписать другой воркер
+        PARTICIPANTS_CACHE[:] = participant
+        participants_state['tombstones'].clear()
+        rebuild_participants_index(PARTICIPANTS_CACHE)
+        latest.clear()
+        latest.extend(get_latest_participants(PARTICIPANTS_CACHE))
+
+def compact_participants_cache():
+    """Удаление участников по надгробиям из списка кэша (вызывается под sync_lock).
+
+    Один проход по списку на любое число удалений; индексы уже обновлены
+    при применении записей deleted и не перестраиваются.
+    """
+    tombstones = participants_state['tombstones']
+    if tombstones:
+        PARTICIPANTS_CACHE[:] = [p for p in PARTICIPANTS_CACHE if get_ticket_key(p) not in tombstones]
+        tombstones.clear()
+
+def sync_participants():
+    """Догоняет кэш по журналу изменений: стоимость O(число новых изменений)"""
+    if PARTICIPANTS_CACHE is None:
+        return
+    try:
+        # Соединение открывается до sync_lock: первое подключение потока создает
+        # таблицы и ждет записи, которую может держать participants_store_lock
+        db = get_state_db()
+        with sync_lock:
+            rows = db.execute(
+                'SELECT revision, op, ticket_number, payload FROM changes WHERE revision > ? ORDER BY revision',
+                (participants_state['revision'],)
+            ).fetchall()
+            for revision, op, ticket_number, payload in rows:
+                apply_change(op, ticket_number, json.loads(payload) if payload else None)
+                participants_state['revision'] = revision
+        participants_state['sync_error'] = None
+    except sqlite3.Error as e:
+        participants_state['sync_error'] = str(e)
+        app.logger.error(f"Ошибка при синхронизации с журналом изменений: {str(e)}")
+
+def get_changes_since(since, until=None):
+    """Участники, добавленные и удалённые после указанной ревизии (до until включительно).
+
+    Возвращает None, если ревизия старше хранимого журнала или журнал был
+    очищен или восстановлен из копии - тогда клиенту нужна полная перезагрузка данных.
+    """
+    if until is None:
+        until = participants_state['revision']
+    db = get_state_db()
+    oldest = db.execute('SELECT MIN(revision) FROM changes').fetchone()[0]
+    if since > until or (oldest is not None and since < oldest - 1):
+        return None
+    
+    added = {}
+    removed = set()
+    rows = db.execute(
+        'SELECT op, ticket_number, payload FROM changes WHERE revision > ? AND revision <= ? ORDER BY revision',
+        (since, until)
+    ).fetchall()
+    for op, ticket_number, payload in rows:
+        if op in ('cleared', 'restored'):
+            return None
+        if op == 'added':
+            added[ticket_number] = json.loads(payload)
+            removed.discard(ticket_number)
+        elif op == 'deleted':
+            if added.pop(ticket_number, None) is None:
+                removed.add(ticket_number)
+    return {'added': list(added.values()), 'removed': sorted(removed)}
+
+def get_ticket_key(participant):
+    """Числовой номер участника для индексов"""
+    ticket_number = participant.get('ticket_number', 0)
+    try:
+        return int(ticket_number)
+    except (TypeError, ValueError):
+        return 0
+
+def get_age_key(participant):
+    """Возраст участника для индексов (-1, если не указан)"""
+    try:
+        return int(participant.get('age'))
+    except (TypeError, ValueError):
+        return -1
+
+def get_sort_key(sort, participant):
+    """Ключ сортировки участника: номер, (время, номер) или (возраст, номер)"""
+    ticket = get_ticket_key(participant)
+    if sort == 'time':
+        return (str(participant.get('registration_time', '')), ticket)
+    if sort == 'age':
+        return (get_age_key(participant), ticket)
+    return ticket
+
+def add_to_value_indexes(participant, ticket):
+    """Учет участника во вторичных индексах по городу, полу и источнику (вызывается под data_lock)"""
+    source, city = get_location_source(participant)
+    participants_index['by_city'].setdefault(city, set()).add(ticket)
+    participants_index['by_gender'].setdefault(participant.get('gender'), set()).add(ticket)
+    participants_index['by_source'].setdefault(source or 'unknown', set()).add(ticket)
+
+def remove_from_value_indexes(participant, ticket):
+    """Удаление участника из вторичных индексов (вызывается под data_lock)"""
+    source, city = get_location_source(participant)
+    for index_name, value in (('by_city', city), ('by_gender', participant.get('gender')), ('by_source', source or 'unknown')):
+        tickets = participants_index[index_name].get(value)
+        if tickets is not None:
+            tickets.discard(ticket)
+            if not tickets:
+                del participants_index[index_name][value]
+
+def rebuild_participants_index(participants):
+    """Полное перестроение индексов участников"""
+    with data_lock:
+        participants_index['by_ticket'] = {get_ticket_key(p): p for p in participants}
+        participants_index['tickets'] = sorted(participants_index['by_ticket'])
+        participants_index['times'] = sorted(get_sort_key('time', p) for p in participants)
+        participants_index['ages'] = sorted(get_sort_key('age', p) for p in participants)
+        participants_index['genders'] = Counter(p.get('gender') for p in participants)
+        participants_index['by_city'] = {}
+        participants_index['by_gender'] = {}
+        participants_index['by_source'] = {}
+        for p in participants:
+            add_to_value_indexes(p, get_ticket_key(p))
+        
+        for rollup in timeseries_rollups.values():
+            rollup.clear()
+        for p in participants:
+            add_to_timeseries(p)
+        compact_timeseries()
+    start_timeseries_compactor()
+
+def index_participant(participant):
+    """Добавление нового участника в индексы без полного перестроения"""
+    ticket = get_ticket_key(participant)
+    with data_lock:
+        participants_index['by_ticket'][ticket] = participant
+        bisect.insort(participants_index['tickets'], ticket)
+        bisect.insort(participants_index['times'], get_sort_key('time', participant))
+        bisect.insort(participants_index['ages'], get_sort_key('age', participant))
+        participants_index['genders'][participant.get('gender')] += 1
+        add_to_value_indexes(participant, ticket)
+        add_to_timeseries(participant)
+
+def remove_from_sorted(values, value):
+    """Удаление значения из отсортированного списка двоичным поиском"""
+    i = bisect.bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        del values[i]
+
+def unindex_participant(participant):
+    """Удаление участника из индексов без полного перестроения"""
+    ticket = get_ticket_key(participant)
+    with data_lock:
+        if participants_index['by_ticket'].pop(ticket, None) is None:
+            return
+        remove_from_sorted(participants_index['tickets'], ticket)
+        remove_from_sorted(participants_index['times'], get_sort_key('time', participant))
+        remove_from_sorted(participants_index['ages'], get_sort_key('age', participant))
+        participants_index['genders'][participant.get('gender')] -= 1
+        remove_from_value_indexes(participant, ticket)
+        remove_from_timeseries(participant)
+
+def parse_page_size(value):
+    """Проверка размера страницы, переданного в запросе"""
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return ADMIN_PAGE_SIZE
+    return max(1, min(per_page, ADMIN_MAX_PAGE_SIZE))
+
+def parse_participant_filters(args):
+    """Фильтры участников из параметров запроса (админка и выгрузки)"""
+    filters = {}
+    
+    cities = [c.strip().lower() for value in args.getlist('city') for c in value.split(',') if c.strip()]
+    if cities:
+        filters['city'] = cities
+    for name in ('gender', 'source'):
+        if args.get(name):
+            filters[name] = args.get(name).strip()
+    for name in ('age_from', 'age_to'):
+        try:
+            filters[name] = int(args.get(name))
+        except (TypeError, ValueError):
+            pass
+    for name in ('registered_from', 'registered_to'):
+        if args.get(name):
+            filters[name] = args.get(name).strip().replace('T', ' ')
+    return filters
+
+def get_filter_checks(filters):
+    """Проверки номера участника по каждому фильтру (вызываются под data_lock).
+
+    Проверки обращаются к текущим индексам, поэтому остаются верными
+    и после перестроения индексов между вызовами.
+    """
+    checks = []
+    
+    if 'city' in filters:
+        checks.append(lambda t: any(t in participants_index['by_city'].get(city, ()) for city in filters['city']))
+    for name, index_name in (('gender', 'by_gender'), ('source', 'by_source')):
+        if name in filters:
+            checks.append(lambda t, n=name, i=index_name: t in participants_index[i].get(filters[n], ()))
+    
+    if 'age_from' in filters or 'age_to' in filters:
+        age_from = filters.get('age_from')
+        age_to = filters.get('age_to')
+        checks.append(lambda t: (age_from is None or get_age_key(participants_index['by_ticket'][t]) >= age_from)
+                      and (age_to is None or get_age_key(participants_index['by_ticket'][t]) <= age_to))
+    
+    if 'registered_from' in filters or 'registered_to' in filters:
+        time_from = filters.get('registered_from')
+        # Граница "по" включает весь указанный день или минуту
+        time_to = filters['registered_to'] + '\uffff' if 'registered_to' in filters else None
+        checks.append(lambda t: (time_from is None or str(participants_index['by_ticket'][t].get('registration_time', '')) >= time_from)
+                      and (time_to is None or str(participants_index['by_ticket'][t].get('registration_time', '')) < time_to))
+    
+    return checks
+
+def find_matching_tickets(filters):
+    """Номера участников, подходящих под все фильтры (вызывается под data_lock).
+
+    Равенства отвечают готовыми множествами номеров, диапазоны - срезами
+    отсортированных массивов. Начинаем с самого маленького кандидата,
+    остальные условия проверяем только для его элементов.
+    """
+    by_ticket = participants_index['by_ticket']
+    # Кандидаты перечисляются в том же порядке, что и проверки get_filter_checks
+    candidates = []
+    
+    if 'city' in filters:
+        city_sets = [participants_index['by_city'].get(city, set()) for city in filters['city']]
+        matched = city_sets[0] if len(city_sets) == 1 else set().union(*city_sets)
+        candidates.append((len(matched), matched))
+    for name, index_name in (('gender', 'by_gender'), ('source', 'by_source')):
+        if name in filters:
+            matched = participants_index[index_name].get(filters[name], set())
+            candidates.append((len(matched), matched))
+    
+    if 'age_from' in filters or 'age_to' in filters:
+        ages = participants_index['ages']
+        lo = bisect.bisect_left(ages, (filters['age_from'],)) if 'age_from' in filters else 0
+        hi = bisect.bisect_left(ages, (filters['age_to'] + 1,)) if 'age_to' in filters else len(ages)
+        candidates.append((max(0, hi - lo), (ages, lo, hi)))
+    
+    if 'registered_from' in filters or 'registered_to' in filters:
+        times = participants_index['times']
+        lo = bisect.bisect_left(times, (filters['registered_from'],)) if 'registered_from' in filters else 0
+        hi = bisect.bisect_left(times, (filters['registered_to'] + '\uffff',)) if 'registered_to' in filters else len(times)
+        candidates.append((max(0, hi - lo), (times, lo, hi)))
+    
+    if not candidates:
+        return None
+    
+    checks = get_filter_checks(filters)
+    smallest = min(range(len(candidates)), key=lambda i: candidates[i][0])
+    base = candidates[smallest][1]
+    if isinstance(base, tuple):
+        keys, lo, hi = base
+        base = [key[1] for key in keys[lo:hi]]
+    rest = checks[:smallest] + checks[smallest + 1:]
+    return [t for t in base if t in by_ticket and all(check(t) for check in rest)]
+
+def get_participants_page(sort='ticket', order='asc', cursor=None, per_page=ADMIN_PAGE_SIZE, filters=None):
+    """Страница участников после курсора (keyset-пагинация) с учетом фильтров.
+
+    Сортировка по номеру участника (курсор - номер), по времени регистрации
+    или по возрасту (курсор - "значение|номер"). Без фильтров стоимость
+    страницы не зависит от числа участников, с фильтрами - от числа найденных.
+    Возвращает участников страницы, курсор следующей страницы (или None)
+    и общее количество подходящих участников.
+    """
+    if sort not in ('ticket', 'time', 'age'):
+        sort = 'ticket'
+    
+    with data_lock:
+        matched = find_matching_tickets(filters) if filters else None
+        by_ticket = participants_index['by_ticket']
+        if matched is not None:
+            keys = sorted(get_sort_key(sort, by_ticket[t]) for t in matched)
+        else:
+            keys = participants_index[{'ticket': 'tickets', 'time': 'times', 'age': 'ages'}[sort]]
+        
+        key = None
+        if cursor:
+            try:
+                if sort == 'ticket':
+                    key = int(cursor)
+                else:
+                    value, _, ticket = cursor.rpartition('|')
+                    key = (int(value) if sort == 'age' else value, int(ticket))
+            except ValueError:
+                key = None
+
+        if order == 'desc':
+            end = bisect.bisect_left(keys, key) if key is not None else len(keys)
+            start = max(0, end - per_page)
+            page_keys = keys[start:end][::-1]
+            has_more = start > 0
+        else:
+            start = bisect.bisect_right(keys, key) if key is not None else 0
+            page_keys = keys[start:start + per_page]
+            has_more = start + per_page < len(keys)
+
+        tickets = page_keys if sort == 'ticket' else [k[1] for k in page_keys]
+        page = [by_ticket[t] for t in tickets if t in by_ticket]
+        total = len(keys)
+
+    next_cursor = None
+    if has_more and page_keys:
+        last_key = page_keys[-1]
+        next_cursor = str(last_key) if sort == 'ticket' else f"{last_key[0]}|{last_key[1]}"
+    return page, next_cursor, total
+
+def get_settings_revision():
+    """Ревизия настроек для ETag: версия и время изменения файла, одинаковые во всех процессах.
+
+    Время изменения учитывает правку файла вручную, без увеличения версии.
+    """
+    load_settings()
+    stat = settings_cache['stat']
+    return settings_cache['version'], stat[1] if stat else 0
+
+def admin_json_response(endpoint, revision, build):
+    """JSON-ответ админки с сильным ETag по ревизии и параметрам запроса.
+
+    При совпадении If-None-Match отвечает 304, не вызывая build(); иначе
+    берет сериализованное тело из LRU-кэша или строит и кэширует его.
+    """
+    params = tuple(sorted((k, v) for k, v in request.args.items(multi=True) if k not in ('ajax', '_')))
+    key = (endpoint, revision, params)
+    etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:24]
+    
+    # Слабое сравнение: CompressionMiddleware отдает сжатые ответы со слабым ETag
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        with admin_response_cache_lock:
+            body = admin_response_cache.get(key)
+            if body is not None:
+                admin_response_cache.move_to_end(key)
+        
+        if body is None:
+            body = app.json.dumps(build())
+            with admin_response_cache_lock:
+                admin_response_cache[key] = body
+                while len(admin_response_cache) > ADMIN_RESPONSE_CACHE_SIZE:
+                    admin_response_cache.popitem(last=False)
+        
+        response = app.response_class(body, mimetype='application/json')
+    
+    response.set_etag(etag)
+    # Браузер хранит ответ, но каждый раз перепроверяет его по ETag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def get_location_source(participant):
+    """Источник города участника: 'browser' (координаты), 'ip' или None, и сам город"""
+    coordinates = participant.get('coordinates') or {}
+    if isinstance(coordinates, dict) and coordinates.get('city'):
+        return 'browser', str(coordinates['city']).lower()
+    location = participant.get('location') or {}
+    if isinstance(location, dict) and location.get('city'):
+        return 'ip', str(location['city']).lower()
+    return None, ''
+
+def get_participant_city(participant):
+    """Город участника как он сохранен: из координат браузера, иначе по IP"""
+    for field in ('coordinates', 'location'):
+        data = participant.get(field)
+        if isinstance(data, dict) and data.get('city'):
+            return str(data['city'])
+    return ''
+
+def get_location_field(participant, name):
+    """Поле местоположения участника, определенного по IP (регион, страна)"""
+    location = participant.get('location')
+    return str(location.get(name) or '') if isinstance(location, dict) else ''
+
+def get_coordinates_label(participant):
+    """Координаты участника строкой "широта, долгота" или пустая строка"""
+    coordinates = participant.get('coordinates')
+    if isinstance(coordinates, dict) and coordinates.get('latitude') and coordinates.get('longitude'):
+        return f"{coordinates['latitude']}, {coordinates['longitude']}"
+    return ''
+
+def get_gender_label(participant):
+    """Пол участника для выгрузок"""
+    return 'Мужской' if participant.get('gender') == 'male' else 'Женский'
+
+def get_timeseries_dimensions(participant):
+    """Счетчики, в которые попадает регистрация участника"""
+    source, city = get_location_source(participant)
+    dimensions = ['total', participant.get('gender') or 'unknown_gender']
+    if source:
+        dimensions.append(f"{'allowed' if check_location_allowed(city) else 'denied'}_{source}")
+    else:
+        dimensions.append('unknown_location')
+    return dimensions
+
+def add_to_timeseries(participant):
+    """Учет регистрации в поминутных, часовых и дневных счетчиках (вызывается под data_lock)"""
+    reg_time = str(participant.get('registration_time', ''))
+    if len(reg_time) < 16:
+        return
+    dimensions = get_timeseries_dimensions(participant)
+    for step, (prefix, _, _) in TIMESERIES_STEPS.items():
+        bucket = timeseries_rollups[step].get(reg_time[:prefix])
+        if bucket is None:
+            bucket = timeseries_rollups[step][reg_time[:prefix]] = Counter()
+        for dimension in dimensions:
+            bucket[dimension] += 1
+
+def remove_from_timeseries(participant):
+    """Вычитание удаленного участника из счетчиков временных рядов (вызывается под data_lock)"""
+    reg_time = str(participant.get('registration_time', ''))
+    if len(reg_time) < 16:
+        return
+    dimensions = get_timeseries_dimensions(participant)
+    for step, (prefix, _, _) in TIMESERIES_STEPS.items():
+        # Корзины старше срока хранения уже сжаты - в них нечего вычитать
+        bucket = timeseries_rollups[step].get(reg_time[:prefix])
+        if bucket is not None:
+            bucket.subtract(dimensions)
+
+def compact_timeseries():
+    """Удаление детальных счетчиков старше срока хранения (вызывается под data_lock)"""
+    now = datetime.now()
+    for step, retention in TIMESERIES_RETENTION.items():
+        if retention is None:
+            continue
+        prefix, _, key_format = TIMESERIES_STEPS[step]
+        border = (now - retention).strftime(key_format)
+        rollup = timeseries_rollups[step]
+        for key in [key for key in rollup if key < border]:
+            del rollup[key]
+
+def run_timeseries_compactor():
+    """Фоновое сжатие счетчиков временных рядов"""
+    while True:
+        time.sleep(TIMESERIES_COMPACT_INTERVAL)
+        try:
+            with data_lock:
+                compact_timeseries()
+        except Exception as e:
+            app.logger.error(f"Ошибка при сжатии временных рядов: {str(e)}")
+
+def start_timeseries_compactor():
+    """Запуск фонового сжатия счетчиков (один поток на процесс)"""
+    if timeseries_compactor['thread'] is None:
+        timeseries_compactor['thread'] = threading.Thread(target=run_timeseries_compactor, daemon=True)
+        timeseries_compactor['thread'].start()
+
+def run_warmup():
+    """Фоновый прогрев: база состояния и кэш участников загружаются до первых запросов"""
+    warmup_state['status'] = 'running'
+    warmup_state['started_at'] = time.time()
+    try:
+        get_state_db()
+        load_participants()
+        warmup_state['status'] = 'done'
+    except Exception as e:
+        warmup_state['status'] = 'failed'
+        warmup_state['error'] = str(e)
+        app.logger.error(f"Ошибка при прогреве воркера: {str(e)}")
+    finally:
+        warmup_state['finished_at'] = time.time()
+
+def start_warmup():
+    """Запуск прогрева в фоне, чтобы импорт воркера не ждал Яндекс.Диск (один поток на процесс)"""
+    if warmup_state['thread'] is None:
+        warmup_state['thread'] = threading.Thread(target=run_warmup, daemon=True)
+        warmup_state['thread'].start()
+
+def parse_timeseries_time(value):
+    """Разбор границы интервала: дата, дата и время или ISO-формат"""
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, time_format)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+def get_timeseries(start, end, step):
+    """Счетчики регистраций по интервалам [start, end] с заданным шагом, пустые интервалы - нули"""
+    prefix, delta, key_format = TIMESERIES_STEPS[step]
+    current = datetime.strptime(start.strftime(key_format), key_format)
+    points = []
+    with data_lock:
+        rollup = timeseries_rollups[step]
+        while current <= end and len(points) < TIMESERIES_MAX_POINTS:
+            key = current.strftime(key_format)
+            points.append(dict(rollup.get(key, {}), time=key))
+            current += delta
+    return points
+
+def count_registered_since(time_str):
+    """Количество участников, зарегистрированных начиная с указанного времени"""
+    with data_lock:
+        times = participants_index['times']
+        return len(times) - bisect.bisect_left(times, (time_str,))
+
+def write_file_atomic(path, data):
+    """Атомарная запись байтов в файл: временный файл рядом и os.replace"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='participants.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def encode_participants(participants):
+    """Список участников в JSON для хранилища"""
+    # Без отступов: json.dumps с indent не использует C-кодировщик и в разы медленнее
+    return json.dumps(participants, ensure_ascii=False).encode('utf-8')
+
+def write_participants_file(participants, revision):
+    """Атомарная запись снимка участников и его ревизии в локальные файлы; возвращает (данные, сведения)"""
+    data = encode_participants(participants)
+    meta = get_snapshot_meta(data, revision)
+    # Сведения пишутся после данных: при сбое между записями хэш не совпадет
+    # и снимок загрузится как снимок без ревизии
+    write_file_atomic(PARTICIPANTS_FILE, data)
+    write_file_atomic(PARTICIPANTS_META_FILE, json.dumps(meta).encode('utf-8'))
+    return data, meta
+
+def upload_participants_store(token, data, meta):
+    """Выгрузка снимка участников и сведений о нем на Яндекс.Диск"""
+    headers = {"Authorization": f"OAuth {token}"}
+    return (upload_to_yadisk(headers, "app:/participants.json", data)
+            and upload_to_yadisk(headers, "app:/participants.meta.json", json.dumps(meta).encode('utf-8')))
+
+def snapshot_participants():
+    """Копия списка участников без удаленных и ревизия журнала, которой она соответствует"""
+    load_participants()
+    with sync_lock:
+        compact_participants_cache()
+        return list(PARTICIPANTS_CACHE), participants_state['revision']
+
 def save_participant(data):
     """Сохраняет информацию об участнике в файл данных и на Яндекс.Диск"""
     try:
@@ -352,20 +1576,29 @@ def save_participant(data):
                                 except:
                                     data[nested_key][key] = value.encode('utf-8', errors='replace').decode('utf-8')
         
-        # Добавляем нового участника
-        participants.append(data)
-        
-        # Обновляем глобальный кэш участников
-        global PARTICIPANTS_CACHE
-        PARTICIPANTS_CACHE = participants
-        
-        # Проверяем, существует ли каталог data
-        if not os.path.exists('data'):
-            os.makedirs('data')
+        # Файл и запись журнала пишутся под блокировкой хранилища: восстановление
+        # из копии в другом воркере не окажется между ними, а кэш перед записью
+        # догоняет журнал, чтобы файл не был переписан из устаревшего кэша
+        with participants_store_lock():
+            sync_participants()
+            # Добавляем нового участника и обновляем глобальный кэш и индексы;
+            # под sync_lock, чтобы сжатие по надгробиям не потеряло добавление
+            with sync_lock:
+                compact_participants_cache()
+                participants = PARTICIPANTS_CACHE
+                participants.append(data)
+                index_participant(data)
+                participants_state['latest'].append(data)
+                snapshot = list(participants)
+                # Запись added еще не в журнале: при загрузке снимка она применится повторно без изменений
+                snapshot_revision = participants_state['revision']
+
+            # Сохраняем локально с корректной кодировкой
+            store_data, store_meta = write_participants_file(snapshot, snapshot_revision)
             
-        # Сохраняем локально с корректной кодировкой
-        with open('data/participants.json', 'w', encoding='utf-8') as file:
-            json.dump(participants, file, ensure_ascii=False, indent=4)
+            # Публикуем изменение для других процессов и дельта-запросов
+            revision = record_change('added', get_ticket_key(data), data)
+        publish_participant_events('registered', data, revision)
             
         # Получаем токен Яндекс.Диска из настроек
         settings = load_settings()
@@ -373,41 +1606,17 @@ def save_participant(data):
         
         if yandex_token:
             try:
-                # Сохраняем данные на Яндекс.Диск
-                # Сначала получаем ссылку для загрузки
-                headers = {"Authorization": f"OAuth {yandex_token}"}
-                upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-                params = {"path": "app:/participants.json", "overwrite": "true"}
-                
-                response = requests.get(upload_url, headers=headers, params=params)
-                
-                if response.status_code == 200:
-                    # Получаем ссылку для загрузки
-                    upload_link = response.json().get("href")
-                    
-                    # Подготавливаем данные для отправки
-                    json_data = json.dumps(participants, ensure_ascii=False, indent=4)
-                    
-                    # Отправляем данные с явным указанием UTF-8
-                    upload_response = requests.put(
-                        upload_link, 
-                        data=json_data.encode('utf-8'),
-                        headers={'Content-Type': 'application/json; charset=utf-8'}
-                    )
-                    
-                    if upload_response.status_code == 201 or upload_response.status_code == 200:
-                        app.logger.info(f"Данные успешно сохранены на Яндекс.Диск. Всего участников: {len(participants)}")
-                    else:
-                        app.logger.error(f"Ошибка при сохранении данных на Яндекс.Диск: {upload_response.status_code}")
+                # Сохраняем данные и ревизию снимка на Яндекс.Диск
+                if upload_participants_store(yandex_token, store_data, store_meta):
+                    app.logger.info(f"Данные успешно сохранены на Яндекс.Диск. Всего участников: {len(snapshot)}")
                 else:
-                    app.logger.error(f"Ошибка при получении ссылки для загрузки: {response.status_code}")
+                    app.logger.error("Ошибка при сохранении данных на Яндекс.Диск")
             except Exception as e:
                 app.logger.error(f"Ошибка при сохранении на Яндекс.Диск: {str(e)}")
         
-        # Если включено резервное копирование, запускаем его в фоновом режиме
+        # Если включено резервное копирование, отмечаем данные для отложенной копии
         if settings.get('backup_settings', {}).get('enabled', False):
-            backup_thread = threading.Thread(target=create_backup, daemon=True)
-            backup_thread.start()
+            request_backup()
             
         return True
     except Exception as e:
@@ -478,11 +1687,95 @@ def generate_unique_ticket_number():
     
     return next_number
 
+def get_page_inputs(name, settings):
+    """Данные из настроек, от которых зависит готовая страница"""
+    if name == 'index':
+        return {'whatsapp_link': settings.get('whatsapp_link')}
+    return {}
+
+def on_page_settings_changed(settings):
+    """Подписчик на настройки: готовая страница сбрасывается, только если изменились ее входные данные"""
+    with page_cache_lock:
+        for name in [name for name, page in page_cache.items() if page['inputs'] != get_page_inputs(name, settings)]:
+            del page_cache[name]
+
+subscribe_settings(on_page_settings_changed)
+
+def get_page_template_checks(template):
+    """Проверки загрузчика Jinja (uptodate) для шаблона страницы и всех шаблонов, которые он расширяет или включает"""
+    env = app.jinja_env
+    checks = []
+    pending, seen = [template], set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source, _, uptodate = env.loader.get_source(env, name)
+        if uptodate is not None:
+            checks.append(uptodate)
+        pending.extend(ref for ref in jinja_meta.find_referenced_templates(env.parse(source)) if ref)
+    return checks
+
+def cached_page_response(name, template):
+    """Ответ готовой страницей из page_cache: поиск по имени, 304 по ETag, сжатый вариант по Accept-Encoding.
+
+    Страница рендерится при первом запросе и после изменения ее входных
+    данных (whatsapp_link) или манифеста статики, а при auto_reload шаблонов
+    (отладка, TEMPLATES_AUTO_RELOAD) - и после изменения файлов шаблонов; без
+    него Jinja сама не перечитывает шаблоны до перезапуска. Сжатые варианты
+    строятся один раз на кодировку. При ожидающих flash-сообщениях страница
+    рендерится как обычно - они зависят от сессии посетителя.
+    """
+    settings = load_settings()  # замечает запись настроек другим процессом и вызывает подписчиков
+    if session.get('_flashes'):
+        return render_template(template, **get_page_inputs(name, settings))
+    
+    get_asset_manifest()
+    page = page_cache.get(name)
+    if page is None or page['manifest'] != asset_manifest['mtime'] or \
+            (app.jinja_env.auto_reload and not all(check() for check in page['templates'])):
+        inputs = get_page_inputs(name, settings)
+        templates = get_page_template_checks(template)
+        body = render_template(template, **inputs).encode('utf-8')
+        page = {
+            'inputs': inputs,
+            'manifest': asset_manifest['mtime'],
+            'templates': templates,
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest()[:24],
+            'encoded': {}
+        }
+        with page_cache_lock:
+            page_cache[name] = page
+    
+    if request.if_none_match.contains_weak(page['etag']):
+        response = app.response_class(status=304)
+    else:
+        encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+        body = page['body']
+        if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+            encoded = page['encoded'].get(encoding)
+            if encoded is None:
+                # Готовая страница сжимается один раз, поэтому уровень максимальный
+                encoded = page['encoded'][encoding] = (
+                    brotli.compress(body, quality=11) if encoding == 'br' else compress_body(body, encoding)
+                )
+            response = app.response_class(encoded, mimetype='text/html')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = app.response_class(body, mimetype='text/html')
+    
+    response.vary.add('Accept-Encoding')
+    # Сжатые и исходное тело - одна страница, поэтому ETag слабый
+    response.set_etag(page['etag'], weak=True)
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
 @app.route('/')
 def index():
     """Главная страница с формой регистрации"""
-    settings = load_settings()
-    return render_template('index.html', whatsapp_link=settings.get('whatsapp_link'))
+    return cached_page_response('index', 'index.html')
 
 @app.route('/check-coordinates')
 def check_coordinates():
@@ -665,7 +1958,7 @@ def register():
 @app.route('/success')
 def success():
     """Страница успешной регистрации"""
-    return render_template('success.html')
+    return cached_page_response('success', 'success.html')
 
 @app.route('/get-ticket-number')
 def get_ticket_number():
@@ -676,19 +1969,59 @@ def get_ticket_number():
     else:
         return jsonify({'success': False, 'message': 'Номер не найден. Возможно, вы еще не зарегистрировались или сессия истекла.'}), 404
 
+@app.route('/healthz')
+def healthz():
+    """Проверка живости процесса: без обращения к данным и Яндекс.Диску"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz')
+def readyz():
+    """Готовность воркера: участники загружены и кэш синхронизирован с журналом изменений"""
+    if warmup_state['status'] == 'pending' and PARTICIPANTS_CACHE is None:
+        # Процесс запущен без прогрева (например, flask run) - прогрев начинает первая проверка
+        start_warmup()
+    checks = {'warmup': warmup_state['status'], 'participants_loaded': PARTICIPANTS_CACHE is not None}
+    if checks['participants_loaded']:
+        sync_participants()
+    checks['sync_error'] = participants_state['sync_error']
+    checks['revision'] = participants_state['revision']
+    ready = checks['participants_loaded'] and checks['sync_error'] is None and warmup_state['status'] != 'running'
+    if warmup_state['finished_at'] is not None:
+        checks['warmup_seconds'] = round(warmup_state['finished_at'] - warmup_state['started_at'], 3)
+    return jsonify({'status': 'ready' if ready else 'not ready', 'checks': checks}), 200 if ready else 503
+
 @app.route('/admin')
 @login_required
 def admin_panel():
     """Админ-панель"""
-    # Загружаем свежие данные о участниках, игнорируя кэш
-    participants = load_participants(force_reload=True)
+    # Прогретый кэш догоняется по журналу изменений, дальше страница обновляется по ревизии и потоку событий
+    participants = load_participants()
     
-    # Получаем статистику
+    # Получаем статистику по индексу времени регистрации
+    today = datetime.now().date()
     stats = {
         'total': len(participants),
-        'today': sum(1 for p in participants if datetime.strptime(p.get('registration_time', '1970-01-01 00:00:00'), '%Y-%m-%d %H:%M:%S').date() == datetime.now().date()),
-        'week': sum(1 for p in participants if (datetime.now().date() - datetime.strptime(p.get('registration_time', '1970-01-01 00:00:00'), '%Y-%m-%d %H:%M:%S').date()).days <= 7),
-        'month': sum(1 for p in participants if (datetime.now().date() - datetime.strptime(p.get('registration_time', '1970-01-01 00:00:00'), '%Y-%m-%d %H:%M:%S').date()).days <= 30),
+        'today': count_registered_since(today.strftime('%Y-%m-%d')),
+        'week': count_registered_since((today - timedelta(days=7)).strftime('%Y-%m-%d')),
+        'month': count_registered_since((today - timedelta(days=30)).strftime('%Y-%m-%d')),
+        'male': participants_index['genders'].get('male', 0),
+        'female': participants_index['genders'].get('female', 0),
+    }
+    
+    # Первая страница таблицы рендерится на сервере, остальные подгружаются по курсору
+    sort = request.args.get('sort', 'ticket')
+    order = request.args.get('order', 'asc')
+    per_page = parse_page_size(request.args.get('per_page', ADMIN_PAGE_SIZE))
+    filters = parse_participant_filters(request.args)
+    page, next_cursor, total_filtered = get_participants_page(sort=sort, order=order, per_page=per_page, filters=filters)
+    pagination = {
+        'sort': sort,
+        'order': order,
+        'per_page': per_page,
+        'filters': filters,
+        'next_cursor': next_cursor,
+        'total_filtered': total_filtered,
+        'total_participants': len(participants)
     }
     
     # Загружаем настройки
@@ -698,7 +2031,9 @@ def admin_panel():
     next_backup_time = get_next_backup_info()
     
     return render_template('admin.html', 
-                           participants=participants, 
+                           participants=page, 
+                           data_revision=participants_state['revision'],
+                           pagination=pagination,
                            stats=stats, 
                            settings=settings,
                            next_backup_time=next_backup_time)
@@ -725,246 +2060,294 @@ def delete_participants():
         return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
     
     try:
-        # Получаем токен Яндекс.Диска из настроек
-        settings = load_settings()
-        yandex_token = settings.get('backup_settings', {}).get('yandex_token')
-        
-        if not yandex_token:
-            return jsonify({'success': False, 'message': 'Не найден токен Яндекс.Диска'}), 500
-        
-        # Обновляем кэш
-        global PARTICIPANTS_CACHE
-        PARTICIPANTS_CACHE = []
-        
-        # Загружаем пустой массив на Яндекс.Диск
-        headers = {"Authorization": f"OAuth {yandex_token}"}
-        upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        params = {"path": "app:/participants.json", "overwrite": "true"}
-        
-        response = requests.get(upload_url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            # Получаем ссылку для загрузки
-            upload_link = response.json().get("href")
-            
-            # Отправляем пустой массив
-            upload_response = requests.put(upload_link, data="[]".encode('utf-8'))
-            
-            if upload_response.status_code == 201 or upload_response.status_code == 200:
-                app.logger.info("Все данные участников успешно удалены с Яндекс.Диска")
-                return jsonify({'success': True})
-            else:
-                error_msg = f"Ошибка при удалении данных на Яндекс.Диске: {upload_response.status_code}"
-                app.logger.error(error_msg)
-                return jsonify({'success': False, 'message': error_msg}), 500
-        else:
-            error_msg = f"Ошибка при получении ссылки для загрузки: {response.status_code}"
-            app.logger.error(error_msg)
-            return jsonify({'success': False, 'message': error_msg}), 500
+        # Обновляем кэш и индексы
+        load_participants()
+        stats_before = {
+            'total': -sum(participants_index['genders'].values()),
+            'male': -participants_index['genders'].get('male', 0),
+            'female': -participants_index['genders'].get('female', 0)
+        }
+        revision = record_change('cleared')
+        if revision is None:
+            return jsonify({'success': False, 'message': 'Не удалось записать удаление в журнал изменений'}), 500
+        publish_event('deleted', {'revision': revision, 'ticket_number': None, 'all': True})
+        publish_event('stats', stats_before)
+
+        # Пустой список сразу записывается в локальный файл и на Яндекс.Диск
+        if sync_participants_store():
+            app.logger.info("Все данные участников удалены")
+            return jsonify({'success': True})
+        error_msg = "Данные удалены, но не выгружены на Яндекс.Диск"
+        app.logger.error(error_msg)
+        request_store_sync()
+        return jsonify({'success': False, 'message': error_msg}), 500
             
     except Exception as e:
         error_msg = f"Ошибка при удалении данных участников: {str(e)}"
         app.logger.error(error_msg)
         return jsonify({'success': False, 'message': error_msg}), 500
 
-@app.route('/delete-participant/<int:index>', methods=['POST'])
-def delete_participant(index):
-    # Проверка, что пользователь является администратором
+def delete_participants_by_ticket(tickets):
+    """Удаление участников по номерам: надгробия в журнале одной транзакцией и одна отложенная запись хранилища.
+
+    Индексы обновляются по каждому участнику, список кэша сжимается позже
+    одним проходом. Возвращает удаленных участников (несуществующие номера пропускаются).
+    """
+    load_participants()
+    with data_lock:
+        by_ticket = participants_index['by_ticket']
+        deleted = [by_ticket[ticket] for ticket in dict.fromkeys(tickets) if ticket in by_ticket]
+    if not deleted:
+        return []
+    
+    revision = record_deletions([get_ticket_key(p) for p in deleted])
+    if revision is None:
+        raise RuntimeError('Не удалось записать удаление в журнал изменений')
+    
+    if len(deleted) == 1:
+        publish_participant_events('deleted', deleted[0], revision)
+    else:
+        # Одно событие на пачку: админка перечитывает изменения по ревизии
+        genders = Counter(p.get('gender') for p in deleted)
+        publish_event('deleted', {'revision': revision, 'ticket_number': None, 'count': len(deleted)})
+        publish_event('stats', {'total': -len(deleted), 'male': -genders['male'], 'female': -genders['female']})
+    request_store_sync()
+    return deleted
+
+@app.route('/admin/participants/<int:ticket_number>/delete', methods=['POST'])
+def delete_participant(ticket_number):
+    """Удаление участника по номеру"""
     if not session.get('admin'):
         return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
     
     try:
-        # Загрузка списка участников
-        participants = load_participants()
-        
-        # Проверка валидности индекса
-        if index < 0 or index >= len(participants):
+        if not delete_participants_by_ticket([ticket_number]):
             return jsonify({'success': False, 'message': 'Участник не найден'}), 404
-        
-        # Удаление участника
-        del participants[index]
-        
-        # Получаем токен Яндекс.Диска из настроек
-        settings = load_settings()
-        yandex_token = settings.get('backup_settings', {}).get('yandex_token')
-        
-        if not yandex_token:
-            return jsonify({'success': False, 'message': 'Не найден токен Яндекс.Диска'}), 500
-        
-        # Обновляем кэш
-        global PARTICIPANTS_CACHE
-        PARTICIPANTS_CACHE = participants
-        
-        # Загружаем обновленный список на Яндекс.Диск
-        headers = {"Authorization": f"OAuth {yandex_token}"}
-        upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        params = {"path": "app:/participants.json", "overwrite": "true"}
-        
-        response = requests.get(upload_url, headers=headers, params=params)
-        
-        if response.status_code == 200:
-            # Получаем ссылку для загрузки
-            upload_link = response.json().get("href")
-            
-            # Подготавливаем данные для отправки
-            json_data = json.dumps(participants, ensure_ascii=False, indent=4)
-            
-            # Отправляем данные
-            upload_response = requests.put(upload_link, data=json_data.encode('utf-8'))
-            
-            if upload_response.status_code == 201 or upload_response.status_code == 200:
-                app.logger.info(f"Участник успешно удален. Осталось участников: {len(participants)}")
-                return jsonify({'success': True})
-            else:
-                error_msg = f"Ошибка при обновлении данных на Яндекс.Диске: {upload_response.status_code}"
-                app.logger.error(error_msg)
-                return jsonify({'success': False, 'message': error_msg}), 500
-        else:
-            error_msg = f"Ошибка при получении ссылки для загрузки: {response.status_code}"
-            app.logger.error(error_msg)
-            return jsonify({'success': False, 'message': error_msg}), 500
-            
+        return jsonify({'success': True, 'deleted': 1})
     except Exception as e:
         error_msg = f"Ошибка при удалении участника: {str(e)}"
         app.logger.error(error_msg)
         return jsonify({'success': False, 'message': error_msg}), 500
 
+@app.route('/admin/participants/delete', methods=['POST'])
+def delete_participants_bulk():
+    """Удаление участников по списку номеров (tickets) или по фильтрам таблицы (filters).
+
+    Фильтры те же, что в параметрах /admin-data; без фильтров запрос
+    отклоняется - для удаления всех есть /delete-participants.
+    С dry_run возвращается только число подходящих участников.
+    """
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    if data.get('tickets') is not None:
+        if not isinstance(data['tickets'], list):
+            return jsonify({'success': False, 'message': 'tickets должен быть списком номеров'}), 400
+        try:
+            tickets = [int(ticket) for ticket in data['tickets']]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Некорректный номер участника'}), 400
+    elif isinstance(data.get('filters'), dict) and data['filters']:
+        filters = parse_participant_filters(MultiDict({
+            name: [str(v) for v in value] if isinstance(value, list) else str(value)
+            for name, value in data['filters'].items()
+        }))
+        if not filters:
+            return jsonify({'success': False, 'message': 'Некорректные фильтры'}), 400
+        load_participants()
+        with data_lock:
+            tickets = find_matching_tickets(filters)
+    else:
+        return jsonify({'success': False, 'message': 'Укажите tickets или filters'}), 400
+    
+    if data.get('dry_run'):
+        return jsonify({'success': True, 'dry_run': True, 'matched': len(tickets)})
+    
+    try:
+        deleted = delete_participants_by_ticket(tickets)
+        return jsonify({'success': True, 'requested': len(tickets), 'deleted': len(deleted)})
+    except Exception as e:
+        error_msg = f"Ошибка при удалении участников: {str(e)}"
+        app.logger.error(error_msg)
+        return jsonify({'success': False, 'message': error_msg}), 500
+
+@app.route('/delete-participant/<int:index>', methods=['POST'])
+def delete_participant_by_position(index):
+    """Прежнее удаление по позиции в списке: позиции расходятся между воркерами, поэтому отключено"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    return jsonify({'success': False, 'message': 'Страница админки устарела, обновите ее'}), 410
+
+def to_excel_string(value):
+    """Значение для текстового столбца Excel"""
+    return '' if value is None else str(value)
+
+def to_excel_number(value):
+    """Значение для числового столбца Excel (нечисловые значения остаются строкой)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = to_excel_string(value).strip()
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
+
+def to_excel_datetime(value):
+    """Значение для столбца даты Excel из времени регистрации "ГГГГ-ММ-ДД ЧЧ:ММ:СС" """
+    if isinstance(value, datetime):
+        return value
+    try:
+        # fromisoformat заметно быстрее strptime на больших выгрузках
+        return datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return to_excel_string(value)
+
+EXCEL_CONVERTERS = {
+    'string': to_excel_string,
+    'number': to_excel_number,
+    'datetime': to_excel_datetime,
+    'index': lambda value: value
+}
+
+def write_workbook(output, columns, rows, sheet_name='Участники'):
+    """Запись Excel-файла по описанию столбцов в output.
+
+    Строки пишутся через write_row в режиме constant_memory, поэтому
+    память не зависит от числа строк. Форматы создаются один раз и
+    назначаются ячейкам строк, значения приводятся к типу столбца.
+    Возвращает число записанных строк участников.
+    """
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        # Данные участников не превращаются в формулы и гиперссылки
+        'strings_to_formulas': False,
+        'strings_to_urls': False
+    })
+    worksheet = workbook.add_worksheet(sheet_name)
+    
+    header_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#007bff',
+        'font_color': 'white',
+        'border': 1
+    })
+    
+    # Столбцу задается только ширина: формат столбца Excel применяет ко всем
+    # строкам листа, и границы тянулись бы по пустым строкам до 1 048 576
+    formats = {}
+    runs = []
+    for col, column in enumerate(columns):
+        properties = EXCEL_TYPE_FORMATS[column['type']]
+        key = tuple(sorted(properties.items()))
+        if key not in formats:
+            formats[key] = workbook.add_format(properties)
+        worksheet.set_column(col, col, column['width'])
+        # Соседние столбцы с одним форматом пишутся одним вызовом write_row
+        if runs and runs[-1][2] is formats[key]:
+            runs[-1][1] = col + 1
+        else:
+            runs.append([col, col + 1, formats[key]])
+    
+    worksheet.write_row(0, 0, [column['header'] for column in columns], header_format)
+    
+    cells = [(EXCEL_CONVERTERS[column['type']], column.get('value')) for column in columns]
+    row = 0
+    for row, item in enumerate(rows, start=1):
+        values = [convert(get(item) if get else row) for convert, get in cells]
+        for start, end, cell_format in runs:
+            worksheet.write_row(row, start, values[start:end], cell_format)
+    
+    workbook.close()
+    return row
+
+def stream_file(file_obj, size=None, chunk_size=EXPORT_CHUNK_SIZE, offset=0):
+    """Отдача файла клиенту частями с позиции offset (не больше size байт) с закрытием после отправки"""
+    try:
+        file_obj.seek(offset)
+        remaining = size - offset if size is not None else None
+        while remaining is None or remaining > 0:
+            chunk = file_obj.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+    finally:
+        file_obj.close()
+
 @app.route('/export-to-excel', methods=['GET'])
 def export_to_excel():
-    """Генерация Excel-файла с данными участников"""
+    """Генерация Excel-файла с данными участников.
+
+    partition=city|date|tickets - ZIP-архив с отдельной книгой на каждый город,
+    день регистрации или диапазон из partition_size номеров.
+    """
     # Проверка, что пользователь является администратором
     if not session.get('admin'):
         flash('Доступ запрещен. Пожалуйста, войдите как администратор.', 'danger')
         return redirect(url_for('admin'))
     
     try:
-        # Загрузка данных участников
-        participants = load_participants()
-        
-        # Создание объекта для записи Excel-файла
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
-        worksheet = workbook.add_worksheet('Участники')
-        
-        # Форматирование
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#007bff',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        cell_format = workbook.add_format({
-            'border': 1
-        })
-        
-        # Установка ширины столбцов
-        worksheet.set_column('A:A', 25)  # Имя
-        worksheet.set_column('B:B', 10)  # Номер участника
-        worksheet.set_column('C:C', 20)  # Телефон
-        worksheet.set_column('D:D', 10)  # Возраст
-        worksheet.set_column('E:E', 15)  # Пол
-        worksheet.set_column('F:F', 20)  # Город
-        worksheet.set_column('G:G', 20)  # Регион
-        worksheet.set_column('H:H', 20)  # Страна
-        worksheet.set_column('I:I', 25)  # Время регистрации
-        worksheet.set_column('J:J', 30)  # Координаты
-        worksheet.set_column('K:K', 20)  # IP-адрес
-        
-        # Заголовки столбцов
-        headers = [
-            'Имя', 'Номер участника', 'Телефон', 'Возраст', 'Пол', 'Город', 'Регион', 'Страна', 
-            'Время регистрации', 'Координаты', 'IP-адрес'
-        ]
-        
-        for col, header in enumerate(headers):
-            worksheet.write(0, col, header, header_format)
-        
-        # Заполнение данными
-        for i, participant in enumerate(participants):
-            row = i + 1
-            
-            # Безопасное извлечение данных
-            full_name = str(participant.get('full_name', ''))
-            ticket_number = str(participant.get('ticket_number', ''))
-            phone = str(participant.get('phone', ''))
-            age = str(participant.get('age', ''))
-            gender = 'Мужской' if str(participant.get('gender', '')) == 'male' else 'Женский'
-            
-            # Безопасное извлечение данных о местоположении
-            city = ''
-            region = ''
-            country = ''
-            
-            # Получение города из координат (если они есть)
-            coordinates = participant.get('coordinates', {})
-            if coordinates and isinstance(coordinates, dict):
-                city_from_coords = coordinates.get('city', '')
-                if city_from_coords:
-                    city = city_from_coords
-            
-            # Если город не определен из координат, пробуем получить его из location
-            if not city:
-                location = participant.get('location', {})
-                if location and isinstance(location, dict):
-                    city = location.get('city', '')
-                    region = location.get('region', '')
-                    country = location.get('country', '')
-            
-            # Форматирование координат
-            coords = ''
-            if coordinates and isinstance(coordinates, dict):
-                lat = coordinates.get('latitude', '')
-                lng = coordinates.get('longitude', '')
-                if lat and lng:
-                    coords = f"{lat}, {lng}"
-            
-            # IP-адрес
-            ip_address = str(participant.get('ip_address', ''))
-            
-            # Время регистрации
-            reg_time = str(participant.get('registration_time', ''))
-            
-            # Капитализация строк
-            if city:
-                city = city.capitalize()
-            if region:
-                region = region.capitalize()
-            if country:
-                country = country.capitalize()
-            
-            # Данные для записи
-            data = [
-                full_name,
-                ticket_number,
-                phone,
-                age,
-                gender,
-                city,
-                region,
-                country,
-                reg_time,
-                coords,
-                ip_address
-            ]
-            
-            # Запись данных в Excel
-            for col, value in enumerate(data):
-                worksheet.write(row, col, value, cell_format)
+        # Фильтры те же, что и в таблице админки
+        filters = parse_participant_filters(request.args)
+        current_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Закрытие и возврат Excel-файла
-        workbook.close()
-        output.seek(0)
+        partition_by = request.args.get('partition')
+        if partition_by:
+            if partition_by not in EXPORT_PARTITION_MODES:
+                flash('Разбиение выгрузки возможно по городу (city), дате (date) или номерам (tickets)', 'danger')
+                return redirect(url_for('admin_panel'))
+            try:
+                size = max(EXPORT_PARTITION_MIN_SIZE, int(request.args.get('partition_size', EXPORT_PARTITION_SIZE)))
+            except ValueError:
+                size = EXPORT_PARTITION_SIZE
+            revision, partitions = get_export_partitions(partition_by, filters, size)
+            if len(partitions) > EXPORT_MAX_PARTITIONS:
+                flash(f'Слишком много частей выгрузки ({len(partitions)}), уточните фильтры', 'danger')
+                return redirect(url_for('admin_panel'))
+            return Response(
+                generate_partitioned_export(partition_by, filters, revision, partitions),
+                mimetype='application/zip',
+                headers={
+                    'Content-Disposition': f'attachment; filename=participants_{current_date}_{partition_by}.zip',
+                    'X-Accel-Buffering': 'no'
+                },
+                direct_passthrough=True
+            )
+        
+        # Файл той же ревизии и с теми же фильтрами берется из кэша выгрузок,
+        # иначе собирается в пуле процессов, не нагружая процесс веб-сервера.
+        # Запрос ждет задание не дольше EXPORT_DOWNLOAD_WAIT секунд, затем
+        # поток воркера освобождается, а клиент получает задание для опроса
+        artifact = get_export_artifact('xlsx', filters, allow_build=False)
+        if artifact is None:
+            job_id = submit_export_job('xlsx', filters)
+            if job_id is None:
+                artifact = get_export_artifact('xlsx', filters)
+            else:
+                artifact = wait_export_job(job_id, EXPORT_DOWNLOAD_WAIT)
+                if artifact is None:
+                    response = jsonify({'success': True, 'job': get_export_job(job_id)})
+                    response.status_code = 202
+                    response.headers['Location'] = url_for('export_job_status', job_id=job_id)
+                    return response
+        output, size = artifact
         
         # Формирование имени файла с текущей датой
-        current_date = datetime.now().strftime('%Y-%m-%d')
         filename = f'participants_{current_date}.xlsx'
         
-        return send_file(
-            output, 
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 
-            as_attachment=True, 
-            download_name=filename
+        return Response(
+            stream_file(output, size),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={
+                'Content-Length': str(size),
+                'Content-Disposition': f'attachment; filename={filename}'
+            },
+            direct_passthrough=True
         )
     except Exception as e:
         import traceback
@@ -972,6 +2355,676 @@ def export_to_excel():
         flash(f'Ошибка при создании Excel-файла: {str(e)}', 'danger')
         return redirect(url_for('admin'))
 
+def iter_export_participants(filters, after=None, until=None):
+    """Участники в порядке номеров после номера after (и не больше until), пачками по EXPORT_BATCH_SIZE.
+
+    Блокировка берется только на время выбора пачки, поэтому выгрузка
+    не мешает регистрациям, а память не зависит от числа участников.
+    """
+    checks = get_filter_checks(filters) if filters else []
+    while True:
+        with data_lock:
+            tickets = participants_index['tickets']
+            start = bisect.bisect_right(tickets, after) if after is not None else 0
+            batch_tickets = tickets[start:start + EXPORT_BATCH_SIZE]
+            if until is not None:
+                batch_tickets = batch_tickets[:bisect.bisect_right(batch_tickets, until)]
+            by_ticket = participants_index['by_ticket']
+            batch = [
+                by_ticket[t] for t in batch_tickets
+                if t in by_ticket and all(check(t) for check in checks)
+            ]
+        if not batch_tickets:
+            return
+        if export_jobs['current']:
+            report_export_job_progress(len(batch_tickets))
+        yield from batch
+        after = batch_tickets[-1]
+
+def get_csv_row(participant):
+    """Строка CSV-выгрузки участника"""
+    source, city = get_location_source(participant)
+    location = participant.get('location') or {}
+    coordinates = participant.get('coordinates') or {}
+    if not isinstance(location, dict):
+        location = {}
+    if not isinstance(coordinates, dict):
+        coordinates = {}
+    return [
+        participant.get('ticket_number', ''),
+        participant.get('full_name', ''),
+        participant.get('phone', ''),
+        participant.get('age', ''),
+        participant.get('gender', ''),
+        city,
+        source or '',
+        location.get('region', ''),
+        location.get('country', ''),
+        participant.get('registration_time', ''),
+        coordinates.get('latitude', ''),
+        coordinates.get('longitude', ''),
+        participant.get('ip_address', '')
+    ]
+
+def generate_export(export_format, filters, after=None, until=None, header=True):
+    """Генератор выгрузки участников в CSV или JSONL частями около EXPORT_CHUNK_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == 'csv' and header:
+        writer.writerow(EXPORT_CSV_COLUMNS)
+        # Заголовок отдаем сразу, не дожидаясь первой пачки участников
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    
+    for participant in iter_export_participants(filters, after, until):
+        if export_format == 'csv':
+            writer.writerow(get_csv_row(participant))
+        else:
+            buffer.write(json.dumps(participant, ensure_ascii=False))
+            buffer.write('\n')
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+def find_export_offset(file_obj, export_format, after):
+    """Смещение в файле выгрузки первой записи с номером больше after.
+
+    Файл выгрузки упорядочен по номерам участников. Записи CSV читаются
+    через csv.reader: поле в кавычках может занимать несколько строк.
+    """
+    file_obj.seek(0)
+    position = [0]
+    
+    def lines():
+        for line in file_obj:
+            position[0] += len(line)
+            yield line.decode('utf-8')
+    
+    if export_format == 'csv':
+        records = ((position[0], row[0] if row else '') for row in csv.reader(lines()))
+        # Заголовок пропускается: продолжение дописывается к уже полученному файлу
+        next(records, None)
+    else:
+        records = ((position[0], json.loads(line).get('ticket_number')) for line in lines())
+    
+    offset = position[0]
+    for end, ticket in records:
+        try:
+            if int(ticket) > after:
+                return offset
+        except (TypeError, ValueError):
+            pass
+        offset = end
+    return offset
+
+def gzip_chunks(chunks):
+    """Сжатие потока частей в gzip без накопления всего ответа"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # Сброс после каждой части, чтобы клиент получал данные сразу
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def write_chunks(file_obj, chunks):
+    """Запись потока частей в файл"""
+    for chunk in chunks:
+        file_obj.write(chunk)
+
+def get_export_cache_key(kind, filters):
+    """Ключ кэша выгрузки по виду файла, его столбцам и фильтрам"""
+    columns = EXPORT_ARTIFACTS[kind]['columns']
+    if isinstance(columns, list):
+        # У столбцов Excel в ключ входят заголовок и тип, функции значений не сериализуются
+        columns = [[c['header'], c['type']] if isinstance(c, dict) else c for c in columns]
+    raw = json.dumps([kind, columns, filters or {}], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:24]
+
+def get_export_snapshot():
+    """Ревизия данных и наибольший номер участника, по который строится выгрузка"""
+    load_participants()
+    with data_lock:
+        tickets = participants_index['tickets']
+        return participants_state['revision'], (tickets[-1] if tickets else 0)
+
+def get_append_until(cached_revision, revision, cached_last_ticket):
+    """Номер, по который дописываются новые участники, или None, если файл нужно пересобрать.
+
+    Дописывать можно, только если после ревизии файла участники лишь
+    добавлялись и все новые номера больше последнего номера в файле.
+    """
+    changes = get_changes_since(cached_revision, revision)
+    if changes is None or changes['removed']:
+        return None
+    added = [get_ticket_key(p) for p in changes['added']]
+    if any(ticket <= cached_last_ticket for ticket in added):
+        return None
+    return max(added, default=cached_last_ticket)
+
+def publish_export_artifact(kind, cache_key, revision, last_ticket, temp_path):
+    """Перенос собранного файла в кэш и запись о нем в базу состояния (под export_cache_lock).
+
+    У каждой ревизии свое имя файла: уже открытые предыдущие версии
+    дочитываются клиентами и после удаления записи.
+    """
+    path = os.path.join(EXPORT_CACHE_DIR, f"{cache_key}-{revision}{EXPORT_ARTIFACTS[kind]['suffix']}")
+    os.replace(temp_path, path)
+    size = os.path.getsize(path)
+    
+    db = get_state_db()
+    old = db.execute('SELECT path FROM export_artifacts WHERE cache_key = ?', (cache_key,)).fetchone()
+    db.execute(
+        'INSERT OR REPLACE INTO export_artifacts (cache_key, kind, revision, last_ticket, path, size, last_used) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (cache_key, kind, revision, last_ticket, path, size, time.time())
+    )
+    if old and old[0] != path:
+        try:
+            os.remove(old[0])
+        except OSError:
+            pass
+    evict_export_artifacts(keep=cache_key)
+    return path, size
+
+def evict_export_artifacts(keep=None):
+    """Удаление давно не использованных файлов, пока кэш больше EXPORT_CACHE_MAX_BYTES"""
+    db = get_state_db()
+    total = 0
+    for cache_key, path, size in db.execute(
+            'SELECT cache_key, path, size FROM export_artifacts ORDER BY last_used DESC').fetchall():
+        total += size
+        if total > EXPORT_CACHE_MAX_BYTES and cache_key != keep:
+            db.execute('DELETE FROM export_artifacts WHERE cache_key = ?', (cache_key,))
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def get_export_artifact(kind, filters=None, allow_build=True):
+    """Готовый файл выгрузки из кэша: открытый файл и его размер.
+
+    Файл текущей ревизии отдается как есть. Если после его сборки участники
+    только добавлялись, а формат это позволяет, новые строки дописываются
+    к копии прежнего файла. Иначе файл собирается заново, а при
+    allow_build=False возвращается None, чтобы вызывающий собрал его сам.
+    """
+    spec = EXPORT_ARTIFACTS[kind]
+    cache_key = get_export_cache_key(kind, filters)
+    revision, last_ticket = get_export_snapshot()
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    
+    with export_cache_lock:
+        db = get_state_db()
+        row = db.execute(
+            'SELECT revision, last_ticket, path, size FROM export_artifacts WHERE cache_key = ?', (cache_key,)
+        ).fetchone()
+        
+        if row:
+            cached_revision, cached_last_ticket, path, size = row
+            try:
+                if cached_revision == revision:
+                    file_obj = open(path, 'rb')
+                    db.execute('UPDATE export_artifacts SET last_used = ? WHERE cache_key = ?', (time.time(), cache_key))
+                    return file_obj, size
+                
+                append_until = get_append_until(cached_revision, revision, cached_last_ticket) if spec['append'] else None
+                if append_until is not None:
+                    fd, temp_path = tempfile.mkstemp(prefix=f'{cache_key}.', suffix='.tmp', dir=EXPORT_CACHE_DIR)
+                    with open(path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                        spec['append'](target, filters, cached_last_ticket, append_until)
+                    path, size = publish_export_artifact(kind, cache_key, revision, append_until, temp_path)
+                    return open(path, 'rb'), size
+            except FileNotFoundError:
+                # Файл удалил другой процесс - собираем заново
+                pass
+        
+        if not allow_build:
+            return None
+        
+        fd, temp_path = tempfile.mkstemp(prefix=f'{cache_key}.', suffix='.tmp', dir=EXPORT_CACHE_DIR)
+        try:
+            with os.fdopen(fd, 'wb') as target:
+                spec['build'](target, filters, last_ticket)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        path, size = publish_export_artifact(kind, cache_key, revision, last_ticket, temp_path)
+        return open(path, 'rb'), size
+
+def tee_export_artifact(export_format, filters):
+    """Потоковая выгрузка с одновременным сохранением в кэш выгрузок.
+
+    Клиент получает данные сразу, а после последней части файл
+    становится доступен следующим выгрузкам с теми же параметрами.
+    """
+    cache_key = get_export_cache_key(export_format, filters)
+    revision, last_ticket = get_export_snapshot()
+    fd, temp_path = tempfile.mkstemp(prefix=f'{cache_key}.', suffix='.tmp', dir=EXPORT_CACHE_DIR)
+    completed = False
+    try:
+        with os.fdopen(fd, 'wb') as target:
+            for chunk in generate_export(export_format, filters, until=last_ticket):
+                target.write(chunk)
+                yield chunk
+        with export_cache_lock:
+            publish_export_artifact(export_format, cache_key, revision, last_ticket, temp_path)
+        completed = True
+    finally:
+        # Клиент оборвал загрузку - недописанный файл не сохраняем
+        if not completed and os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def get_export_executor(name='executor', max_workers=EXPORT_JOB_WORKERS):
+    """Пул процессов для заданий выгрузки или частей выгрузки (создается при первом обращении).
+
+    Процессы запускаются через spawn: fork процесса с потоками веб-сервера
+    мог бы унаследовать захваченные блокировки.
+    """
+    with export_jobs_lock:
+        if export_jobs[name] is None:
+            export_jobs[name] = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return export_jobs[name]
+
+def update_export_job(job_id, **fields):
+    """Обновление полей задания в базе состояния"""
+    columns = ', '.join(f'{name} = ?' for name in fields)
+    get_state_db().execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+
+def report_export_job_progress(count):
+    """Учет обработанных участников текущего задания (в процессе пула)"""
+    export_jobs['processed'] += count
+    now = time.time()
+    if now - export_jobs['reported_at'] >= EXPORT_JOB_PROGRESS_INTERVAL:
+        export_jobs['reported_at'] = now
+        update_export_job(export_jobs['current'], processed=export_jobs['processed'])
+
+def load_export_snapshot(revision):
+    """Кэш участников процесса пула: локальный снимок и журнал после его ревизии.
+
+    В отличие от load_participants, снимок не перепроверяется и не
+    скачивается с Яндекс.Диска; только для файла без сведений о ревизии
+    выполняется обычная загрузка. revision - ревизия данных процесса
+    веб-сервера при постановке задания, выгрузка не может быть старше нее.
+    """
+    global PARTICIPANTS_CACHE
+    if PARTICIPANTS_CACHE is None:
+        participants, snapshot_revision = read_local_snapshot()
+        if snapshot_revision is None or not is_revision_replayable(snapshot_revision, get_data_revision()):
+            load_participants()
+        else:
+            PARTICIPANTS_CACHE = participants
+            rebuild_participants_index(participants)
+            reset_participants_state(participants, snapshot_revision)
+    sync_participants()
+    if participants_state['revision'] < revision:
+        raise RuntimeError(f"Данные участников процесса выгрузки старше ревизии {revision}")
+
+def run_export_job(job_id, kind, filters, revision=0):
+    """Выполнение задания выгрузки в процессе пула: файл собирается в кэш выгрузок"""
+    export_jobs['current'] = job_id
+    export_jobs['processed'] = 0
+    export_jobs['reported_at'] = 0
+    try:
+        load_export_snapshot(revision)
+        update_export_job(job_id, status='running', total=len(participants_index['tickets']))
+        file_obj, size = get_export_artifact(kind, filters)
+        file_obj.close()
+        update_export_job(
+            job_id, status='done', path=file_obj.name, size=size, processed=export_jobs['processed'],
+            finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        )
+    except Exception as e:
+        update_export_job(job_id, status='failed', error=str(e), finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        raise
+    finally:
+        export_jobs['current'] = None
+
+def finish_export_job(job_id, future):
+    """Завершение задания в процессе веб-сервера: учет падения процесса пула"""
+    with export_jobs_lock:
+        export_jobs['futures'].pop(job_id, None)
+    error = future.exception()
+    if error is None:
+        return
+    # Процесс пула мог упасть, не успев отметить задание
+    get_state_db().execute(
+        "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ? AND status IN ('queued', 'running')",
+        (str(error) or error.__class__.__name__, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id)
+    )
+    if isinstance(error, BrokenProcessPool):
+        with export_jobs_lock:
+            export_jobs['executor'] = None
+
+def submit_export_job(kind, filters=None):
+    """Постановка задания выгрузки в очередь. Возвращает id задания или None, если очередь заполнена.
+
+    Одинаковое задание, уже ожидающее в этом процессе, не дублируется.
+    """
+    params = json.dumps(filters or {}, ensure_ascii=False, sort_keys=True)
+    db = get_state_db()
+    with export_jobs_lock:
+        pending = [job_id for job_id, future in export_jobs['futures'].items() if not future.done()]
+        for job_id in pending:
+            if db.execute('SELECT 1 FROM jobs WHERE id = ? AND kind = ? AND params = ?', (job_id, kind, params)).fetchone():
+                return job_id
+        if len(pending) >= EXPORT_JOB_MAX_PENDING:
+            return None
+    
+    job_id = os.urandom(8).hex()
+    now = datetime.now()
+    db.execute(
+        "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+        (job_id, kind, params, now.strftime('%Y-%m-%d %H:%M:%S'))
+    )
+    db.execute('DELETE FROM jobs WHERE created_at < ?',
+               ((now - timedelta(days=EXPORT_JOB_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S'),))
+    
+    # Процесс пула загружает участников из локального снимка и журнала до текущей ревизии
+    future = get_export_executor().submit(run_export_job, job_id, kind, filters or {}, get_data_revision())
+    with export_jobs_lock:
+        export_jobs['futures'][job_id] = future
+    future.add_done_callback(lambda f: finish_export_job(job_id, f))
+    return job_id
+
+def get_export_job(job_id):
+    """Состояние задания выгрузки для API или None"""
+    row = get_state_db().execute(
+        'SELECT id, kind, params, status, processed, total, size, error, created_at, finished_at FROM jobs WHERE id = ?',
+        (job_id,)
+    ).fetchone()
+    if not row:
+        return None
+    job = dict(zip(('id', 'kind', 'filters', 'status', 'processed', 'total', 'size', 'error', 'created_at', 'finished_at'), row))
+    job['filters'] = json.loads(job['filters'])
+    job['progress'] = 100 if job['status'] == 'done' else (
+        min(99, int(job['processed'] * 100 / job['total'])) if job['total'] else 0)
+    if job['status'] == 'done':
+        job['download_url'] = url_for('download_export_job', job_id=job_id)
+    return job
+
+def wait_export_job(job_id, timeout):
+    """Открытый файл выполненного задания и его размер; None, если задание не завершилось за timeout секунд"""
+    with export_jobs_lock:
+        future = export_jobs['futures'].get(job_id)
+    if future is not None:
+        if not wait_futures([future], timeout=timeout).done:
+            return None
+        future.result()
+    row = get_state_db().execute('SELECT status, path, size, error FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    if not row or row[0] != 'done':
+        raise RuntimeError(f"Задание выгрузки {job_id} не выполнено: {row[3] if row else 'не найдено'}")
+    return open(row[1], 'rb'), row[2]
+
+def get_export_file(kind, filters=None):
+    """Открытый файл выгрузки и его размер: из кэша или собранный в пуле процессов.
+
+    Вызывающий поток (фоновая копия) ждет задание, не занимая GIL; если
+    очередь заданий заполнена, файл собирается в текущем процессе.
+    """
+    artifact = get_export_artifact(kind, filters, allow_build=False)
+    if artifact:
+        return artifact
+    
+    job_id = submit_export_job(kind, filters)
+    if job_id is None:
+        return get_export_artifact(kind, filters)
+    
+    artifact = wait_export_job(job_id, EXPORT_JOB_TIMEOUT)
+    if artifact is None:
+        raise RuntimeError(f"Задание выгрузки {job_id} не выполнено за {EXPORT_JOB_TIMEOUT} с")
+    return artifact
+
+def get_export_partitions(partition_by, filters, size=EXPORT_PARTITION_SIZE):
+    """Части секционированной выгрузки: имя и номера участников каждой части.
+
+    Части строятся на один снимок данных из участников, подходящих под
+    фильтры админки: по городу, по дню регистрации или по диапазонам
+    из size номеров. Номера передаются в процессы пула списком, поэтому
+    каждая часть собирается без повторного просмотра всех участников.
+    Возвращает ревизию данных и список частей.
+    """
+    revision, last_ticket = get_export_snapshot()
+    with data_lock:
+        matched = find_matching_tickets(filters) if filters else None
+        tickets = sorted(matched) if matched is not None else list(participants_index['tickets'])
+        tickets = tickets[:bisect.bisect_right(tickets, last_ticket)]
+        if partition_by == 'tickets':
+            groups = [(f'{group[0]}-{group[-1]}', group) for group in
+                      (tickets[i:i + size] for i in range(0, len(tickets), size))]
+        else:
+            by_ticket = participants_index['by_ticket']
+            grouped = {}
+            for t in tickets:
+                participant = by_ticket[t]
+                if partition_by == 'city':
+                    key = get_location_source(participant)[1]
+                else:
+                    key = str(participant.get('registration_time', ''))[:10]
+                grouped.setdefault(key, []).append(t)
+            groups = sorted(grouped.items())
+    
+    partitions = []
+    for name, group in groups:
+        partitions.append({
+            'name': name or ('без города' if partition_by == 'city' else 'без даты'),
+            'tickets': group
+        })
+    return revision, partitions
+
+def iter_participants_by_tickets(tickets):
+    """Участники с указанными номерами пачками по EXPORT_BATCH_SIZE (удаленные пропускаются)"""
+    for start in range(0, len(tickets), EXPORT_BATCH_SIZE):
+        with data_lock:
+            by_ticket = participants_index['by_ticket']
+            batch = [by_ticket[t] for t in tickets[start:start + EXPORT_BATCH_SIZE] if t in by_ticket]
+        yield from batch
+
+def build_export_partition(path, tickets):
+    """Сборка книги одной части выгрузки в процессе пула: число строк и sha256 файла"""
+    load_participants()
+    # Файл создан заранее: если выгрузку уже прервали и файл удален, часть не собираем
+    with open(path, 'r+b') as target:
+        rows = write_workbook(target, EXCEL_EXPORT_COLUMNS, iter_participants_by_tickets(tickets))
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return rows, digest.hexdigest()
+
+class ZipStreamBuffer:
+    """Поток без перемотки для zipfile: записанные байты забираются частями через pop()"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def get_partition_file_name(number, name):
+    """Имя файла части внутри архива"""
+    safe_name = re.sub(r'[^\w-]+', '_', name).strip('_') or 'part'
+    return f'{number:03d}_{safe_name}.xlsx'
+
+def generate_partitioned_export(partition_by, filters, revision, partitions):
+    """ZIP-архив с книгами частей выгрузки и manifest.json, отдаваемый частями.
+
+    Книги собираются параллельно в пуле процессов и попадают в архив по мере
+    готовности, без сжатия (xlsx уже сжат). Манифест с числом строк, размером
+    и sha256 каждой книги записывается последним.
+    """
+    executor = get_export_executor('partition_executor', EXPORT_PARTITION_WORKERS)
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    futures = {}
+    paths = []
+    try:
+        for number, partition in enumerate(partitions, start=1):
+            fd, path = tempfile.mkstemp(prefix='partition.', suffix='.tmp', dir=EXPORT_CACHE_DIR)
+            os.close(fd)
+            paths.append(path)
+            partition['file'] = get_partition_file_name(number, partition['name'])
+            futures[executor.submit(build_export_partition, path, partition['tickets'])] = (partition, path)
+        
+        buffer = ZipStreamBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for future in as_completed(futures):
+                partition, path = futures[future]
+                partition['rows'], partition['sha256'] = future.result()
+                partition['size'] = os.path.getsize(path)
+                
+                entry = zipfile.ZipInfo(partition['file'], date_time=datetime.now().timetuple()[:6])
+                entry.file_size = partition['size']
+                with open(path, 'rb') as source, archive.open(entry, 'w') as target:
+                    for chunk in iter(lambda: source.read(EXPORT_CHUNK_SIZE), b''):
+                        target.write(chunk)
+                        data = buffer.pop()
+                        if data:
+                            yield data
+                os.remove(path)
+            
+            manifest = {
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'revision': revision,
+                'partition_by': partition_by,
+                'filters': filters,
+                'columns': [column['header'] for column in EXCEL_EXPORT_COLUMNS],
+                'total_rows': sum(partition['rows'] for partition in partitions),
+                'partitions': [
+                    {name: partition[name] for name in ('file', 'name', 'rows', 'size', 'sha256')}
+                    for partition in partitions
+                ]
+            }
+            archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=4),
+                             compress_type=zipfile.ZIP_DEFLATED)
+        yield buffer.pop()
+    finally:
+        # Клиент оборвал загрузку - оставшиеся части не собираем
+        for future in futures:
+            future.cancel()
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+@app.route('/admin/jobs', methods=['POST'])
+def create_export_job():
+    """Постановка выгрузки в фоновую очередь: kind (xlsx, csv, jsonl) и фильтры админки"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    kind = request.values.get('kind', 'xlsx')
+    if kind not in ('xlsx', 'csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Поддерживаются выгрузки xlsx, csv и jsonl'}), 400
+    
+    job_id = submit_export_job(kind, parse_participant_filters(request.values))
+    if job_id is None:
+        return jsonify({'success': False, 'message': 'Очередь выгрузок заполнена, попробуйте позже'}), 429
+    
+    response = jsonify({'success': True, 'job': get_export_job(job_id)})
+    response.status_code = 202
+    response.headers['Location'] = url_for('export_job_status', job_id=job_id)
+    return response
+
+@app.route('/admin/jobs/<job_id>')
+def export_job_status(job_id):
+    """Состояние задания выгрузки: статус, прогресс и ссылка на файл"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    job = get_export_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Задание не найдено'}), 404
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/admin/jobs/<job_id>/download')
+def download_export_job(job_id):
+    """Скачивание файла выполненного задания выгрузки"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    row = get_state_db().execute("SELECT kind, path FROM jobs WHERE id = ? AND status = 'done'", (job_id,)).fetchone()
+    if not row:
+        return jsonify({'success': False, 'message': 'Задание не найдено или еще не выполнено'}), 404
+    
+    kind, path = row
+    try:
+        file_obj = open(path, 'rb')
+    except FileNotFoundError:
+        # Файл вытеснен из кэша или заменен более новой ревизией
+        return jsonify({'success': False, 'message': 'Файл устарел, запустите выгрузку заново'}), 410
+    
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    return send_file(file_obj, as_attachment=True, download_name=f"participants_{current_date}{EXPORT_ARTIFACTS[kind]['suffix']}")
+
+@app.route('/export', methods=['GET'])
+def export_participants():
+    """Потоковая выгрузка участников в CSV или JSONL с фильтрами админки.
+
+    cursor - номер последнего полученного участника для продолжения
+    прерванной выгрузки (без заголовка CSV); продолжение берется из того же
+    файла кэша выгрузок, что и полная выгрузка. gzip=1 включает сжатие
+    для клиентов, принимающих gzip.
+    """
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return jsonify({'success': False, 'message': 'Поддерживаются форматы csv и jsonl'}), 400
+    
+    after = None
+    if request.args.get('cursor'):
+        try:
+            after = int(request.args.get('cursor'))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Некорректный курсор'}), 400
+    
+    filters = parse_participant_filters(request.args)
+    # Выгрузка берется из кэша; полная без кэша собирается на лету с сохранением в кэш
+    artifact = get_export_artifact(export_format, filters, allow_build=False)
+    offset = 0
+    if artifact and after is not None:
+        offset = find_export_offset(artifact[0], export_format, after)
+    if artifact:
+        chunks = stream_file(*artifact, offset=offset)
+    elif after is None:
+        chunks = tee_export_artifact(export_format, filters)
+    else:
+        load_participants()
+        chunks = generate_export(export_format, filters, after, header=False)
+    
+    current_date = datetime.now().strftime('%Y-%m-%d')
+    headers = {
+        'Content-Disposition': f'attachment; filename=participants_{current_date}.{export_format}',
+        'Vary': 'Accept-Encoding',
+        'X-Accel-Buffering': 'no'
+    }
+    if request.args.get('gzip') == '1' and request.accept_encodings.quality('gzip') > 0:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    elif artifact:
+        headers['Content-Length'] = str(artifact[1] - offset)
+    
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return Response(chunks, mimetype=mimetype, headers=headers, direct_passthrough=True)
+
 @app.route('/update-whatsapp-link', methods=['POST'])
 def update_whatsapp_link():
     """Обновление ссылки на WhatsApp-сообщество"""
@@ -984,14 +3037,10 @@ def update_whatsapp_link():
         if not new_link:
             return jsonify({'success': False, 'message': 'Ссылка не может быть пустой'}), 400
         
-        # Загрузка текущих настроек
-        settings = load_settings()
-        
         # Обновление ссылки
-        settings['whatsapp_link'] = new_link
-        
-        # Сохранение обновленных настроек
-        save_settings(settings)
+        def set_link(settings):
+            settings['whatsapp_link'] = new_link
+        update_settings(set_link)
         
         return jsonify({'success': True, 'message': 'Ссылка успешно обновлена'})
     except Exception as e:
@@ -1025,36 +3074,15 @@ def update_backup_settings():
         if backup_enabled and not yandex_token:
             return jsonify({'success': False, 'message': 'Укажите токен Яндекс.Диска для резервного копирования'}), 400
         
-        # Загрузка текущих настроек
-        settings = load_settings()
-        
-        # Обновление настроек резервного копирования
-        if 'backup_settings' not in settings:
-            settings['backup_settings'] = copy.deepcopy(BACKUP_SETTINGS)
-        
-        # Сохраняем предыдущие значения для проверки, были ли изменения
-        old_enabled = settings['backup_settings'].get('enabled', False)
-        old_interval = settings['backup_settings'].get('interval', 'daily')
-        old_value = settings['backup_settings'].get('custom_value', 24)
-        old_unit = settings['backup_settings'].get('custom_unit', 'hours')
-        
-        # Обновляем настройки
-        settings['backup_settings']['enabled'] = backup_enabled
-        settings['backup_settings']['yandex_token'] = yandex_token
-        settings['backup_settings']['interval'] = backup_interval
-        settings['backup_settings']['custom_value'] = custom_value
-        settings['backup_settings']['custom_unit'] = custom_unit
-        
-        # Сохранение обновленных настроек
-        save_settings(settings)
-        
-        # Сигнализируем планировщику, что настройки изменились и нужно перезапустить расчёты
-        # Особенно если включили резервное копирование или изменили настройки интервала
-        if (not old_enabled and backup_enabled) or \
-           (old_interval != backup_interval) or \
-           (backup_interval == 'custom' and (old_value != custom_value or old_unit != custom_unit)):
-            # Устанавливаем флаг события, чтобы планировщик пересчитал время
-            scheduler_event.set()
+        # Обновление настроек резервного копирования; планировщик узнает
+        # об изменении через подписку на настройки
+        def set_backup_settings(settings):
+            if 'backup_settings' not in settings:
+                settings['backup_settings'] = copy.deepcopy(BACKUP_SETTINGS)
+            settings['backup_settings'].update(
+                enabled=backup_enabled, yandex_token=yandex_token, interval=backup_interval,
+                custom_value=custom_value, custom_unit=custom_unit)
+        settings = update_settings(set_backup_settings)
         
         # Формируем информационное сообщение о следующей резервной копии
         next_backup_message = ""
@@ -1108,30 +3136,220 @@ def manual_backup():
             return jsonify({'success': False, 'message': 'Не указан токен Яндекс.Диска для резервного копирования'}), 400
         
         # Создаем и отправляем резервную копию
-        success = send_backup_to_yadisk(participants, yandex_token)
+        publish_event('backup_started', {'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+        success = track_backup_run('admin', send_backup_to_yadisk, yandex_token)
         
         if success:
             # Обновляем время последнего резервного копирования
-            if 'backup_settings' not in settings:
-                settings['backup_settings'] = copy.deepcopy(BACKUP_SETTINGS)
-            
-            settings['backup_settings']['last_backup'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            save_settings(settings)
-            
+            settings = set_last_backup(datetime.now())
+        
+        publish_event('backup_finished', {
+            'success': success,
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'last_backup': settings.get('backup_settings', {}).get('last_backup')
+        })
+        
+        if success:
             return jsonify({'success': True, 'message': 'Резервная копия успешно загружена на Яндекс.Диск'})
         else:
             return jsonify({'success': False, 'message': 'Не удалось создать резервную копию'}), 500
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-# Добавляем настройку для сжатия ответов
+# Сжатие ответов: HTML и JSON сжимаются на лету, статика - заранее (build_assets.py)
+COMPRESS_MIN_SIZE = 1024                       # байты; меньшие ответы не сжимаются
+COMPRESS_MIMETYPES = ('text/html', 'application/json')
+COMPRESS_LEVELS = {'br': 5, 'gzip': 6}         # быстрые уровни для сжатия на лету
+COMPRESS_CACHE_SIZE = 64                       # сжатые тела ответов с ETag
+STATIC_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# Манифест build_assets.py: логическое имя статики -> файл с хэшем содержимого в static/dist/
+ASSET_MANIFEST_FILE = os.path.join(app.static_folder, 'dist', 'manifest.json')
+# Файлы с хэшем содержимого в имени (custom.3f2a9c01d4.css) кэшируются навсегда,
+# остальная статика, включая сам манифест, перепроверяется по ETag
+ASSET_HASHED_FILE = re.compile(r'^dist/.+\.[0-9a-f]{10}\.[A-Za-z0-9]+$')
+asset_manifest = {'data': {}, 'mtime': None}
+
+def choose_encoding(accept_encoding):
+    """Кодировка ответа по Accept-Encoding: br (если доступен Brotli), gzip или None"""
+    accept = parse_accept_header(accept_encoding)
+    br_quality = accept.quality('br') if brotli is not None else 0
+    gzip_quality = accept.quality('gzip')
+    if br_quality > 0 and br_quality >= gzip_quality:
+        return 'br'
+    return 'gzip' if gzip_quality > 0 else None
+
+def compress_body(body, encoding):
+    """Сжатие тела ответа в br или gzip"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=COMPRESS_LEVELS['br'])
+    compressor = zlib.compressobj(COMPRESS_LEVELS['gzip'], zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+class CompressionMiddleware:
+    """WSGI-обертка: HTML и JSON от COMPRESS_MIN_SIZE байт сжимаются по Accept-Encoding.
+
+    Потоковые ответы (без Content-Length), уже сжатые и прочие типы проходят
+    без изменений. Тела ответов с ETag сжимаются один раз и берутся из
+    LRU-кэша; сильный ETag становится слабым, так как сжатое тело отличается
+    от исходного, а If-None-Match сравнивается по слабому правилу.
+    """
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def __call__(self, environ, start_response):
+        encoding = None
+        if environ.get('REQUEST_METHOD') != 'HEAD':
+            encoding = choose_encoding(environ.get('HTTP_ACCEPT_ENCODING'))
+        response = {}
+        
+        def capture(status, headers, exc_info=None):
+            names = {name.lower(): value for name, value in headers}
+            mimetype = names.get('content-type', '').split(';')[0].strip()
+            if mimetype not in COMPRESS_MIMETYPES or 'content-encoding' in names:
+                return start_response(status, headers, exc_info)
+            # Ответ зависит от Accept-Encoding, даже если именно этот клиент сжатие не принимает
+            headers = [(name, value) for name, value in headers if name.lower() != 'vary']
+            vary = [v.strip() for v in names.get('vary', '').split(',') if v.strip()]
+            headers.append(('Vary', ', '.join(vary + ['Accept-Encoding'])))
+            length = names.get('content-length')
+            if encoding is None or not status.startswith('200') or not length or int(length) < COMPRESS_MIN_SIZE:
+                return start_response(status, headers, exc_info)
+            response.update(status=status, headers=headers, etag=names.get('etag'))
+            return response.setdefault('body', []).append
+        
+        app_iter = self.wsgi_app(environ, capture)
+        if 'status' not in response:
+            return app_iter
+        try:
+            body = b''.join(response['body'] + list(app_iter))
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        
+        etag = response['etag']
+        compressed = None
+        if etag:
+            key = (environ.get('PATH_INFO'), etag, encoding)
+            with self.lock:
+                compressed = self.cache.get(key)
+                if compressed is not None:
+                    self.cache.move_to_end(key)
+        if compressed is None:
+            compressed = compress_body(body, encoding)
+            if etag:
+                with self.lock:
+                    self.cache[key] = compressed
+                    while len(self.cache) > COMPRESS_CACHE_SIZE:
+                        self.cache.popitem(last=False)
+        
+        headers = [(name, value) for name, value in response['headers']
+                   if name.lower() not in ('content-length', 'etag')]
+        headers.append(('Content-Encoding', encoding))
+        headers.append(('Content-Length', str(len(compressed))))
+        if etag:
+            headers.append(('ETag', etag if etag.startswith('W/') else 'W/' + etag))
+        start_response(response['status'], headers)
+        return [compressed]
+
+app.wsgi_app = CompressionMiddleware(app.wsgi_app)
+
+def send_static_file_negotiated(filename):
+    """Статика с учетом Accept-Encoding: заранее сжатые варианты из build_assets.py.
+
+    Вариант file.br или file.gz отдается, только если время его изменения
+    совпадает с исходным файлом (иначе он устарел).
+    """
+    path = safe_join(app.static_folder, filename)
+    variants = []
+    if path is not None and os.path.isfile(path):
+        mtime = os.stat(path).st_mtime_ns
+        for encoding, suffix in STATIC_ENCODINGS:
+            try:
+                if os.stat(path + suffix).st_mtime_ns == mtime:
+                    variants.append(encoding)
+            except OSError:
+                pass
+    
+    encoding = None
+    if variants:
+        accept = request.accept_encodings
+        encoding = max(variants, key=lambda e: (accept.quality(e), e == 'br'))
+        if accept.quality(encoding) <= 0:
+            encoding = None
+    
+    if encoding is None:
+        response = app.send_static_file(filename)
+    else:
+        suffix = dict(STATIC_ENCODINGS)[encoding]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(app.static_folder, filename + suffix, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    if variants:
+        response.vary.add('Accept-Encoding')
+    if ASSET_HASHED_FILE.match(filename):
+        # Имя файла меняется вместе с содержимым - перепроверять его не нужно
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+app.view_functions['static'] = send_static_file_negotiated
+
+def get_asset_manifest():
+    """Манифест собранной статики; перечитывается, когда build_assets.py его заменил"""
+    try:
+        mtime = os.stat(ASSET_MANIFEST_FILE).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime != asset_manifest['mtime']:
+        data = {}
+        if mtime is not None:
+            try:
+                with open(ASSET_MANIFEST_FILE, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+            except (OSError, ValueError) as e:
+                app.logger.error(f"Ошибка при чтении манифеста статики: {str(e)}")
+        asset_manifest['data'] = data
+        asset_manifest['mtime'] = mtime
+    return asset_manifest['data']
+
+@app.url_defaults
+def fingerprint_static_url(endpoint, values):
+    """url_for('static', filename=...) ведет на копию с хэшем содержимого, если статика собрана"""
+    if endpoint == 'static' and 'filename' in values:
+        entry = get_asset_manifest().get(values['filename'])
+        if entry:
+            values['filename'] = entry['file']
+
+@app.template_global()
+def static_image(filename):
+    """Адаптивное изображение: src, srcset исходного формата и WebP, ширина и высота.
+
+    Без собранной статики srcset пустые, и шаблон выводит обычный <img>.
+    """
+    entry = get_asset_manifest().get(filename) or {}
+    srcset = {
+        mimetype: ', '.join(f"{url_for('static', filename=name)} {width}w" for name, width in variants)
+        for mimetype, variants in entry.get('srcset', {}).items() if variants
+    }
+    return {
+        'src': url_for('static', filename=filename),
+        'webp': srcset.pop('image/webp', ''),
+        'srcset': next(iter(srcset.values()), ''),
+        'width': entry.get('width'),
+        'height': entry.get('height')
+    }
+
 @app.after_request
 def add_header(response):
     # Кэширование статических файлов
     if 'Cache-Control' not in response.headers:
         if request.path.startswith('/static/'):
-            # Кэшировать статические файлы на 1 год
-            response.headers['Cache-Control'] = 'public, max-age=31536000'
+            # Надолго кэшируются только файлы с хэшем (send_static_file_negotiated),
+            # прочие ответы статики перепроверяются
+            response.headers['Cache-Control'] = 'no-cache'
         else:
             # Не кэшировать HTML-страницы
             response.headers['Cache-Control'] = 'no-store'
@@ -1147,72 +3365,102 @@ def add_header(response):
         elif 'application/javascript' in response.headers['Content-Type']:
             response.headers['Content-Type'] = 'application/javascript; charset=utf-8'
     
-    return response
+    return response
+
+# Функция для создания и загрузки резервной копии на Яндекс.Диск
+def prepare_backup_participant(participant):
+    """Копия участника с проверенной кодировкой ФИО и города для резервной копии"""
+    processed_participant = copy.deepcopy(participant)
+    
+    # Проверяем кодировку ФИО
+    full_name = participant.get('full_name', '')
+    if isinstance(full_name, str):
+        try:
+            # Проверяем корректность UTF-8
+            full_name.encode('utf-8').decode('utf-8')
+        except UnicodeError:
+            # Если есть проблемы, пробуем исправить
+            try:
+                full_name = full_name.encode('latin1').decode('utf-8')
+            except:
+                full_name = full_name.encode('utf-8', errors='replace').decode('utf-8')
+    processed_participant['full_name'] = full_name
+    
+    # Проверяем кодировку города
+    if 'coordinates' in participant and 'city' in participant['coordinates'] and participant['coordinates']['city']:
+        city = participant['coordinates']['city']
+        if isinstance(city, str):
+            try:
+                city.encode('utf-8').decode('utf-8')
+            except UnicodeError:
+                try:
+                    city = city.encode('latin1').decode('utf-8')
+                except:
+                    city = city.encode('utf-8', errors='replace').decode('utf-8')
+            processed_participant['coordinates']['city'] = city
+    
+    if 'location' in participant and 'city' in participant['location'] and participant['location']['city']:
+        city = participant['location']['city']
+        if isinstance(city, str):
+            try:
+                city.encode('utf-8').decode('utf-8')
+            except UnicodeError:
+                try:
+                    city = city.encode('latin1').decode('utf-8')
+                except:
+                    city = city.encode('utf-8', errors='replace').decode('utf-8')
+            processed_participant['location']['city'] = city
+    
+    return processed_participant
 
-# Функция для создания и загрузки резервной копии на Яндекс.Диск
-def send_backup_to_yadisk(json_data, token):
+def write_backup_json(file_obj, participants):
+    """Запись участников в JSON-массив, как json.dumps(..., indent=4), по одному участнику.
+
+    Если file_obj уже содержит массив, участники дописываются в его конец.
+    """
+    size = file_obj.tell()
+    first = True
+    for participant in participants:
+        item = json.dumps(prepare_backup_participant(participant), ensure_ascii=False, indent=4)
+        if first:
+            if size > 2:
+                # Заменяем закрывающие "\n]" на разделитель
+                file_obj.seek(size - 2)
+                file_obj.write(b',\n')
+            else:
+                file_obj.seek(0)
+                file_obj.write(b'[\n')
+            first = False
+        else:
+            file_obj.write(b',\n')
+        file_obj.write('\n'.join('    ' + line for line in item.split('\n')).encode('utf-8'))
+    
+    if not first:
+        file_obj.write(b'\n]')
+    elif size == 0:
+        file_obj.write(b'[]')
+
+def send_backup_to_yadisk(token):
     """Загрузка резервной копии данных на Яндекс.Диск"""
+    excel_file = json_file = None
     try:
-        # Обработка кириллических символов в данных участников
-        processed_json_data = []
-        for participant in json_data:
-            processed_participant = participant.copy()
-            
-            # Проверяем кодировку ФИО
-            full_name = participant.get('full_name', '')
-            if isinstance(full_name, str):
-                try:
-                    # Проверяем корректность UTF-8
-                    full_name.encode('utf-8').decode('utf-8')
-                except UnicodeError:
-                    # Если есть проблемы, пробуем исправить
-                    try:
-                        full_name = full_name.encode('latin1').decode('utf-8')
-                    except:
-                        full_name = full_name.encode('utf-8', errors='replace').decode('utf-8')
-            processed_participant['full_name'] = full_name
-            
-            # Проверяем кодировку города
-            if 'coordinates' in participant and 'city' in participant['coordinates'] and participant['coordinates']['city']:
-                city = participant['coordinates']['city']
-                if isinstance(city, str):
-                    try:
-                        city.encode('utf-8').decode('utf-8')
-                    except UnicodeError:
-                        try:
-                            city = city.encode('latin1').decode('utf-8')
-                        except:
-                            city = city.encode('utf-8', errors='replace').decode('utf-8')
-                    processed_participant['coordinates']['city'] = city
-            
-            if 'location' in participant and 'city' in participant['location'] and participant['location']['city']:
-                city = participant['location']['city']
-                if isinstance(city, str):
-                    try:
-                        city.encode('utf-8').decode('utf-8')
-                    except UnicodeError:
-                        try:
-                            city = city.encode('latin1').decode('utf-8')
-                        except:
-                            city = city.encode('utf-8', errors='replace').decode('utf-8')
-                    processed_participant['location']['city'] = city
-            
-            processed_json_data.append(processed_participant)
-        
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         print(f"[{datetime.now()}] Начинаем создание резервной копии и загрузку на Яндекс.Диск")
         
-        # Создаем Excel-файл
-        excel_data = create_excel_backup(processed_json_data)
-        print(f"[{datetime.now()}] Excel файл создан в памяти")
-        
-        # Создаем JSON-файл, явно указываем, что не нужно экранировать не-ASCII символы
-        json_str = json.dumps(processed_json_data, ensure_ascii=False, indent=4)
-        json_bytes = json_str.encode('utf-8')
-        print(f"[{datetime.now()}] JSON файл создан в памяти")
+        # Excel и JSON берутся из кэша выгрузок, если данные не менялись с прошлой копии,
+        # иначе собираются в пуле процессов
+        stage = time.perf_counter()
+        excel_file, _ = get_export_file('backup-xlsx')
+        record_backup_timing('excel', time.perf_counter() - stage)
+        stage = time.perf_counter()
+        json_file, _ = get_export_file('backup-json')
+        record_backup_timing('json', time.perf_counter() - stage)
+        with data_lock:
+            note_backup_run(type='full', revision=participants_state['revision'], records=len(participants_index['tickets']))
+        print(f"[{datetime.now()}] Файлы резервной копии подготовлены")
         
         # Путь на Яндекс.Диске, где будут храниться резервные копии
-        folder_path = "/kvdarit_avto35_backup"
+        folder_path = BACKUP_MANUAL_FOLDER
         
         # Создаем папку на Яндекс.Диске, если она не существует
         headers = {"Authorization": f"OAuth {token}"}
@@ -1227,156 +3475,352 @@ def send_backup_to_yadisk(json_data, token):
         
         if response.status_code not in [200, 201, 409]:  # 409 - папка уже существует
             print(f"[{datetime.now()}] Ошибка при создании папки на Яндекс.Диске: {response.status_code}, {response.text}")
+            note_backup_run(error=f"Ошибка при создании папки на Яндекс.Диске: {response.status_code}")
             return False
         
-        # Загружаем Excel-файл
+        # Excel и JSON загружаются одновременно, потоком из временных файлов
         excel_filename = f"participants_{timestamp}.xlsx"
-        excel_upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        excel_params = {
-            "path": f"{folder_path}/{excel_filename}",
-            "overwrite": "true"
-        }
-        
-        # Получаем URL для загрузки Excel-файла
-        print(f"[{datetime.now()}] Получаем URL для загрузки Excel файла")
-        response = requests.get(excel_upload_url, params=excel_params, headers=headers)
-        if response.status_code == 200:
-            href = response.json().get("href", "")
-            # Загружаем данные на полученный URL
-            print(f"[{datetime.now()}] Загружаем Excel файл на Яндекс.Диск")
-            upload_response = requests.put(href, data=excel_data.getvalue())
-            if upload_response.status_code != 201:
-                print(f"[{datetime.now()}] Ошибка при загрузке Excel-файла: {upload_response.status_code}, {upload_response.text}")
-                return False
-            print(f"[{datetime.now()}] Excel файл успешно загружен")
-        else:
-            print(f"[{datetime.now()}] Ошибка при получении URL для загрузки Excel-файла: {response.status_code}, {response.text}")
-            return False
-        
-        # Загружаем JSON-файл
         json_filename = f"participants_{timestamp}.json"
-        json_params = {
-            "path": f"{folder_path}/{json_filename}",
-            "overwrite": "true"
-        }
-        
-        # Получаем URL для загрузки JSON-файла
-        print(f"[{datetime.now()}] Получаем URL для загрузки JSON файла")
-        # Исправляем переменную: указываем правильное название json_upload_url
-        json_upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        response = requests.get(json_upload_url, params=json_params, headers=headers)
-        if response.status_code == 200:
-            href = response.json().get("href", "")
-            # Загружаем данные на полученный URL
-            print(f"[{datetime.now()}] Загружаем JSON файл на Яндекс.Диск")
-            upload_response = requests.put(href, data=json_bytes)
-            if upload_response.status_code != 201:
-                print(f"[{datetime.now()}] Ошибка при загрузке JSON-файла: {upload_response.status_code}, {upload_response.text}")
-                return False
-            print(f"[{datetime.now()}] JSON файл успешно загружен")
-        else:
-            print(f"[{datetime.now()}] Ошибка при получении URL для загрузки JSON-файла: {response.status_code}, {response.text}")
+        print(f"[{datetime.now()}] Загружаем Excel и JSON файлы на Яндекс.Диск")
+        uploaded = upload_files_to_yadisk(headers, {
+            f"{folder_path}/{excel_filename}": excel_file,
+            f"{folder_path}/{json_filename}": json_file
+        })
+        if not all(uploaded.values()):
+            failed = ', '.join(path for path, ok in uploaded.items() if not ok)
+            print(f"[{datetime.now()}] Ошибка при загрузке файлов резервной копии: {failed}")
+            note_backup_run(error=f"Не удалось загрузить: {failed}")
             return False
         
         print(f"[{datetime.now()}] Резервная копия успешно сохранена на Яндекс.Диске: {excel_filename}, {json_filename}")
         return True
     except Exception as e:
         import traceback
+        note_backup_run(error=str(e))
         print(f"[{datetime.now()}] Критическая ошибка при создании резервной копии на Яндекс.Диск: {e}")
         print(traceback.format_exc())  # Выводим полный стек вызовов для отладки
         return False
+    finally:
+        for file_obj in (excel_file, json_file):
+            if file_obj:
+                file_obj.close()
 
-def create_excel_backup(json_data):
-    """Создание Excel-файла с данными участников"""
-    output = io.BytesIO()
-    
-    # Создаем Excel-файл с явной настройкой для поддержки Unicode
-    workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'strings_to_unicode': True})
-    worksheet = workbook.add_worksheet('Участники')
-    
-    # Форматирование
-    header_format = workbook.add_format({
-        'bold': True,
-        'bg_color': '#007bff',
-        'font_color': 'white',
-        'border': 1
-    })
-    
-    cell_format = workbook.add_format({
-        'border': 1
-    })
-    
-    # Заголовки
-    headers = ['№', 'Номер участника', 'ФИО', 'Телефон', 'Возраст', 'Пол', 'Город', 'Дата регистрации', 'IP-адрес']
-    for col, header in enumerate(headers):
-        worksheet.write(0, col, header, header_format)
+# Файлы выгрузок, которые хранятся в кэше: build(файл, фильтры, по_номер) собирает файл
+# целиком, append(файл, фильтры, после_номера, по_номер) дописывает новых участников
+EXPORT_ARTIFACTS = {
+    'xlsx': {
+        'suffix': '.xlsx',
+        'columns': EXCEL_EXPORT_COLUMNS,
+        'build': lambda f, filters, until: write_workbook(f, EXCEL_EXPORT_COLUMNS, iter_export_participants(filters, until=until)),
+        'append': None
+    },
+    'csv': {
+        'suffix': '.csv',
+        'columns': EXPORT_CSV_COLUMNS,
+        'build': lambda f, filters, until: write_chunks(f, generate_export('csv', filters, until=until)),
+        'append': lambda f, filters, after, until: write_chunks(f, generate_export('csv', filters, after, until, header=False))
+    },
+    'jsonl': {
+        'suffix': '.jsonl',
+        'columns': 'participant',
+        'build': lambda f, filters, until: write_chunks(f, generate_export('jsonl', filters, until=until)),
+        'append': lambda f, filters, after, until: write_chunks(f, generate_export('jsonl', filters, after, until))
+    },
+    'backup-json': {
+        'suffix': '.json',
+        'columns': 'participant',
+        'build': lambda f, filters, until: write_backup_json(f, iter_export_participants(filters, until=until)),
+        'append': lambda f, filters, after, until: write_backup_json(f, iter_export_participants(filters, after, until))
+    },
+    'backup-xlsx': {
+        'suffix': '.xlsx',
+        'columns': BACKUP_EXCEL_COLUMNS,
+        'build': lambda f, filters, until: write_workbook(
+            f, BACKUP_EXCEL_COLUMNS, (prepare_backup_participant(p) for p in iter_export_participants(filters, until=until))),
+        'append': None
+    },
+    'full-backup-xlsx': {
+        'suffix': '.xlsx',
+        'columns': FULL_BACKUP_EXCEL_COLUMNS,
+        'build': lambda f, filters, until: write_workbook(
+            f, FULL_BACKUP_EXCEL_COLUMNS, (prepare_backup_participant(p) for p in iter_export_participants(filters, until=until))),
+        'append': None
+    }
+}
+
+# Функция для создания и отправки резервной копии
+def create_backup(trigger='schedule'):
+    """Создает резервную копию данных на Яндекс.Диске и сообщает о ней в поток событий.
+
+    Если копию уже делает другой процесс (аренда BACKUP_RUN_LEASE_NAME занята),
+    возвращает False, ничего не выгружая. Каждый запуск попадает в историю
+    backup_runs с причиной trigger: schedule, startup или registration.
+    """
+    return track_backup_run(trigger, run_exclusive_backup)
+
+def run_exclusive_backup():
+    """Копия под арендой BACKUP_RUN_LEASE_NAME: одна на все процессы"""
+    if not acquire_lease(BACKUP_RUN_LEASE_NAME, BACKUP_RUN_LEASE_TTL):
+        print(f"[{datetime.now()}] Резервную копию уже создает другой процесс")
+        note_backup_run(outcome='busy')
+        return False
+    try:
+        return run_backup()
+    finally:
+        release_lease(BACKUP_RUN_LEASE_NAME)
+
+def run_backup():
+    """Копия с событиями backup_started и backup_finished для админки"""
+    publish_event('backup_started', {'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')})
+    success = False
+    try:
+        success = perform_backup()
+        if success:
+            # Время последней копии (и проверки без изменений) записывается один раз за запуск
+            set_last_backup(datetime.now())
+        return success
+    finally:
+        publish_event('backup_finished', {
+            'success': success,
+            'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'last_backup': load_settings().get('backup_settings', {}).get('last_backup')
+        })
+
+BACKUP_ENTRY_FIELDS = ('id', 'type', 'revision', 'base_revision', 'path', 'excel_path', 'sha256',
+                       'size', 'records', 'removed', 'previous', 'created_at', 'content_sha256')
+
+def get_participants_digest():
+    """Хэш содержимого участников, не зависящий от порядка и ревизий: по участникам в порядке номеров"""
+    digest = hashlib.sha256()
+    with data_lock:
+        by_ticket = participants_index['by_ticket']
+        for ticket in participants_index['tickets']:
+            digest.update(json.dumps(by_ticket[ticket], ensure_ascii=False, sort_keys=True).encode('utf-8'))
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+def get_backup_entries():
+    """Записи плановых копий последних BACKUP_MANIFEST_CHAINS цепочек (от старых к новым)"""
+    db = get_state_db()
+    fulls = db.execute(
+        "SELECT id FROM backups WHERE type = 'full' ORDER BY id DESC LIMIT ?", (BACKUP_MANIFEST_CHAINS,)
+    ).fetchall()
+    if not fulls:
+        return []
+    rows = db.execute(
+        f"SELECT {', '.join(BACKUP_ENTRY_FIELDS)} FROM backups WHERE id >= ? ORDER BY id", (fulls[-1][0],)
+    ).fetchall()
+    return [dict(zip(BACKUP_ENTRY_FIELDS, row)) for row in rows]
+
+def get_backup_manifest(entries):
+    """Манифест плановых копий: цепочки из полного снимка и дельт к нему.
+
+    Для восстановления берется снимок цепочки и по порядку применяются
+    ее дельты; previous каждой записи - sha256 предыдущего файла цепочки.
+    """
+    chains = []
+    for entry in entries:
+        item = {name: value for name, value in entry.items() if name != 'id' and value is not None}
+        if entry['type'] == 'full':
+            chains.append({'full': item, 'deltas': []})
+        elif chains:
+            chains[-1]['deltas'].append(item)
+    return {
+        'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'chains': chains
+    }
+
+def track_backup_run(trigger, func, *args):
+    """Выполнение копии с записью в историю backup_runs: время этапов, объем, исход и ошибка.
+
+    Этапы и сведения внутри func сообщают record_backup_timing и note_backup_run;
+    исход - success или failed по результату func, если func не указала
+    skipped (данные не менялись) или busy (копию делает другой процесс).
+    """
+    run = {'trigger': trigger, 'outcome': None, 'type': None, 'revision': None, 'records': None,
+           'removed': None, 'bytes': 0, 'timings': {}, 'error': None, 'started_at': time.time()}
+    backup_run_local.run = run
+    started = time.perf_counter()
+    result = False
+    try:
+        result = func(*args)
+        return result
+    except Exception as e:
+        note_backup_run(error=str(e))
+        raise
+    finally:
+        backup_run_local.run = None
+        run['timings']['total'] = round(time.perf_counter() - started, 3)
+        run['outcome'] = run['outcome'] or ('success' if result else 'failed')
+        run['finished_at'] = time.time()
+        save_backup_run(run)
+
+def note_backup_run(**fields):
+    """Сведения о текущей копии для истории; bytes суммируются, сохраняется первая ошибка"""
+    run = getattr(backup_run_local, 'run', None)
+    if run is None:
+        return
+    for name, value in fields.items():
+        if name == 'bytes':
+            run['bytes'] += value
+        elif name != 'error' or run['error'] is None:
+            run[name] = value
+
+def record_backup_timing(name, seconds):
+    """Длительность этапа текущей копии, секунды (повторные этапы суммируются)"""
+    run = getattr(backup_run_local, 'run', None)
+    if run is not None:
+        run['timings'][name] = round(run['timings'].get(name, 0) + seconds, 3)
+
+def save_backup_run(run):
+    """Запись запуска в backup_runs; старше BACKUP_RUNS_RETENTION записей удаляются"""
+    try:
+        db = get_state_db()
+        cursor = db.execute(
+            """INSERT INTO backup_runs (trigger, outcome, type, revision, records, removed, bytes, timings, error,
+                                        pid, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (run['trigger'], run['outcome'], run['type'], run['revision'], run['records'], run['removed'], run['bytes'],
+             json.dumps(run['timings']), run['error'], os.getpid(), run['started_at'], run['finished_at'])
+        )
+        db.execute('DELETE FROM backup_runs WHERE id <= ?', (cursor.lastrowid - BACKUP_RUNS_RETENTION,))
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при записи истории резервных копий: {str(e)}")
+
+BACKUP_RUN_FIELDS = ('id', 'trigger', 'outcome', 'type', 'revision', 'records', 'removed', 'bytes', 'timings',
+                     'error', 'pid', 'started_at', 'finished_at')
+
+def get_backup_runs(limit=BACKUP_HISTORY_PAGE_SIZE, before=None, where='1'):
+    """Запуски копий из истории, от новых к старым (before - id, с которого продолжить)"""
+    params = []
+    if before is not None:
+        where += ' AND id < ?'
+        params.append(before)
+    rows = get_state_db().execute(
+        f"SELECT {', '.join(BACKUP_RUN_FIELDS)} FROM backup_runs WHERE {where} ORDER BY id DESC LIMIT ?",
+        (*params, limit)
+    ).fetchall()
+    runs = []
+    for row in rows:
+        run = dict(zip(BACKUP_RUN_FIELDS, row))
+        run['timings'] = json.loads(run['timings'])
+        run['duration'] = round(run['finished_at'] - run['started_at'], 3)
+        for name in ('started_at', 'finished_at'):
+            run[name] = datetime.fromtimestamp(run[name]).strftime('%Y-%m-%d %H:%M:%S')
+        runs.append(run)
+    return runs
+
+def get_backup_upload_label(remote_path):
+    """Постоянное имя этапа загрузки для истории: upload_json, upload_xlsx, upload_delta, upload_manifest"""
+    name = remote_path.rsplit('/', 1)[-1]
+    if name == 'manifest.json':
+        return 'upload_manifest'
+    if name.endswith('.delta.json'):
+        return 'upload_delta'
+    return 'upload_' + name.rsplit('.', 1)[-1]
+
+def hash_file(file_obj):
+    """sha256 и размер файла (позиция возвращается в начало)"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    size = 0
+    for chunk in iter(lambda: file_obj.read(EXPORT_CHUNK_SIZE), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest(), size
+
+def write_backup_delta(file_obj, changes, base_revision, revision):
+    """Запись дельты плановой копии: участники, добавленные и удаленные после base_revision"""
+    delta = {
+        'type': 'delta',
+        'base_revision': base_revision,
+        'revision': revision,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'added': [prepare_backup_participant(p) for p in changes['added']],
+        'removed': changes['removed']
+    }
+    file_obj.write(json.dumps(delta, ensure_ascii=False, indent=4).encode('utf-8'))
+
+def upload_to_yadisk(headers, remote_path, data):
+    """Загрузка файла или байтов на Яндекс.Диск с перезаписью.
+
+    Файл передается потоком из открытого дескриптора, без копии в памяти.
+    Ссылка для загрузки принимает только целый файл, поэтому при сетевой
+    ошибке или ответе 429/5xx загрузка повторяется с начала файла с новой
+    ссылкой, до YADISK_UPLOAD_RETRIES раз с растущей паузой.
+    """
+    for attempt in range(YADISK_UPLOAD_RETRIES + 1):
+        if attempt:
+            time.sleep(YADISK_UPLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+            print(f"[{datetime.now()}] Повторная загрузка {remote_path} (попытка {attempt + 1})")
+        if hasattr(data, 'seek'):
+            data.seek(0)
+        try:
+            upload_response = requests.get(
+                "https://cloud-api.yandex.net/v1/disk/resources/upload",
+                headers=headers, params={"path": remote_path, "overwrite": "true"}, timeout=YADISK_UPLOAD_TIMEOUT
+            )
+            if upload_response.status_code == 200:
+                upload_result = requests.put(upload_response.json().get("href"), data=data, timeout=YADISK_UPLOAD_TIMEOUT)
+                status = upload_result.status_code
+                if status in (200, 201):
+                    return True
+                print(f"[{datetime.now()}] Ошибка при загрузке {remote_path}: {status}")
+            else:
+                status = upload_response.status_code
+                print(f"[{datetime.now()}] Ошибка при получении ссылки для загрузки {remote_path}: {status}")
+        except requests.RequestException as e:
+            status = None
+            print(f"[{datetime.now()}] Сетевая ошибка при загрузке {remote_path}: {e}")
+        # Остальные ошибки клиента (нет места, неверный токен) повтором не исправить
+        if status is not None and status < 500 and status != 429:
+            return False
+    return False
+
+def upload_files_to_yadisk(headers, files):
+    """Параллельная загрузка файлов одной копии: {путь на Диске: файл или байты} -> {путь: успех}.
+
+    Общее время загрузки близко ко времени самого долгого файла.
+    """
+    def timed_upload(remote_path, data):
+        started = time.perf_counter()
+        return upload_to_yadisk(headers, remote_path, data), time.perf_counter() - started
     
-    # Данные участников
-    for row, participant in enumerate(json_data, start=1):
-        worksheet.write(row, 0, row, cell_format)
-        worksheet.write(row, 1, participant.get('ticket_number', ''), cell_format)
-        
-        # Проверяем кодировку ФИО перед записью
-        full_name = participant.get('full_name', '')
-        if isinstance(full_name, str):
-            try:
-                # Проверяем корректность UTF-8
-                full_name.encode('utf-8').decode('utf-8')
-            except UnicodeError:
-                # Если есть проблемы, пробуем исправить
-                try:
-                    full_name = full_name.encode('latin1').decode('utf-8')
-                except:
-                    full_name = full_name.encode('utf-8', errors='replace').decode('utf-8')
-                    
-        worksheet.write(row, 2, full_name, cell_format)
-        worksheet.write(row, 3, participant.get('phone', ''), cell_format)
-        worksheet.write(row, 4, participant.get('age', ''), cell_format)
-        
-        gender = 'Мужской' if participant.get('gender') == 'male' else 'Женский'
-        worksheet.write(row, 5, gender, cell_format)
-        
-        # Определяем город из координат или IP и проверяем кодировку
-        city = ''
-        if participant.get('coordinates') and participant['coordinates'].get('city'):
-            city = participant['coordinates']['city']
-        elif participant.get('location') and participant['location'].get('city'):
-            city = participant['location']['city']
-            
-        if isinstance(city, str):
-            try:
-                # Проверяем корректность UTF-8
-                city.encode('utf-8').decode('utf-8')
-            except UnicodeError:
-                # Если есть проблемы, пробуем исправить
-                try:
-                    city = city.encode('latin1').decode('utf-8')
-                except:
-                    city = city.encode('utf-8', errors='replace').decode('utf-8')
-                    
-        worksheet.write(row, 6, city, cell_format)
-        worksheet.write(row, 7, participant.get('registration_time', ''), cell_format)
-        worksheet.write(row, 8, participant.get('ip_address', ''), cell_format)
+    if len(files) == 1:
+        results = {remote_path: timed_upload(remote_path, data) for remote_path, data in files.items()}
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(files), YADISK_UPLOAD_WORKERS)) as executor:
+            futures = {remote_path: executor.submit(timed_upload, remote_path, data) for remote_path, data in files.items()}
+            results = {remote_path: future.result() for remote_path, future in futures.items()}
     
-    # Автонастройка ширины столбцов
-    for i, width in enumerate([5, 15, 25, 15, 8, 10, 15, 20, 15]):
-        worksheet.set_column(i, i, width)
-        
-    workbook.close()
-    output.seek(0)
-    return output
+    # Время и объем загрузок попадают в историю копии вызывающего потока
+    for remote_path, (uploaded, seconds) in results.items():
+        record_backup_timing(get_backup_upload_label(remote_path), seconds)
+        if uploaded:
+            data = files[remote_path]
+            note_backup_run(bytes=len(data) if isinstance(data, bytes) else os.fstat(data.fileno()).st_size)
+    return {remote_path: uploaded for remote_path, (uploaded, _) in results.items()}
 
-# Функция для создания и отправки резервной копии
-def create_backup():
-    """Создает резервную копию данных на Яндекс.Диске"""
+def perform_backup():
+    """Плановая резервная копия в app:/backups/<дата>/: полный снимок или дельта.
+
+    Если данные не менялись с прошлой копии, ничего не выгружается. Обычно
+    выгружаются только участники, добавленные и удаленные после прошлой
+    копии; полные JSON и Excel - раз в full_every дельт, раз в сутки или
+    если журнал изменений не покрывает прошлую копию.
+    """
     print(f"[{datetime.now()}] Запуск процесса создания резервной копии")
+    delta_file = None
     try:
-        # Загружаем данные участников напрямую из Яндекс.Диска
-        participants = load_participants(force_reload=True)
+        # Кэш участников догоняется по журналу изменений, полная загрузка не нужна
+        stage = time.perf_counter()
+        participants = load_participants()
+        record_backup_timing('load', time.perf_counter() - stage)
         
         # Если нет участников, выходим
         if not participants:
             print(f"[{datetime.now()}] Нет данных участников для резервного копирования")
+            note_backup_run(error='Нет данных участников')
             return False
         
         # Загружаем настройки
@@ -1388,53 +3832,36 @@ def create_backup():
         
         if not yandex_token:
             print(f"[{datetime.now()}] Не найден токен Яндекс.Диска для создания резервной копии")
+            note_backup_run(error='Не найден токен Яндекс.Диска')
             return False
         
-        # Обработка кириллических символов в данных участников
-        processed_participants = []
-        for participant in participants:
-            processed_participant = participant.copy()
-            
-            # Проверяем кодировку ФИО
-            full_name = participant.get('full_name', '')
-            if isinstance(full_name, str):
-                try:
-                    # Проверяем корректность UTF-8
-                    full_name.encode('utf-8').decode('utf-8')
-                except UnicodeError:
-                    # Если есть проблемы, пробуем исправить
-                    try:
-                        full_name = full_name.encode('latin1').decode('utf-8')
-                    except:
-                        full_name = full_name.encode('utf-8', errors='replace').decode('utf-8')
-            processed_participant['full_name'] = full_name
-            
-            # Проверяем кодировку города
-            if 'coordinates' in participant and 'city' in participant['coordinates'] and participant['coordinates']['city']:
-                city = participant['coordinates']['city']
-                if isinstance(city, str):
-                    try:
-                        city.encode('utf-8').decode('utf-8')
-                    except UnicodeError:
-                        try:
-                            city = city.encode('latin1').decode('utf-8')
-                        except:
-                            city = city.encode('utf-8', errors='replace').decode('utf-8')
-                    processed_participant['coordinates']['city'] = city
-            
-            if 'location' in participant and 'city' in participant['location'] and participant['location']['city']:
-                city = participant['location']['city']
-                if isinstance(city, str):
-                    try:
-                        city.encode('utf-8').decode('utf-8')
-                    except UnicodeError:
-                        try:
-                            city = city.encode('latin1').decode('utf-8')
-                        except:
-                            city = city.encode('utf-8', errors='replace').decode('utf-8')
-                    processed_participant['location']['city'] = city
-            
-            processed_participants.append(processed_participant)
+        revision, _ = get_export_snapshot()
+        note_backup_run(revision=revision)
+        stage = time.perf_counter()
+        content_sha256 = get_participants_digest()
+        record_backup_timing('digest', time.perf_counter() - stage)
+        entries = get_backup_entries()
+        last = entries[-1] if entries else None
+        # Сравнивается содержимое, а не ревизия: добавление и удаление того же участника
+        # или восстановление прежних данных копию не требуют. Для записей без хэша - по ревизии
+        if last and (last['content_sha256'] == content_sha256 if last['content_sha256'] else last['revision'] == revision):
+            print(f"[{datetime.now()}] Данные не менялись с прошлой резервной копии (ревизия {revision}), копия не нужна")
+            note_backup_run(outcome='skipped')
+            return True
+        
+        # Дельта возможна, если текущая цепочка не слишком длинная и не старая
+        changes = None
+        if last:
+            chain_start = max(i for i, entry in enumerate(entries) if entry['type'] == 'full')
+            full_every = int(backup_settings.get('full_every', BACKUP_FULL_SNAPSHOT_EVERY))
+            full_time = datetime.strptime(entries[chain_start]['created_at'], '%Y-%m-%d %H:%M:%S')
+            if len(entries) - chain_start <= full_every and datetime.now() - full_time < BACKUP_FULL_SNAPSHOT_MAX_AGE:
+                changes = get_changes_since(last['revision'], revision)
+        if changes is not None and not changes['added'] and not changes['removed']:
+            # Изменения взаимно погасились - содержимое то же, что в прошлой копии
+            print(f"[{datetime.now()}] Содержимое не изменилось с прошлой резервной копии, копия не нужна")
+            note_backup_run(outcome='skipped')
+            return True
         
         # Создаем папку с датой для хранения резервных копий
         current_date = datetime.now().strftime('%Y-%m-%d')
@@ -1460,109 +3887,397 @@ def create_backup():
         
         # Текущее время для имени файла
         current_time = datetime.now().strftime('%H-%M-%S')
+        base_name = f"app:/backups/{current_date}/participants_{current_date}_{current_time}"
+        entry = {
+            'revision': revision,
+            'excel_path': None,
+            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'content_sha256': content_sha256
+        }
         
-        # Создаем копию JSON файла
-        json_filename = f"participants_{current_date}_{current_time}.json"
-        json_upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        json_params = {"path": f"app:/backups/{current_date}/{json_filename}", "overwrite": "true"}
-        
-        json_upload_response = requests.get(json_upload_url, headers=headers, params=json_params)
-        
-        if json_upload_response.status_code == 200:
-            json_upload_link = json_upload_response.json().get("href")
-            json_data = json.dumps(processed_participants, ensure_ascii=False, indent=4)
-            json_upload_result = requests.put(json_upload_link, data=json_data.encode('utf-8'))
-            
-            if not (json_upload_result.status_code == 201 or json_upload_result.status_code == 200):
-                print(f"[{datetime.now()}] Ошибка при загрузке JSON файла: {json_upload_result.status_code}")
+        if changes is None:
+            # Полный снимок: JSON и Excel берутся из кэша выгрузок, если данные не менялись.
+            # Файлы могут оказаться новее revision - дельты применяются к ним повторно без вреда
+            stage = time.perf_counter()
+            json_file, _ = get_export_file('backup-json')
+            record_backup_timing('json', time.perf_counter() - stage)
+            with json_file:
+                stage = time.perf_counter()
+                excel_file, _ = get_export_file('full-backup-xlsx')
+                record_backup_timing('excel', time.perf_counter() - stage)
+                with excel_file:
+                    stage = time.perf_counter()
+                    entry['sha256'], entry['size'] = hash_file(json_file)
+                    record_backup_timing('hash', time.perf_counter() - stage)
+                    # JSON и Excel загружаются одновременно
+                    uploaded = upload_files_to_yadisk(headers, {f"{base_name}.json": json_file, f"{base_name}.xlsx": excel_file})
+            if not uploaded[f"{base_name}.json"]:
+                note_backup_run(error=f"Не удалось загрузить {base_name}.json")
                 return False
+            if uploaded[f"{base_name}.xlsx"]:
+                entry['excel_path'] = f"{base_name}.xlsx"
+            with data_lock:
+                records = len(participants_index['tickets'])
+            entry.update(type='full', base_revision=None, path=f"{base_name}.json", records=records, removed=0, previous=None)
         else:
-            print(f"[{datetime.now()}] Ошибка при получении ссылки для загрузки JSON: {json_upload_response.status_code}")
+            # Дельта: только участники, изменившиеся после прошлой копии
+            stage = time.perf_counter()
+            delta_file = tempfile.TemporaryFile()
+            write_backup_delta(delta_file, changes, last['revision'], revision)
+            entry['sha256'], entry['size'] = hash_file(delta_file)
+            record_backup_timing('delta', time.perf_counter() - stage)
+            if not upload_files_to_yadisk(headers, {f"{base_name}.delta.json": delta_file})[f"{base_name}.delta.json"]:
+                note_backup_run(error=f"Не удалось загрузить {base_name}.delta.json")
+                return False
+            entry.update(type='delta', base_revision=last['revision'], path=f"{base_name}.delta.json",
+                         records=len(changes['added']), removed=len(changes['removed']), previous=last['sha256'])
+        
+        # Запись попадает в цепочку, только если манифест с ней выгружен
+        manifest = get_backup_manifest(entries + [entry])
+        manifest_data = json.dumps(manifest, ensure_ascii=False, indent=4).encode('utf-8')
+        if not upload_files_to_yadisk(headers, {BACKUP_MANIFEST_PATH: manifest_data})[BACKUP_MANIFEST_PATH]:
+            note_backup_run(error='Не удалось загрузить манифест копий')
             return False
-        
-        # Создаем Excel файл
-        excel_data = io.BytesIO()
-        
-        # Создаем Excel-документ с явной настройкой поддержки Unicode
-        workbook = xlsxwriter.Workbook(excel_data, {'strings_to_unicode': True})
-        worksheet = workbook.add_worksheet()
-        
-        # Добавляем заголовки
-        excel_headers = [
-            "№ участника", "ФИО", "Телефон", "Возраст", "Пол", "Город", 
-            "Дата регистрации", "IP-адрес", "Координаты", "Источник города"
-        ]
-        
-        for col, header in enumerate(excel_headers):
-            worksheet.write(0, col, header)
-        
-        # Добавляем данные участников
-        for row, participant in enumerate(processed_participants, start=1):
-            worksheet.write(row, 0, participant.get('ticket_number', ''))
-            worksheet.write(row, 1, participant.get('full_name', ''))
-            worksheet.write(row, 2, participant.get('phone', ''))
-            worksheet.write(row, 3, participant.get('age', ''))
-            worksheet.write(row, 4, 'Мужской' if participant.get('gender') == 'male' else 'Женский')
-            
-            # Определяем город
-            city = ''
-            source = ''
-            if participant.get('coordinates', {}).get('city'):
-                city = participant.get('coordinates', {}).get('city', '')
-                source = 'Браузер'
-            elif participant.get('location', {}).get('city'):
-                city = participant.get('location', {}).get('city', '')
-                source = 'IP'
-            
-            worksheet.write(row, 5, city)
-            worksheet.write(row, 6, participant.get('registration_time', ''))
-            worksheet.write(row, 7, participant.get('ip_address', ''))
-            
-            # Координаты
-            coords = ''
-            if participant.get('coordinates'):
-                lat = participant.get('coordinates', {}).get('latitude', '')
-                lng = participant.get('coordinates', {}).get('longitude', '')
-                coords = f"{lat}, {lng}"
-            
-            worksheet.write(row, 8, coords)
-            worksheet.write(row, 9, source)
-        
-        # Закрываем книгу
-        workbook.close()
-        
-        # Получаем данные из буфера
-        excel_data.seek(0)
-        
-        # Загружаем Excel файл
-        excel_filename = f"participants_{current_date}_{current_time}.xlsx"
-        excel_params = {"path": f"app:/backups/{current_date}/{excel_filename}", "overwrite": "true"}
-        
-        # Исправляем переменную: используем excel_upload_url вместо json_upload_url
-        excel_upload_url = "https://cloud-api.yandex.net/v1/disk/resources/upload"
-        excel_upload_response = requests.get(excel_upload_url, headers=headers, params=excel_params)
-        
-        if excel_upload_response.status_code == 200:
-            excel_upload_link = excel_upload_response.json().get("href")
-            excel_upload_result = requests.put(excel_upload_link, data=excel_data.getvalue())
-            
-            if not (excel_upload_result.status_code == 201 or excel_upload_result.status_code == 200):
-                print(f"[{datetime.now()}] Ошибка при загрузке Excel файла: {excel_upload_result.status_code}")
-        else:
-            print(f"[{datetime.now()}] Ошибка при получении ссылки для загрузки Excel: {excel_upload_response.status_code}")
-        
-        # Обновляем время последнего бэкапа
-        backup_settings['last_backup'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        settings['backup_settings'] = backup_settings
-        save_settings(settings)
-        
-        print(f"[{datetime.now()}] Резервная копия успешно создана")
+        db = get_state_db()
+        db.execute(
+            f"INSERT INTO backups ({', '.join(BACKUP_ENTRY_FIELDS[1:])}) VALUES ({', '.join('?' * (len(BACKUP_ENTRY_FIELDS) - 1))})",
+            tuple(entry[name] for name in BACKUP_ENTRY_FIELDS[1:])
+        )
+        if manifest['chains'] and entries:
+            # Записи цепочек, вышедших из манифеста, больше не нужны
+            first_path = manifest['chains'][0]['full']['path']
+            db.execute('DELETE FROM backups WHERE id < (SELECT MIN(id) FROM backups WHERE path = ?)', (first_path,))
+        
+        note_backup_run(type=entry['type'], records=entry['records'], removed=entry['removed'])
+        kind = 'полный снимок' if entry['type'] == 'full' else f"дельта: +{entry['records']}, -{entry['removed']}"
+        print(f"[{datetime.now()}] Резервная копия успешно создана ({kind})")
         return True
     
     except Exception as e:
+        note_backup_run(error=str(e))
         print(f"[{datetime.now()}] Критическая ошибка при создании резервной копии: {str(e)}")
         traceback.print_exc()
         return False
+    finally:
+        if delta_file:
+            delta_file.close()
+
+# Имена файлов копий: плановые participants_ГГГГ-ММ-ДД_ЧЧ-ММ-СС[.delta].json, ручные participants_ГГГГММДД_ЧЧММСС.json
+BACKUP_FILE_PATTERNS = {
+    'scheduled': (re.compile(r'^participants_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})(\.delta)?\.json$'), '%Y-%m-%d_%H-%M-%S'),
+    'manual': (re.compile(r'^participants_(\d{8}_\d{6})()\.json$'), '%Y%m%d_%H%M%S')
+}
+BACKUP_CATALOG_FIELDS = ('path', 'source', 'type', 'chain', 'revision', 'base_revision', 'sha256', 'md5', 'size', 'created_at')
+restore_lock = threading.Lock()
+# Восстановление одно на все развертывание: кроме блокировки потоков процесса - аренда в базе состояния
+RESTORE_LEASE_NAME = 'restore'
+RESTORE_LEASE_TTL = 1800
+
+def list_yadisk_folder(headers, path):
+    """Содержимое папки на Яндекс.Диске (пустой список, если папки нет)"""
+    items = []
+    while True:
+        response = requests.get(
+            "https://cloud-api.yandex.net/v1/disk/resources",
+            headers=headers, params={"path": path, "limit": 1000, "offset": len(items)}
+        )
+        if response.status_code == 404:
+            return items
+        if response.status_code != 200:
+            raise RuntimeError(f"Ошибка при чтении папки {path} на Яндекс.Диске: {response.status_code}")
+        embedded = response.json().get('_embedded', {})
+        page = embedded.get('items', [])
+        items.extend(page)
+        if not page or len(items) >= embedded.get('total', 0):
+            return items
+
+def get_yadisk_download_link(headers, path):
+    """Ссылка на скачивание файла с Яндекс.Диска или None, если файла нет"""
+    response = requests.get(
+        "https://cloud-api.yandex.net/v1/disk/resources/download", headers=headers, params={"path": path}
+    )
+    if response.status_code == 404:
+        return None
+    if response.status_code != 200:
+        raise RuntimeError(f"Ошибка при получении ссылки на скачивание {path}: {response.status_code}")
+    return response.json().get("href")
+
+def get_backup_catalog_entries(folder, source, items):
+    """Записи каталога для файлов копий из содержимого папки"""
+    pattern, time_format = BACKUP_FILE_PATTERNS[source]
+    entries = []
+    for item in items:
+        match = pattern.match(item.get('name', ''))
+        if item.get('type') != 'file' or not match:
+            continue
+        entries.append({
+            'path': f"{folder}/{item['name']}",
+            'source': source,
+            'type': 'delta' if match.group(2) else 'full',
+            'chain': None,
+            'revision': None,
+            'base_revision': None,
+            'sha256': item.get('sha256'),
+            'md5': item.get('md5'),
+            'size': item.get('size'),
+            'created_at': datetime.strptime(match.group(1), time_format).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    return entries
+
+def refresh_backup_catalog(token):
+    """Перестроение локального каталога копий по папкам app:/backups/<дата> и BACKUP_MANUAL_FOLDER.
+
+    Файлы и их контрольные суммы берутся из списков папок (папки по датам
+    читаются параллельно), ревизии и цепочки дельт - из манифеста плановых
+    копий. Дельты вне манифеста не к чему применять, они остаются без цепочки.
+    Возвращает число записей каталога.
+    """
+    headers = {"Authorization": f"OAuth {token}"}
+    folders = [f"app:/backups/{item['name']}" for item in list_yadisk_folder(headers, 'app:/backups')
+               if item.get('type') == 'dir']
+    
+    entries = {}
+    with ThreadPoolExecutor(max_workers=RESTORE_DOWNLOAD_WORKERS) as executor:
+        manual = executor.submit(list_yadisk_folder, headers, BACKUP_MANUAL_FOLDER)
+        for folder, items in zip(folders, executor.map(lambda folder: list_yadisk_folder(headers, folder), folders)):
+            entries.update((entry['path'], entry) for entry in get_backup_catalog_entries(folder, 'scheduled', items))
+        entries.update((entry['path'], entry) for entry in get_backup_catalog_entries(BACKUP_MANUAL_FOLDER, 'manual', manual.result()))
+    
+    manifest_link = get_yadisk_download_link(headers, BACKUP_MANIFEST_PATH)
+    if manifest_link:
+        response = requests.get(manifest_link)
+        if response.status_code != 200:
+            raise RuntimeError(f"Ошибка при скачивании манифеста копий: {response.status_code}")
+        for chain in response.json().get('chains', []):
+            full = chain['full']
+            if full['path'] not in entries:
+                continue
+            entries[full['path']].update(revision=full['revision'], sha256=full['sha256'])
+            for delta in chain['deltas']:
+                if delta['path'] in entries:
+                    entries[delta['path']].update(chain=full['path'], revision=delta['revision'],
+                                                  base_revision=delta['base_revision'], sha256=delta['sha256'])
+    
+    db = get_state_db()
+    db.execute('BEGIN')
+    try:
+        db.execute('DELETE FROM backup_catalog')
+        db.executemany(
+            f"INSERT INTO backup_catalog ({', '.join(BACKUP_CATALOG_FIELDS)}) VALUES ({', '.join('?' * len(BACKUP_CATALOG_FIELDS))})",
+            [tuple(entry[name] for name in BACKUP_CATALOG_FIELDS) for entry in entries.values()]
+        )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return len(entries)
+
+def get_backup_catalog():
+    """Записи локального каталога копий по времени создания"""
+    rows = get_state_db().execute(
+        f"SELECT {', '.join(BACKUP_CATALOG_FIELDS)} FROM backup_catalog ORDER BY created_at, path"
+    ).fetchall()
+    return [dict(zip(BACKUP_CATALOG_FIELDS, row)) for row in rows]
+
+def plan_restore(at=None):
+    """Файлы копий для состояния на момент at: полный снимок и дельты его цепочки по порядку.
+
+    Из снимков не позже at выбирается тот, чья цепочка дельт доходит до самого
+    позднего момента. Возвращает список записей каталога или None.
+    """
+    at = at or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    entries = [entry for entry in get_backup_catalog() if entry['created_at'] <= at]
+    best = None
+    for full in (entry for entry in entries if entry['type'] == 'full'):
+        plan = [full]
+        if full['revision'] is not None:
+            deltas = sorted((entry for entry in entries if entry['type'] == 'delta' and entry['chain'] == full['path']),
+                            key=lambda entry: entry['revision'])
+            for delta in deltas:
+                if delta['base_revision'] != plan[-1]['revision']:
+                    break
+                plan.append(delta)
+        if best is None or plan[-1]['created_at'] >= best[-1]['created_at']:
+            best = plan
+    return best
+
+def download_backup_file(headers, entry, target_dir):
+    """Скачивание файла копии в target_dir с проверкой sha256 (или md5) из каталога"""
+    href = get_yadisk_download_link(headers, entry['path'])
+    if not href:
+        raise RuntimeError(f"Файл копии {entry['path']} не найден на Яндекс.Диске")
+    
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    fd, local_path = tempfile.mkstemp(suffix='.json', dir=target_dir)
+    with os.fdopen(fd, 'wb') as target, requests.get(href, stream=True, timeout=60) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"Ошибка при скачивании {entry['path']}: {response.status_code}")
+        for chunk in response.iter_content(EXPORT_CHUNK_SIZE):
+            target.write(chunk)
+            sha256.update(chunk)
+            md5.update(chunk)
+    
+    if (entry['sha256'] and sha256.hexdigest() != entry['sha256']) or \
+            (not entry['sha256'] and entry['md5'] and md5.hexdigest() != entry['md5']):
+        raise ValueError(f"Контрольная сумма файла {entry['path']} не совпадает с каталогом копий")
+    return local_path
+
+def merge_backup_files(paths):
+    """Участники полного снимка (первый файл) с примененными по порядку дельтами"""
+    with open(paths[0], 'r', encoding='utf-8') as file:
+        by_ticket = {get_ticket_key(p): p for p in json.load(file)}
+    for path in paths[1:]:
+        with open(path, 'r', encoding='utf-8') as file:
+            delta = json.load(file)
+        for participant in delta.get('added', []):
+            by_ticket[get_ticket_key(participant)] = participant
+        for ticket_number in delta.get('removed', []):
+            by_ticket.pop(ticket_number, None)
+    return list(by_ticket.values())
+
+def replace_participants_store(participants, token=None):
+    """Атомарная замена хранилища участников: Яндекс.Диск, локальный файл и журнал изменений.
+
+    Восстановленные участники хранятся в самой записи restored журнала:
+    другие процессы применяют ее без чтения рабочего файла, поэтому регистрация
+    из устаревшего кэша в другом воркере не отменит восстановление. Запись
+    журнала и локальный файл пишутся под participants_store_lock, файл
+    подменяется через os.replace. Если выгрузка на Яндекс.Диск не удалась,
+    локальные данные не меняются. Возвращает ревизию.
+    """
+    data = encode_participants(participants)
+    headers = {"Authorization": f"OAuth {token}"}
+    if token and not upload_to_yadisk(headers, "app:/participants.json", data):
+        raise RuntimeError('Не удалось выгрузить восстановленные данные на Яндекс.Диск')
+    
+    load_participants()
+    genders_before = Counter(participants_index['genders'])
+    with participants_store_lock():
+        revision = record_change('restored', None, participants)
+        if revision is None:
+            raise RuntimeError('Не удалось записать восстановление в журнал изменений')
+        # Восстановленный снимок соответствует ревизии записи restored
+        meta = get_snapshot_meta(data, revision)
+        write_file_atomic(PARTICIPANTS_FILE, data)
+        write_file_atomic(PARTICIPANTS_META_FILE, json.dumps(meta).encode('utf-8'))
+    if token:
+        upload_to_yadisk(headers, "app:/participants.meta.json", json.dumps(meta).encode('utf-8'))
+    load_participants()
+    genders_after = participants_index['genders']
+    publish_event('deleted', {'revision': revision, 'ticket_number': None, 'all': True})
+    publish_event('stats', {
+        'total': sum(genders_after.values()) - sum(genders_before.values()),
+        'male': genders_after.get('male', 0) - genders_before.get('male', 0),
+        'female': genders_after.get('female', 0) - genders_before.get('female', 0)
+    })
+    return revision
+
+def restore_backup(at=None, dry_run=False, refresh=True):
+    """Восстановление участников на момент at из каталога копий с замером этапов.
+
+    Каталог обновляется (refresh), файлы плана скачиваются параллельно с проверкой
+    контрольных сумм, дельты применяются к снимку, хранилище подменяется атомарно.
+    Возвращает план, число участников и время этапов в секундах; при dry_run - только план.
+    """
+    token = load_settings().get('backup_settings', {}).get('yandex_token')
+    if not token:
+        raise RuntimeError('Не найден токен Яндекс.Диска')
+    
+    started = time.perf_counter()
+    timings = {}
+    if refresh:
+        refresh_backup_catalog(token)
+        timings['catalog'] = round(time.perf_counter() - started, 3)
+    plan = plan_restore(at)
+    if plan is None:
+        raise LookupError(f"Нет резервных копий не позже {at or 'текущего момента'}")
+    result = {'at': at, 'plan': plan, 'timings': timings}
+    if dry_run:
+        return result
+    
+    headers = {"Authorization": f"OAuth {token}"}
+    os.makedirs(RESTORE_DIR, exist_ok=True)
+    restore_dir = tempfile.mkdtemp(dir=RESTORE_DIR)
+    try:
+        stage = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=RESTORE_DOWNLOAD_WORKERS) as executor:
+            paths = list(executor.map(lambda entry: download_backup_file(headers, entry, restore_dir), plan))
+        result['bytes'] = sum(os.path.getsize(path) for path in paths)
+        timings['download'] = round(time.perf_counter() - stage, 3)
+        
+        stage = time.perf_counter()
+        participants = merge_backup_files(paths)
+        timings['apply'] = round(time.perf_counter() - stage, 3)
+        
+        stage = time.perf_counter()
+        result['revision'] = replace_participants_store(participants, token)
+        timings['swap'] = round(time.perf_counter() - stage, 3)
+    finally:
+        shutil.rmtree(restore_dir, ignore_errors=True)
+    
+    result['participants'] = len(participants)
+    timings['total'] = round(time.perf_counter() - started, 3)
+    print(f"[{datetime.now()}] Восстановлено {len(participants)} участников из {len(plan)} файлов копий за {timings['total']} с")
+    return result
+
+@app.route('/admin/restore', methods=['GET'])
+def backup_catalog():
+    """Каталог резервных копий и план восстановления на момент at; refresh=1 перечитывает Яндекс.Диск"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    at = None
+    if request.args.get('at'):
+        at_time = parse_timeseries_time(request.args.get('at'))
+        if at_time is None:
+            return jsonify({'success': False, 'message': 'Некорректное время восстановления'}), 400
+        at = at_time.strftime('%Y-%m-%d %H:%M:%S')
+    
+    try:
+        if request.args.get('refresh') == '1':
+            token = load_settings().get('backup_settings', {}).get('yandex_token')
+            if not token:
+                return jsonify({'success': False, 'message': 'Не найден токен Яндекс.Диска'}), 500
+            refresh_backup_catalog(token)
+        return jsonify({'success': True, 'catalog': get_backup_catalog(), 'plan': plan_restore(at)})
+    except Exception as e:
+        app.logger.error(f"Ошибка при обновлении каталога копий: {str(e)}")
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/admin/restore', methods=['POST'])
+def restore_from_backup():
+    """Восстановление участников из резервных копий на момент at (по умолчанию - последняя копия).
+
+    dry_run=1 возвращает только план восстановления.
+    """
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    at = None
+    if request.values.get('at'):
+        at_time = parse_timeseries_time(request.values.get('at'))
+        if at_time is None:
+            return jsonify({'success': False, 'message': 'Некорректное время восстановления'}), 400
+        at = at_time.strftime('%Y-%m-%d %H:%M:%S')
+    
+    if not restore_lock.acquire(blocking=False):
+        return jsonify({'success': False, 'message': 'Восстановление уже выполняется'}), 409
+    if not acquire_lease(RESTORE_LEASE_NAME, RESTORE_LEASE_TTL):
+        restore_lock.release()
+        return jsonify({'success': False, 'message': 'Восстановление уже выполняется'}), 409
+    try:
+        result = restore_backup(at, dry_run=request.values.get('dry_run') == '1')
+        return jsonify({'success': True, **result})
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Exception as e:
+        app.logger.error(f"Ошибка при восстановлении из резервной копии: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    finally:
+        release_lease(RESTORE_LEASE_NAME)
+        restore_lock.release()
 
 def create_app_folder(token):
     """Создает папку приложения на Яндекс.Диске, если она не существует"""
@@ -1672,210 +4387,499 @@ def create_app_folder(token):
         app.logger.error(f"Критическая ошибка при настройке папок на Яндекс.Диске: {str(e)}")
         return False
 
+def set_last_backup(backup_time):
+    """Запись времени последней копии; возвращает новые настройки"""
+    def update(settings):
+        settings.setdefault('backup_settings', copy.deepcopy(BACKUP_SETTINGS))
+        settings['backup_settings']['last_backup'] = backup_time.strftime('%Y-%m-%d %H:%M:%S')
+    return update_settings(update)
+
 def init_backup_settings():
     """Инициализация настроек резервного копирования"""
-    settings = load_settings()
-    if 'backup_settings' not in settings:
-        settings['backup_settings'] = {
+    def set_defaults(settings):
+        settings.setdefault('backup_settings', {
             'enabled': False,
             'yandex_token': '',
             'interval': 'daily',
             'last_backup': None
-        }
-        save_settings(settings)
+        })
+    if 'backup_settings' not in load_settings():
+        update_settings(set_defaults)
+    # Папка на Яндекс.Диске и тестовая копия при запуске - в start_leader_jobs,
+    # чтобы их не повторял каждый воркер
+
+def get_backup_period(backup_settings):
+    """Период плановых копий по настройкам"""
+    interval = backup_settings.get('interval', 'daily')
+    if interval == 'daily':
+        return timedelta(days=1)
+    if interval == 'hourly':
+        return timedelta(hours=1)
+    unit = backup_settings.get('custom_unit', 'hours')
+    try:
+        value = int(backup_settings.get('custom_value', 24))
+    except (TypeError, ValueError):
+        value = 24
+    if unit not in BACKUP_UNITS or value <= 0:
+        return timedelta(hours=24)
+    return timedelta(**{unit: value})
+
+def compute_next_backup_time(backup_settings, now=None):
+    """Время следующей плановой копии или None, если копирование отключено.
+
+    Единственный расчет срока: по нему работает планировщик и отвечают статусы
+    в админке. daily - в 03:00, hourly - в начале часа, custom - через интервал
+    после последней копии. Пропущенный срок (сервер не работал) дает копию
+    сразу: для custom - всегда, для daily и hourly - если с пропущенного
+    срока прошло не больше половины периода.
+    """
+    if not backup_settings.get('enabled', False):
+        return None
+    now = now or datetime.now()
+    period = get_backup_period(backup_settings)
+    
+    last_backup = None
+    if backup_settings.get('last_backup'):
+        try:
+            last_backup = datetime.strptime(backup_settings['last_backup'], '%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            pass
+    
+    interval = backup_settings.get('interval', 'daily')
+    if interval in ('daily', 'hourly'):
+        if interval == 'daily':
+            next_time = now.replace(hour=3, minute=0, second=0, microsecond=0)
+        else:
+            next_time = now.replace(minute=0, second=0, microsecond=0)
+        if next_time <= now:
+            next_time += period
+        missed = next_time - period
+        if (last_backup is None or last_backup < missed) and now - missed <= period / 2:
+            return now
+        return next_time
+    
+    if last_backup is None:
+        return now
+    return last_backup + period
+
+def get_next_backup_info():
+    """Текст о следующем резервном копировании для админки"""
+    try:
+        backup_settings = load_settings().get('backup_settings', {})
+        next_time = compute_next_backup_time(backup_settings)
+        if next_time is None:
+            return "Резервное копирование отключено"
+        
+        current_time = datetime.now()
+        if backup_settings.get('interval', 'daily') in ('daily', 'hourly') and next_time > current_time:
+            return f"В {next_time.strftime('%H:%M')} {next_time.strftime('%d.%m.%Y')}"
+        if next_time <= current_time:
+            return "В ближайшее время"
+        
+        # Получаем разницу времени
+        time_format = "%d.%m.%Y %H:%M"
+        time_diff = next_time - current_time
+        hours, remainder = divmod(time_diff.seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
+        if time_diff.days > 0:
+            return f"Через {time_diff.days} д. {hours} ч. ({next_time.strftime(time_format)})"
+        elif hours > 0:
+            return f"Через {hours} ч. {minutes} мин. ({next_time.strftime(time_format)})"
+        elif minutes > 0:
+            return f"Через {minutes} мин. ({next_time.strftime(time_format)})"
+        return f"Через {seconds} сек."
+    except Exception as e:
+        print(f"Ошибка при получении информации о следующем бэкапе: {e}")
+        return "Не удалось определить"
+
+def get_lease_owner():
+    """Идентификатор процесса для аренды (pid берется при вызове: воркеры gunicorn форкаются после импорта)"""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+def acquire_lease(name, ttl):
+    """Захват или продление аренды в базе состояния; True, если аренда за текущим процессом.
+
+    Аренда достается процессу, если она свободна, просрочена или уже его.
+    Проверка и запись - один UPSERT, поэтому из одновременно пытающихся
+    воркеров аренду получает ровно один.
+    """
+    now = time.time()
+    try:
+        cursor = get_state_db().execute(
+            """INSERT INTO leases (name, owner, acquired_at, renewed_at, expires_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(name) DO UPDATE SET
+                   owner = excluded.owner,
+                   acquired_at = CASE WHEN owner = excluded.owner THEN acquired_at ELSE excluded.acquired_at END,
+                   renewed_at = excluded.renewed_at,
+                   expires_at = excluded.expires_at
+               WHERE owner = excluded.owner OR expires_at < excluded.renewed_at""",
+            (name, get_lease_owner(), now, now, now + ttl))
+        return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при захвате аренды {name}: {str(e)}")
+        return False
+
+def release_lease(name):
+    """Освобождение аренды текущим процессом, чтобы другой воркер подхватил ее без ожидания TTL"""
+    try:
+        get_state_db().execute('DELETE FROM leases WHERE name = ? AND owner = ?', (name, get_lease_owner()))
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при освобождении аренды {name}: {str(e)}")
+
+def get_lease(name):
+    """Текущий владелец аренды для статуса в админке: одинаков во всех воркерах, его можно кэшировать"""
+    row = get_state_db().execute(
+        'SELECT owner, acquired_at, renewed_at, expires_at FROM leases WHERE name = ?', (name,)).fetchone()
+    if row is None:
+        return None
+    return {
+        'owner': row[0],
+        'acquired_at': datetime.fromtimestamp(row[1]).strftime('%d.%m.%Y %H:%M:%S'),
+        'renewed_at': datetime.fromtimestamp(row[2]).strftime('%d.%m.%Y %H:%M:%S'),
+        'alive': row[3] >= time.time()
+    }
+
+def schedule_job(name, deadline, func):
+    """Постановка задачи в кучу планировщика (прежняя задача с тем же именем снимается)"""
+    with scheduler_condition:
+        scheduler_jobs[:] = [job for job in scheduler_jobs if job[2] != name]
+        heapq.heapify(scheduler_jobs)
+        if deadline is not None:
+            scheduler_state['seq'] += 1
+            heapq.heappush(scheduler_jobs, (deadline, scheduler_state['seq'], name, func))
+        scheduler_condition.notify_all()
+
+def notify_scheduler():
+    """Сигнал планировщику о смене настроек: сроки пересчитываются сразу"""
+    with scheduler_condition:
+        scheduler_state['settings_changed'] = True
+        scheduler_condition.notify_all()
+
+def on_settings_changed(settings):
+    """Подписчик на настройки: планировщик будится, только если изменились настройки копирования"""
+    if settings.get('backup_settings', {}) != scheduler_state['backup_settings']:
+        notify_scheduler()
+
+subscribe_settings(on_settings_changed)
+
+def schedule_backup():
+    """Постановка плановой копии на срок compute_next_backup_time со случайным сдвигом.
+
+    Сдвиг (до BACKUP_JITTER_SECONDS, но не больше 10% периода) разводит копии
+    нескольких серверов и не дает им совпадать с другими задачами ровно в 03:00.
+    """
+    backup_settings = load_settings().get('backup_settings', {})
+    previous = scheduler_state['backup_settings']
+    scheduler_state['backup_settings'] = copy.deepcopy(backup_settings)
+    # Новый токен: папка приложения на Яндекс.Диске проверяется здесь, а не в запросах админки
+    yandex_token = backup_settings.get('yandex_token')
+    if scheduler_state['leader'] and yandex_token and previous is not None and yandex_token != previous.get('yandex_token'):
+        create_app_folder(yandex_token)
+    next_time = compute_next_backup_time(backup_settings)
+    if not scheduler_state['leader'] or next_time is None:
+        if scheduler_state['leader']:
+            print(f"[{datetime.now()}] Резервное копирование отключено в настройках")
+        schedule_job('backup', None, run_backup_job)
+        return
     
-    # Проверяем наличие токена Яндекс.Диска
-    yandex_token = settings.get('backup_settings', {}).get('yandex_token')
-    if yandex_token:
+    jitter = random.uniform(0, min(BACKUP_JITTER_SECONDS, get_backup_period(backup_settings).total_seconds() / 10))
+    deadline = max(next_time.timestamp(), time.time()) + jitter
+    print(f"[{datetime.now()}] Следующее резервное копирование: {datetime.fromtimestamp(deadline)}")
+    schedule_job('backup', deadline, run_backup_job)
+
+def start_leader_jobs():
+    """Работа, которую при захвате аренды выполняет только ведущий процесс"""
+    backup_settings = load_settings().get('backup_settings', {})
+    yandex_token = backup_settings.get('yandex_token', '')
+    if not yandex_token:
+        print(f"[{datetime.now()}] ВНИМАНИЕ: Токен Яндекс.Диска не задан. Резервное копирование не будет работать!")
+    else:
+        print(f"[{datetime.now()}] Токен Яндекс.Диска найден: {yandex_token[:5]}...{yandex_token[-5:]}")
         # Создаем папку приложения на Яндекс.Диске, если её нет
         create_app_folder(yandex_token)
-        
-        # Выводим сообщение об успешном обнаружении токена
-        print(f"[{datetime.now()}] Токен Яндекс.Диска найден: {yandex_token[:5]}...{yandex_token[-4:]}")
-        
-        # Проверяем, если в приложении включено резервное копирование
-        if settings.get('backup_settings', {}).get('enabled', False):
-            # Создаем тестовую резервную копию при запуске
+        if backup_settings.get('enabled', False):
+            # Тестовая копия при запуске; если данные не менялись, perform_backup ничего не выгрузит
             print(f"[{datetime.now()}] Создание тестовой резервной копии при запуске планировщика...")
-            try:
-                create_backup()
-            except Exception as e:
-                print(f"[{datetime.now()}] ОШИБКА: Не удалось создать тестовую резервную копию")
-    else:
-        print(f"[{datetime.now()}] Токен Яндекс.Диска не найден. Резервное копирование не будет работать.")
+            schedule_job('startup-backup', time.time(), lambda: create_backup('startup'))
+    schedule_backup()
+    # Отметки, поставленные воркерами до захвата аренды, проверяются сразу
+    schedule_job('debounced-backup', time.time(), run_debounced_backup)
 
-def run_scheduler():
-    """Запуск планировщика резервного копирования"""
-    print(f"[{datetime.now()}] Запущен планировщик резервного копирования")
+def run_lease_job():
+    """Захват или продление аренды планировщика.
+
+    Настройки, измененные в другом воркере, ведущий процесс замечает здесь же:
+    load_settings перечитывает измененный файл и вызывает on_settings_changed.
+    """
+    leader = acquire_lease(SCHEDULER_LEASE_NAME, SCHEDULER_LEASE_TTL)
+    was_leader = scheduler_state['leader']
+    scheduler_state['leader'] = leader
+    if leader and not was_leader:
+        print(f"[{datetime.now()}] Процесс {get_lease_owner()} выполняет плановые задачи")
+        start_leader_jobs()
+    elif was_leader and not leader:
+        print(f"[{datetime.now()}] Аренда планировщика перешла другому процессу, плановые задачи остановлены")
+        schedule_job('backup', None, run_backup_job)
+        schedule_job('debounced-backup', None, run_debounced_backup)
+    elif leader:
+        load_settings()
+    schedule_job('lease', time.time() + SCHEDULER_LEASE_RENEW, run_lease_job)
+
+def get_backup_debounce(backup_settings):
+    """Пауза после регистраций и максимальная задержка отложенной копии, секунды"""
+    try:
+        quiet = float(backup_settings.get('debounce_quiet', BACKUP_DEBOUNCE_QUIET))
+        max_delay = float(backup_settings.get('debounce_max_delay', BACKUP_DEBOUNCE_MAX_DELAY))
+    except (TypeError, ValueError):
+        quiet, max_delay = BACKUP_DEBOUNCE_QUIET, BACKUP_DEBOUNCE_MAX_DELAY
+    return quiet, max(quiet, max_delay)
+
+def get_backup_debounce_state(db=None):
+    """Общая для воркеров отметка о несохраненных данных и срок отложенной копии (None, None - отметки нет)"""
+    rows = dict((db or get_state_db()).execute(
+        "SELECT key, value FROM meta WHERE key IN ('backup_dirty_since', 'backup_deadline')").fetchall())
+    if 'backup_dirty_since' not in rows:
+        return None, None
+    return float(rows['backup_dirty_since']), float(rows['backup_deadline'])
+
+def set_backup_debounce_state(db, dirty_since, deadline):
+    """Запись отметки и срока отложенной копии (вызывается в транзакции)"""
+    db.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                   [('backup_dirty_since', repr(dirty_since)), ('backup_deadline', repr(deadline))])
+
+def request_backup():
+    """Отметка о несохраненных в копию данных вместо запуска копии на каждую регистрацию.
+
+    Срок отложенной копии сдвигается с каждой регистрацией на паузу quiet,
+    но не дальше max_delay от первой отметки; все отметки до срока, из
+    любого воркера, объединяются в одну копию.
+    """
+    quiet, max_delay = get_backup_debounce(load_settings().get('backup_settings', {}))
+    now = time.time()
+    try:
+        db = get_state_db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            dirty_since, _ = get_backup_debounce_state(db)
+            coalesced = dirty_since is not None
+            if not coalesced:
+                dirty_since = now
+            deadline = min(now + quiet, dirty_since + max_delay)
+            set_backup_debounce_state(db, dirty_since, deadline)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+    except sqlite3.Error as e:
+        app.logger.error(f"Ошибка при отметке отложенной копии: {str(e)}")
+        return
     
-    # Инициализируем переменную next_time
-    next_time = None
+    with backup_trigger_lock:
+        backup_trigger['triggers'] += 1
+        if coalesced:
+            backup_trigger['coalesced'] += 1
+    if scheduler_state['leader']:
+        schedule_job('debounced-backup', deadline, run_debounced_backup)
+
+def take_backup_debounce_mark():
+    """Снятие отметки, срок которой наступил; возвращает время отметки или None.
+
+    Если срок еще не наступил, возвращает его вторым значением - задача
+    переставляется на него. Регистрации после снятия ставят новую отметку.
+    """
+    db = get_state_db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        dirty_since, deadline = get_backup_debounce_state(db)
+        if dirty_since is not None and deadline <= time.time():
+            db.execute("DELETE FROM meta WHERE key IN ('backup_dirty_since', 'backup_deadline')")
+            db.execute('COMMIT')
+            return dirty_since, None
+        db.execute('COMMIT')
+        return None, deadline
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+
+def run_debounced_backup():
+    """Отложенная копия после регистраций в ведущем процессе; при неудаче или занятой копии - повтор через паузу"""
+    if not scheduler_state['leader']:
+        return
+    dirty_since, deadline = take_backup_debounce_mark()
+    if dirty_since is None:
+        # Без отметки новые отметки других воркеров замечаются при следующей проверке
+        schedule_job('debounced-backup', deadline or time.time() + BACKUP_DEBOUNCE_POLL, run_debounced_backup)
+        return
     
-    # Выполняем инициализацию настроек резервного копирования
-    settings = load_settings()
+    try:
+        success = create_backup('registration')
+    except Exception as e:
+        app.logger.error(f"Ошибка отложенной копии: {str(e)}")
+        success = False
+    if success:
+        with backup_trigger_lock:
+            backup_trigger['runs'] += 1
+            backup_trigger['last_run'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        schedule_job('debounced-backup', time.time() + BACKUP_DEBOUNCE_POLL, run_debounced_backup)
+        return
     
-    # Получаем настройки резервного копирования
-    backup_settings = settings.get('backup_settings', {})
-    enabled = backup_settings.get('enabled', False)
-    interval = backup_settings.get('interval', 'daily')
-    yandex_token = backup_settings.get('yandex_token', '')
+    quiet, _ = get_backup_debounce(load_settings().get('backup_settings', {}))
+    lease = get_lease(BACKUP_RUN_LEASE_NAME)
+    busy = lease is not None and lease['alive']
+    retry = time.time() + (quiet if busy else BACKUP_RETRY_DELAY)
+    with backup_trigger_lock:
+        backup_trigger['busy' if busy else 'failed'] += 1
+    # Отметка возвращается с прежним временем, чтобы не растягивать max_delay
+    db = get_state_db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        current, current_deadline = get_backup_debounce_state(db)
+        if current is not None:
+            dirty_since, retry = min(dirty_since, current), min(retry, current_deadline)
+        set_backup_debounce_state(db, dirty_since, retry)
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    schedule_job('debounced-backup', retry, run_debounced_backup)
+
+def get_backup_trigger_stats():
+    """Счетчики отложенных копий текущего процесса и общая для воркеров отметка о несохраненных данных"""
+    with backup_trigger_lock:
+        stats = dict(backup_trigger)
+    stats['pending'] = get_backup_debounce_state()[0] is not None
+    return stats
+
+def sync_participants_store():
+    """Запись текущих участников (без удаленных) и ревизии снимка в локальный файл и на Яндекс.Диск"""
+    participants, revision = snapshot_participants()
+    data, meta = write_participants_file(participants, revision)
     
+    yandex_token = load_settings().get('backup_settings', {}).get('yandex_token')
     if not yandex_token:
-        print(f"[{datetime.now()}] ВНИМАНИЕ: Токен Яндекс.Диска не задан. Резервное копирование не будет работать!")
+        return True
+    return upload_participants_store(yandex_token, data, meta)
+
+def request_store_sync():
+    """Отложенная запись хранилища после удалений: все удаления до срока объединяются в одну запись"""
+    now = time.time()
+    with store_sync_lock:
+        store_sync_state['requests'] += 1
+        if store_sync_state['dirty_since'] is None:
+            store_sync_state['dirty_since'] = now
+        deadline = min(now + STORE_SYNC_DELAY, store_sync_state['dirty_since'] + STORE_SYNC_MAX_DELAY)
+    if scheduler_state['running']:
+        schedule_job('store-sync', deadline, run_store_sync)
     else:
-        print(f"[{datetime.now()}] Токен Яндекс.Диска найден: {yandex_token[:5]}...{yandex_token[-5:]}")
+        # Без планировщика (например, flask run) хранилище пишется сразу
+        run_store_sync()
+
+def run_store_sync():
+    """Фоновая запись хранилища участников; при неудаче - повтор через BACKUP_RETRY_DELAY"""
+    with store_sync_lock:
+        dirty_since = store_sync_state['dirty_since']
+        store_sync_state['dirty_since'] = None
+    if dirty_since is None:
+        return
     
-    # При запуске создаем тестовую резервную копию, чтобы проверить работоспособность
-    if backup_settings.get('enabled', False):
-        print(f"[{datetime.now()}] Создание тестовой резервной копии при запуске планировщика...")
-        success = create_backup()
-        if success:
-            print(f"[{datetime.now()}] Тестовая резервная копия успешно создана")
-        else:
-            print(f"[{datetime.now()}] ОШИБКА: Не удалось создать тестовую резервную копию")
+    try:
+        synced = sync_participants_store()
+    except Exception as e:
+        app.logger.error(f"Ошибка при записи хранилища участников: {str(e)}")
+        synced = False
     
+    with store_sync_lock:
+        if synced:
+            store_sync_state['runs'] += 1
+            store_sync_state['last_run'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            return
+        store_sync_state['failed'] += 1
+        if store_sync_state['dirty_since'] is None or dirty_since < store_sync_state['dirty_since']:
+            store_sync_state['dirty_since'] = dirty_since
+    if scheduler_state['running']:
+        schedule_job('store-sync', time.time() + BACKUP_RETRY_DELAY, run_store_sync)
+
+# Отложенная запись не теряется при остановке процесса (в том числе воркера gunicorn)
+atexit.register(run_store_sync)
+
+def run_backup_job():
+    """Плановая копия по сроку из кучи; затем ставится следующий срок или повтор через BACKUP_RETRY_DELAY"""
+    # Аренда продлевается перед копией: если процесс ее потерял (например, был
+    # приостановлен дольше TTL), копию делает новый владелец. Смену владельца
+    # обрабатывает run_lease_job в потоке планировщика
+    if not scheduler_state['leader'] or not acquire_lease(SCHEDULER_LEASE_NAME, SCHEDULER_LEASE_TTL):
+        return
+    current_time = datetime.now()
+    print(f"[{current_time}] Время создания автоматической резервной копии")
+    # Метку времени последней копии при успехе записывает run_backup
+    if create_backup():
+        schedule_backup()
+    else:
+        print(f"[{current_time}] Резервное копирование не удалось, следующая попытка через {BACKUP_RETRY_DELAY} сек.")
+        schedule_job('backup', time.time() + BACKUP_RETRY_DELAY, run_backup_job)
+
+def run_scheduler_job(job):
+    """Выполнение задачи планировщика; упавшие плановая и отложенная копии повторяются через BACKUP_RETRY_DELAY"""
+    try:
+        job[3]()
+    except Exception as e:
+        print(f"[{datetime.now()}] Ошибка в задаче планировщика {job[2]}: {e}")
+        traceback.print_exc()
+        if job[2] == 'backup':
+            schedule_job('backup', time.time() + BACKUP_RETRY_DELAY, run_backup_job)
+        elif job[2] == 'debounced-backup':
+            schedule_job('debounced-backup', time.time() + BACKUP_RETRY_DELAY, run_debounced_backup)
+
+def dispatch_scheduler_job(job):
+    """Задачи из SCHEDULER_JOB_POOLS уходят в поток своего пула (задачи пула идут по очереди), остальные выполняются сразу"""
+    pool = SCHEDULER_JOB_POOLS.get(job[2])
+    if pool is None:
+        run_scheduler_job(job)
+        return
+    with scheduler_condition:
+        executor = scheduler_executors.get(pool)
+        if executor is None:
+            executor = scheduler_executors[pool] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=pool)
+    executor.submit(run_scheduler_job, job)
+
+def run_scheduler():
+    """Планировщик фоновых задач: поток спит до срока ближайшей задачи в куче.
+
+    Между сроками поток не просыпается: ожидание на scheduler_condition
+    прерывается только сроком задачи или изменением настроек
+    (notify_scheduler), после которого срок копии пересчитывается.
+    Планировщик запускается в каждом воркере, но плановые задачи ставит
+    только владелец аренды SCHEDULER_LEASE_NAME; остальные раз в
+    SCHEDULER_LEASE_RENEW секунд пробуют ее перехватить. Копии и запись
+    хранилища выполняются в потоках пулов (dispatch_scheduler_job), чтобы не
+    задерживать продление аренды и друг друга.
+    """
+    print(f"[{datetime.now()}] Запущен планировщик резервного копирования")
+    scheduler_state['running'] = True
+    atexit.register(release_lease, SCHEDULER_LEASE_NAME)
+    run_lease_job()
     while True:
-        settings = load_settings()
-        backup_settings = settings.get('backup_settings', {})
-        
-        if not backup_settings.get('enabled', False):
-            # Если резервное копирование отключено, проверяем раз в минуту
-            print(f"[{datetime.now()}] Резервное копирование отключено в настройках")
-            # Проверяем на событие каждую секунду для более быстрого отклика
-            for _ in range(60):
-                if scheduler_event.is_set():
-                    print(f"[{datetime.now()}] Получен сигнал об изменении настроек")
-                    scheduler_event.clear()  # Сбрасываем флаг
-                    break
-                time.sleep(1)
+        job = None
+        with scheduler_condition:
+            while job is None and not scheduler_state['settings_changed']:
+                now = time.time()
+                if scheduler_jobs and scheduler_jobs[0][0] <= now:
+                    job = heapq.heappop(scheduler_jobs)
+                else:
+                    # Ожидание ограничено на случай перевода системных часов
+                    timeout = min(scheduler_jobs[0][0] - now, SCHEDULER_MAX_WAIT) if scheduler_jobs else SCHEDULER_MAX_WAIT
+                    scheduler_condition.wait(timeout)
+            if job is None:
+                scheduler_state['settings_changed'] = False
+        
+        if job is None:
+            # Сроки уже могли пересчитать после собственной записи (например, last_backup)
+            if scheduler_state['leader'] and load_settings().get('backup_settings', {}) != scheduler_state['backup_settings']:
+                print(f"[{datetime.now()}] Обрабатываем изменение настроек резервного копирования")
+                schedule_backup()
             continue
         
-        current_time = datetime.now()
-        
-        # Если было событие изменения настроек, сбрасываем расчет времени и проверяем сразу
-        if scheduler_event.is_set():
-            print(f"[{current_time}] Обрабатываем изменение настроек резервного копирования")
-            scheduler_event.clear()  # Сбрасываем флаг
-            next_time = None
-            # Если включён пользовательский интервал и интервал короткий - создаем резервную копию немедленно
-            interval = backup_settings.get('interval', 'daily')
-            if interval == 'custom':
-                value = int(backup_settings.get('custom_value', 24))
-                unit = backup_settings.get('custom_unit', 'hours')
-                print(f"[{current_time}] Новый интервал резервного копирования: {value} {unit}")
-                if unit in ['seconds', 'minutes'] or (unit == 'hours' and value < 1):
-                    print(f"[{current_time}] Создание резервной копии немедленно после изменения настроек")
-                    if create_backup():
-                        # Обновляем время последнего резервного копирования в файле настроек
-                        settings = load_settings()
-                        settings['backup_settings']['last_backup'] = current_time.strftime('%Y-%m-%d %H:%M:%S')
-                        save_settings(settings)
-                        print(f"[{current_time}] Обновлено время последнего резервного копирования: {settings['backup_settings']['last_backup']}")
-        
-        # Рассчитываем время следующего резервного копирования
-        if next_time is None:
-            # Первый запуск или настройки изменились
-            interval = backup_settings.get('interval', 'daily')
-            
-            if interval == 'daily':
-                # Ежедневное резервное копирование в 03:00
-                next_time = current_time.replace(hour=3, minute=0, second=0, microsecond=0)
-                if current_time >= next_time:
-                    next_time += timedelta(days=1)
-                print(f"[{current_time}] Следующее резервное копирование (daily): {next_time}")
-            elif interval == 'hourly':
-                # Ежечасное резервное копирование в начале часа
-                next_time = current_time.replace(minute=0, second=0, microsecond=0)
-                if current_time >= next_time:
-                    next_time += timedelta(hours=1)
-                print(f"[{current_time}] Следующее резервное копирование (hourly): {next_time}")
-            elif interval == 'custom':
-                # Произвольный интервал
-                value = int(backup_settings.get('custom_value', 24))
-                unit = backup_settings.get('custom_unit', 'hours')
-                
-                # Получаем последнее время резервного копирования
-                last_backup = backup_settings.get('last_backup')
-                
-                if last_backup:
-                    try:
-                        last_backup_time = datetime.strptime(last_backup, '%Y-%m-%d %H:%M:%S')
-                        print(f"[{current_time}] Последнее резервное копирование было в: {last_backup_time}")
-                        
-                        # Рассчитываем следующее время на основе последнего резервного копирования
-                        if unit == 'seconds':
-                            next_time = last_backup_time + timedelta(seconds=value)
-                        elif unit == 'minutes':
-                            next_time = last_backup_time + timedelta(minutes=value)
-                        elif unit == 'hours':
-                            next_time = last_backup_time + timedelta(hours=value)
-                        elif unit == 'days':
-                            next_time = last_backup_time + timedelta(days=value)
-                        elif unit == 'weeks':
-                            next_time = last_backup_time + timedelta(weeks=value)
-                        else:
-                            next_time = last_backup_time + timedelta(hours=24)
-                        
-                        print(f"[{current_time}] Следующее резервное копирование (custom {value} {unit}): {next_time}")
-                            
-                        # Если рассчитанное время уже прошло, делаем резервную копию сейчас
-                        if next_time <= current_time:
-                            print(f"[{current_time}] Рассчитанное время уже прошло, делаем копию сейчас")
-                            next_time = current_time
-                    except Exception as e:
-                        print(f"[{current_time}] Ошибка при разборе даты последнего бэкапа: {e}")
-                        next_time = current_time
-                else:
-                    # Если нет записи о последнем резервном копировании, делаем сейчас
-                    print(f"[{current_time}] Нет данных о последнем резервном копировании, делаем копию сейчас")
-                    next_time = current_time
-        
-        # Проверяем, наступило ли время для создания резервной копии
-        if current_time >= next_time:
-            print(f"[{current_time}] Время создания автоматической резервной копии")
-            # Создаем резервную копию и обновляем метку времени только в случае успеха
-            if create_backup():
-                # Обновляем время последнего резервного копирования в файле настроек
-                settings = load_settings()
-                settings['backup_settings']['last_backup'] = current_time.strftime('%Y-%m-%d %H:%M:%S')
-                save_settings(settings)
-                print(f"[{current_time}] Время последнего резервного копирования обновлено: {settings['backup_settings']['last_backup']}")
-                
-                # Сбрасываем счетчик для следующего резервного копирования
-                next_time = None
-            else:
-                # Если копирование не удалось, попробуем снова через минуту
-                print(f"[{current_time}] Резервное копирование не удалось, следующая попытка через минуту")
-                next_time = current_time + timedelta(minutes=1)
-        else:
-            # Для коротких интервалов используем более частые проверки
-            interval = backup_settings.get('interval', 'daily')
-            if interval == 'custom':
-                unit = backup_settings.get('custom_unit', 'hours')
-                if unit == 'seconds':
-                    # Для секунд проверяем каждую секунду
-                    wait_seconds = 1
-                elif unit == 'minutes':
-                    # Для минут проверяем каждые 5 секунд
-                    wait_seconds = 5
-                else:
-                    # Для других интервалов проверяем не чаще раза в минуту
-                    wait_seconds = min(60, (next_time - current_time).total_seconds())
-            else:
-                # Для стандартных интервалов проверяем не чаще раза в минуту
-                wait_seconds = min(60, (next_time - current_time).total_seconds())
-            
-            if wait_seconds <= 0:
-                wait_seconds = 1
-                
-            print(f"[{current_time}] Ожидание {wait_seconds} сек. до следующей проверки. Следующее резервное копирование в {next_time}")
-            
-            # Разбиваем ожидание на короткие интервалы для быстрого отклика на события
-            for _ in range(int(wait_seconds)):
-                if scheduler_event.is_set():
-                    print(f"[{datetime.now()}] Получен сигнал об изменении настроек во время ожидания")
-                    break
-                time.sleep(1)
+        dispatch_scheduler_job(job)
 
 # Запуск фонового задания для резервного копирования
 def start_backup_scheduler():
@@ -1898,6 +4902,7 @@ def init_app(flask_app):
 if __name__ == '__main__':
     # Инициализация настроек резервного копирования
     init_backup_settings()
+    start_warmup()
     # Запуск планировщика резервного копирования
     start_backup_scheduler()
     
@@ -1941,54 +4946,33 @@ def find_ticket():
 
 @app.route('/check-data-updates')
 def check_data_updates():
-    """Проверяет наличие обновленных данных на Яндекс.Диске"""
+    """Дельта изменений участников после ревизии since (или 304, если изменений нет)"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
     try:
-        # Получаем токен Яндекс.Диска из настроек
-        settings = load_settings()
-        yandex_token = settings.get('backup_settings', {}).get('yandex_token')
-        
-        if not yandex_token:
-            return jsonify({
-                'success': False,
-                'message': 'Не найден токен Яндекс.Диска',
-                'has_updates': False
-            })
-        
-        # Принудительно загружаем данные заново с Яндекс.Диска
-        global PARTICIPANTS_CACHE
-        temp_cache = PARTICIPANTS_CACHE
-        PARTICIPANTS_CACHE = None  # Сбрасываем кэш для принудительной загрузки
-        
-        # Проверяем информацию о файле на Яндекс.Диске
-        headers = {"Authorization": f"OAuth {yandex_token}"}
-        url = "https://cloud-api.yandex.net/v1/disk/resources"
-        params = {"path": "app:/participants.json"}
+        # Догоняем кэш по журналу изменений: O(число изменений), без обращения к Яндекс.Диску
+        participants = load_participants()
+        revision = participants_state['revision']
+        since = request.args.get('since', type=int)
         
-        response = requests.get(url, headers=headers, params=params)
+        if since is not None and since == revision:
+            return '', 304
         
-        if response.status_code == 200:
-            file_info = response.json()
-            file_modified = file_info.get('modified', '')
-            
-            # Загружаем данные участников
-            participants = load_participants()
+        def build():
+            changes = get_changes_since(since, revision) if since is not None else None
             
-            # Общее количество участников
-            total = len(participants)
+            # Последние участники берутся из кольцевого буфера, без сортировки всего списка
+            latest_participants = list(participants_state['latest'])[-5:][::-1]
             
-            # Информация о последних 5 участниках (для отображения в админке)
-            latest_participants = []
-            if participants:
-                sorted_participants = sorted(participants, key=lambda x: x.get('registration_time', ''), reverse=True)
-                latest_participants = sorted_participants[:5]
-            
-            has_updates = True  # Всегда считаем, что есть обновления (для упрощения)
-            
-            return jsonify({
+            return {
                 'success': True,
-                'has_updates': has_updates,
-                'file_modified': file_modified,
-                'total_participants': total,
+                'has_updates': True,
+                'revision': revision,
+                'reset': changes is None,
+                'added': changes['added'] if changes else [],
+                'removed': changes['removed'] if changes else [],
+                'total_participants': len(participants),
                 'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'latest_participants': [
                     {
@@ -1998,17 +4982,9 @@ def check_data_updates():
                         'registration_time': p.get('registration_time')
                     } for p in latest_participants
                 ]
-            })
-        else:
-            # Если файл не найден на Яндекс.Диске
-            return jsonify({
-                'success': False,
-                'has_updates': False,
-                'message': f'Файл с данными не найден на Яндекс.Диске: {response.status_code}',
-                'total_participants': 0,
-                'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'latest_participants': []
-            })
+            }
+        
+        return admin_json_response('check-data-updates', revision, build)
             
     except Exception as e:
         app.logger.error(f'Ошибка при проверке обновлений данных: {str(e)}')
@@ -2021,6 +4997,110 @@ def check_data_updates():
             'latest_participants': []
         })
 
+@app.route('/admin/events')
+def admin_events():
+    """Поток Server-Sent Events для админки: регистрации, удаления, резервные копии, статистика.
+
+    Не больше EVENTS_MAX_STREAMS потоков на процесс: остальным - 503 с Retry-After.
+    """
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    # Браузер передает Last-Event-ID при переподключении; без него отдаем только новые события
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        last_id = get_last_event_id()
+    
+    with events_condition:
+        if events_streams['active'] >= EVENTS_MAX_STREAMS:
+            events_streams['rejected'] += 1
+            full = True
+        else:
+            events_streams['active'] += 1
+            full = False
+    if full:
+        response = Response(f'retry: {EVENTS_RETRY_AFTER * 1000}\n\n', status=503, mimetype='text/event-stream')
+        response.headers['Retry-After'] = str(EVENTS_RETRY_AFTER)
+        return response
+    
+    def close_stream():
+        with events_condition:
+            events_streams['active'] -= 1
+    
+    def generate(last_id):
+        started = time.monotonic()
+        last_sent = started
+        yield 'retry: 3000\n\n'
+        
+        while time.monotonic() - started < EVENTS_STREAM_DURATION:
+            events = read_events_since(last_id)
+            if events is None:
+                # Пропущенные события уже удалены из журнала - клиент перезагружает данные
+                last_id = get_last_event_id()
+                yield f'id: {last_id}\nevent: reset\ndata: {{}}\n\n'
+                last_sent = time.monotonic()
+                continue
+            
+            for event_id, event_type, data in events:
+                last_id = event_id
+                yield f'id: {event_id}\nevent: {event_type}\ndata: {data}\n\n'
+                last_sent = time.monotonic()
+            
+            if events:
+                continue
+            
+            if time.monotonic() - last_sent >= EVENTS_HEARTBEAT_INTERVAL:
+                yield ': heartbeat\n\n'
+                last_sent = time.monotonic()
+            
+            # Ждем события этого процесса; события других процессов подхватываются по таймауту
+            with events_condition:
+                events_condition.wait(EVENTS_POLL_INTERVAL)
+    
+    response = Response(stream_with_context(generate(last_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    # Место освобождается при закрытии ответа, даже если поток не успел начаться
+    response.call_on_close(close_stream)
+    return response
+
+@app.route('/admin/timeseries')
+def admin_timeseries():
+    """Регистрации по минутам, часам или дням из предрасчитанных счетчиков"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    step = request.args.get('step', 'minute')
+    if step not in TIMESERIES_STEPS:
+        return jsonify({'success': False, 'message': 'Шаг должен быть minute, hour или day'}), 400
+    
+    # По умолчанию - последние 60 интервалов
+    end = parse_timeseries_time(request.args.get('to')) if request.args.get('to') else datetime.now()
+    start = parse_timeseries_time(request.args.get('from')) if request.args.get('from') else None
+    if end is None or (request.args.get('from') and start is None):
+        return jsonify({'success': False, 'message': 'Неверный формат времени, ожидается ГГГГ-ММ-ДД ЧЧ:ММ'}), 400
+    if start is None:
+        start = end - TIMESERIES_STEPS[step][1] * 59
+    if start > end:
+        return jsonify({'success': False, 'message': 'Начало интервала позже окончания'}), 400
+    
+    # Участники нужны только для первой загрузки счетчиков в этом процессе
+    load_participants()
+    points = get_timeseries(start, end, step)
+    retention = TIMESERIES_RETENTION[step]
+    
+    return jsonify({
+        'success': True,
+        'step': step,
+        'from': points[0]['time'] if points else None,
+        'to': points[-1]['time'] if points else None,
+        'truncated': len(points) >= TIMESERIES_MAX_POINTS,
+        'detail_available_from': (datetime.now() - retention).strftime(TIMESERIES_STEPS[step][2]) if retention else None,
+        'points': points
+    })
+
 @app.route('/get-backup-status', methods=['GET'])
 def get_backup_status():
     """Получение текущего статуса резервного копирования"""
@@ -2029,109 +5109,46 @@ def get_backup_status():
         return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
     
     try:
-        # Загрузка настроек
-        settings = load_settings()
-        
-        # Получаем данные о резервном копировании
-        backup_settings = settings.get('backup_settings', {})
-        enabled = backup_settings.get('enabled', False)
-        last_backup = backup_settings.get('last_backup', None)
-        interval = backup_settings.get('interval', 'daily')
-        
-        # Расчет времени следующего бэкапа
-        next_backup = None
-        current_time = datetime.now()
-        
-        if enabled:
-            if interval == 'daily':
-                # Ежедневное резервное копирование в 03:00
-                next_time = current_time.replace(hour=3, minute=0, second=0, microsecond=0)
-                if current_time >= next_time:
-                    next_time += timedelta(days=1)
-                next_backup = f"В 03:00 ({next_time.strftime('%d.%m.%Y')})"
-                
-            elif interval == 'hourly':
-                # Ежечасное резервное копирование в начале часа
-                next_time = current_time.replace(minute=0, second=0, microsecond=0)
-                if current_time >= next_time:
-                    next_time += timedelta(hours=1)
-                next_backup = f"В {next_time.hour}:00 ({next_time.strftime('%d.%m.%Y')})"
-                
-            elif interval == 'custom':
-                # Произвольный интервал
-                value = int(backup_settings.get('custom_value', 24))
-                unit = backup_settings.get('custom_unit', 'hours')
-                
-                # Получаем время последнего резервного копирования
-                if last_backup:
-                    try:
-                        last_backup_time = datetime.strptime(last_backup, '%Y-%m-%d %H:%M:%S')
-                        
-                        # Рассчитываем следующее время на основе последнего резервного копирования
-                        if unit == 'seconds':
-                            next_time = last_backup_time + timedelta(seconds=value)
-                            unit_text = "секунд"
-                        elif unit == 'minutes':
-                            next_time = last_backup_time + timedelta(minutes=value)
-                            unit_text = "минут"
-                        elif unit == 'hours':
-                            next_time = last_backup_time + timedelta(hours=value)
-                            unit_text = "часов"
-                        elif unit == 'days':
-                            next_time = last_backup_time + timedelta(days=value)
-                            unit_text = "дней"
-                        elif unit == 'weeks':
-                            next_time = last_backup_time + timedelta(weeks=value)
-                            unit_text = "недель"
-                        else:
-                            next_time = last_backup_time + timedelta(hours=24)
-                            unit_text = "часов"
-                        
-                        # Форматируем время для отображения
-                        if next_time <= current_time:
-                            next_backup = "В ближайшее время"
-                        else:
-                            time_diff = next_time - current_time
-                            total_seconds = int(time_diff.total_seconds())
-                            
-                            # Форматируем время в удобочитаемом виде
-                            if total_seconds < 60:
-                                next_backup = f"Через {total_seconds} секунд"
-                            elif total_seconds < 3600:
-                                minutes = total_seconds // 60
-                                next_backup = f"Через {minutes} минут"
-                            elif total_seconds < 86400:
-                                hours = total_seconds // 3600
-                                next_backup = f"Через {hours} часов"
-                            else:
-                                days = total_seconds // 86400
-                                next_backup = f"Через {days} дней"
-                    except Exception as e:
-                        print(f"Ошибка при расчете следующего времени резервного копирования: {e}")
-                        next_backup = f"Через {value} {unit_text}"
-                else:
-                    next_backup = "После первого резервного копирования"
-        else:
-            next_backup = "Резервное копирование отключено"
-        
-        # Форматируем дату последнего бэкапа, если она есть
-        formatted_last_backup = None
-        if last_backup:
-            try:
-                last_backup_time = datetime.strptime(last_backup, '%Y-%m-%d %H:%M:%S')
-                formatted_last_backup = last_backup_time.strftime('%d.%m.%Y %H:%M:%S')
-            except:
-                formatted_last_backup = last_backup
+        # Текст о следующем бэкапе зависит от текущего времени, поэтому ревизия
+        # настроек дополняется интервалом BACKUP_STATUS_ETAG_TTL. Тело одинаково во всех воркерах:
+        # владелец аренды берется из базы состояния, счетчики процесса - только в /admin/backups/metrics
+        lease = get_lease(SCHEDULER_LEASE_NAME)
+        revision = (get_settings_revision(), int(time.time()) // BACKUP_STATUS_ETAG_TTL,
+                    lease and (lease['owner'], lease['alive']))
+        
+        def build():
+            # Загрузка настроек
+            settings = load_settings()
+            
+            # Получаем данные о резервном копировании
+            backup_settings = settings.get('backup_settings', {})
+            enabled = backup_settings.get('enabled', False)
+            last_backup = backup_settings.get('last_backup', None)
+            
+            # Срок следующего бэкапа считает тот же compute_next_backup_time, что и планировщик
+            next_backup = get_next_backup_info()
+            
+            # Форматируем дату последнего бэкапа, если она есть
+            formatted_last_backup = None
+            if last_backup:
+                try:
+                    last_backup_time = datetime.strptime(last_backup, '%Y-%m-%d %H:%M:%S')
+                    formatted_last_backup = last_backup_time.strftime('%d.%m.%Y %H:%M:%S')
+                except:
+                    formatted_last_backup = last_backup
+            
+            return {
+                'success': True,
+                'enabled': enabled,
+                'last_backup': formatted_last_backup,
+                'next_backup': next_backup,
+                'interval': backup_settings.get('interval', 'daily'),
+                'custom_value': backup_settings.get('custom_value', 24),
+                'custom_unit': backup_settings.get('custom_unit', 'hours'),
+                'scheduler': lease
+            }
         
-        return jsonify({
-            'success': True,
-            'enabled': enabled,
-            'last_backup': formatted_last_backup,
-            'next_backup': next_backup,
-            'interval': interval,
-            'custom_value': backup_settings.get('custom_value', 24),
-            'custom_unit': backup_settings.get('custom_unit', 'hours')
-        })
+        return admin_json_response('get-backup-status', revision, build)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -2142,106 +5159,129 @@ def check_backup_status():
         return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
     
     try:
-        settings = load_settings()
-        backup_settings = settings.get('backup_settings', {})
-        
-        # Получаем информацию о последнем резервном копировании
-        last_backup = backup_settings.get('last_backup', None)
-        
-        # Рассчитываем предполагаемое время следующего резервного копирования
-        next_backup = get_next_backup_info()
-        
-        return jsonify({
-            'success': True,
-            'enabled': backup_settings.get('enabled', False),
-            'last_backup': last_backup,
-            'next_backup': next_backup,
-            'interval': backup_settings.get('interval', 'daily'),
-            'custom_value': backup_settings.get('custom_value', 24),
-            'custom_unit': backup_settings.get('custom_unit', 'hours')
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-def get_next_backup_info():
-    """Расчет времени следующего резервного копирования"""
-    try:
-        settings = load_settings()
-        backup_settings = settings.get('backup_settings', {})
-        
-        if not backup_settings.get('enabled', False):
-            return "Резервное копирование отключено"
-        
-        interval = backup_settings.get('interval', 'daily')
-        current_time = datetime.now()
-        
-        if interval == 'daily':
-            # Ежедневное резервное копирование в 03:00
-            next_time = current_time.replace(hour=3, minute=0, second=0, microsecond=0)
-            if current_time >= next_time:
-                next_time += timedelta(days=1)
-            return f"В 03:00 {next_time.strftime('%d.%m.%Y')}"
-            
-        elif interval == 'hourly':
-            # Ежечасное резервное копирование в начале часа
-            next_time = current_time.replace(minute=0, second=0, microsecond=0)
-            if current_time >= next_time:
-                next_time += timedelta(hours=1)
-            return f"В {next_time.strftime('%H:%M')} {next_time.strftime('%d.%m.%Y')}"
+        # Текст о следующем бэкапе зависит от текущего времени, поэтому ревизия
+        # настроек дополняется интервалом BACKUP_STATUS_ETAG_TTL. Тело одинаково во всех воркерах:
+        # владелец аренды берется из базы состояния, счетчики процесса - только в /admin/backups/metrics
+        lease = get_lease(SCHEDULER_LEASE_NAME)
+        revision = (get_settings_revision(), int(time.time()) // BACKUP_STATUS_ETAG_TTL,
+                    lease and (lease['owner'], lease['alive']))
+        
+        def build():
+            settings = load_settings()
+            backup_settings = settings.get('backup_settings', {})
             
-        elif interval == 'custom':
-            # Произвольный интервал
-            value = int(backup_settings.get('custom_value', 24))
-            unit = backup_settings.get('custom_unit', 'hours')
+            # Получаем информацию о последнем резервном копировании
+            last_backup = backup_settings.get('last_backup', None)
             
-            # Получаем последнее время резервного копирования
-            last_backup = backup_settings.get('last_backup')
+            # Рассчитываем предполагаемое время следующего резервного копирования
+            next_backup = get_next_backup_info()
             
-            if last_backup:
-                try:
-                    last_backup_time = datetime.strptime(last_backup, '%Y-%m-%d %H:%M:%S')
-                    
-                    # Рассчитываем следующее время на основе последнего резервного копирования
-                    if unit == 'seconds':
-                        next_time = last_backup_time + timedelta(seconds=value)
-                    elif unit == 'minutes':
-                        next_time = last_backup_time + timedelta(minutes=value)
-                    elif unit == 'hours':
-                        next_time = last_backup_time + timedelta(hours=value)
-                    elif unit == 'days':
-                        next_time = last_backup_time + timedelta(days=value)
-                    elif unit == 'weeks':
-                        next_time = last_backup_time + timedelta(weeks=value)
-                    else:
-                        next_time = last_backup_time + timedelta(hours=24)
-                    
-                    # Форматируем время для отображения
-                    time_format = "%d.%m.%Y %H:%M"
-                    
-                    if next_time <= current_time:
-                        return "В ближайшее время"
-                    else:
-                        # Получаем разницу времени
-                        time_diff = next_time - current_time
-                        hours, remainder = divmod(time_diff.seconds, 3600)
-                        minutes, _ = divmod(remainder, 60)
-                        
-                        if time_diff.days > 0:
-                            return f"Через {time_diff.days} д. {hours} ч. ({next_time.strftime(time_format)})"
-                        elif hours > 0:
-                            return f"Через {hours} ч. {minutes} мин. ({next_time.strftime(time_format)})"
-                        else:
-                            return f"Через {minutes} мин. ({next_time.strftime(time_format)})"
-                except Exception as e:
-                    print(f"Ошибка при расчете времени следующего бэкапа: {e}")
-                    return "Не удалось определить"
-            else:
-                return "При следующем запуске планировщика"
+            return {
+                'success': True,
+                'enabled': backup_settings.get('enabled', False),
+                'last_backup': last_backup,
+                'next_backup': next_backup,
+                'interval': backup_settings.get('interval', 'daily'),
+                'custom_value': backup_settings.get('custom_value', 24),
+                'custom_unit': backup_settings.get('custom_unit', 'hours'),
+                'scheduler': lease
+            }
         
-        return "Не запланировано"
+        return admin_json_response('check-backup-status', revision, build)
     except Exception as e:
-        print(f"Ошибка при получении информации о следующем бэкапе: {e}")
-        return "Не удалось определить"
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def get_backup_summary():
+    """Сводка истории копий: запуски за сутки по исходу и последние успешные полная копия и дельта"""
+    db = get_state_db()
+    since = time.time() - 86400
+    summary = {
+        'runs_24h': dict(db.execute(
+            'SELECT outcome, COUNT(*) FROM backup_runs WHERE started_at >= ? GROUP BY outcome', (since,)).fetchall()),
+        'last_run': next(iter(get_backup_runs(1)), None),
+        'last_success': {}
+    }
+    for backup_type in ('full', 'delta'):
+        runs = get_backup_runs(1, where=f"outcome = 'success' AND type = '{backup_type}'")
+        summary['last_success'][backup_type] = runs[0] if runs else None
+    return summary
+
+@app.route('/admin/backups/history')
+def backup_history():
+    """История запусков резервного копирования (постранично, от новых к старым)"""
+    if not session.get('admin'):
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    try:
+        limit = min(max(int(request.args.get('limit', BACKUP_HISTORY_PAGE_SIZE)), 1), 1000)
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Некорректные параметры limit или before'}), 400
+    
+    runs = get_backup_runs(limit, before)
+    return jsonify({
+        'success': True,
+        'runs': runs,
+        'next_before': runs[-1]['id'] if len(runs) == limit else None,
+        'summary': get_backup_summary()
+    })
+
+@app.route('/admin/backups/metrics')
+def backup_metrics():
+    """Метрики резервного копирования в текстовом формате Prometheus.
+
+    Доступны админу или с заголовком Authorization: Bearer METRICS_TOKEN.
+    """
+    authorized = session.get('admin') or (
+        METRICS_TOKEN and request.headers.get('Authorization') == f'Bearer {METRICS_TOKEN}')
+    if not authorized:
+        return jsonify({'success': False, 'message': 'Доступ запрещен'}), 403
+    
+    db = get_state_db()
+    lines = [
+        '# HELP backup_runs Запуски копий в истории по причине и исходу',
+        '# TYPE backup_runs gauge'
+    ]
+    for trigger, outcome, count in db.execute(
+            'SELECT trigger, outcome, COUNT(*) FROM backup_runs GROUP BY trigger, outcome ORDER BY trigger, outcome'):
+        lines.append(f'backup_runs{{trigger="{trigger}",outcome="{outcome}"}} {count}')
+    
+    last_runs = {}
+    for backup_type in ('full', 'delta'):
+        runs = get_backup_runs(1, where=f"outcome = 'success' AND type = '{backup_type}'")
+        if runs:
+            last_runs[backup_type] = runs[0]
+    gauges = (
+        ('backup_last_success_timestamp_seconds', 'Время окончания последней успешной копии', lambda run: datetime.strptime(run['finished_at'], '%Y-%m-%d %H:%M:%S').timestamp()),
+        ('backup_last_duration_seconds', 'Длительность последней успешной копии', lambda run: run['duration']),
+        ('backup_last_bytes', 'Выгружено байт последней успешной копией', lambda run: run['bytes']),
+        ('backup_last_records', 'Участников в последней успешной копии', lambda run: run['records'] or 0)
+    )
+    for name, description, value in gauges:
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+        lines += [f'{name}{{type="{backup_type}"}} {value(run)}' for backup_type, run in last_runs.items()]
+    
+    lines += ['# HELP backup_last_stage_seconds Длительность этапов последней успешной копии',
+              '# TYPE backup_last_stage_seconds gauge']
+    for backup_type, run in last_runs.items():
+        lines += [f'backup_last_stage_seconds{{type="{backup_type}",stage="{stage}"}} {seconds}'
+                  for stage, seconds in sorted(run['timings'].items())]
+    
+    failed = db.execute("SELECT MAX(finished_at) FROM backup_runs WHERE outcome = 'failed'").fetchone()[0]
+    lines += ['# HELP backup_last_failure_timestamp_seconds Время последней неудачной копии',
+              '# TYPE backup_last_failure_timestamp_seconds gauge',
+              f'backup_last_failure_timestamp_seconds {failed or 0}']
+    
+    # Счетчики отложенных копий свои у каждого процесса - с меткой pid
+    stats = get_backup_trigger_stats()
+    lines += ['# HELP backup_debounce_events Отметки, объединенные отметки и запуски отложенных копий процесса',
+              '# TYPE backup_debounce_events counter']
+    lines += [f'backup_debounce_events{{pid="{os.getpid()}",event="{name}"}} {stats[name]}'
+              for name in ('triggers', 'coalesced', 'runs', 'busy', 'failed')]
+    lines += ['# HELP backup_debounce_pending Есть данные, ожидающие отложенной копии',
+              '# TYPE backup_debounce_pending gauge',
+              f'backup_debounce_pending {int(stats["pending"])}']
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 @app.route('/admin-login', methods=['GET'])
 def admin_login_page():
@@ -2256,6 +5296,7 @@ def admin_data():
     """Возвращает данные участников в формате JSON для AJAX-обновления админки"""
     try:
         # Получаем токен Яндекс.Диска из настроек
+        settings_revision = get_settings_revision()
         settings = load_settings()
         yandex_token = settings.get('backup_settings', {}).get('yandex_token')
         
@@ -2265,63 +5306,54 @@ def admin_data():
                 'message': 'Не найден токен Яндекс.Диска. Настройте токен в параметрах резервного копирования.'
             }), 500
         
-        # Проверяем доступность папки приложения на Яндекс.Диске
-        headers = {"Authorization": f"OAuth {yandex_token}"}
-        url = "https://cloud-api.yandex.net/v1/disk/resources"
-        params = {"path": "app:/"}
-        
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code != 200:
-            # Если папка не существует, создаем её
-            create_app_folder(yandex_token)
-        
-        # Загружаем список участников
-        all_participants = load_participants()
-        
-        # Если есть GET-параметр page, используем пагинацию
-        page = request.args.get('page', 1, type=int)
-        ajax_request = request.args.get('ajax', 'false') == 'true'
-        
-        # Настройка пагинации
-        per_page = 50  # Количество участников на странице
-        total_participants = len(all_participants)
-        total_pages = (total_participants + per_page - 1) // per_page if total_participants > 0 else 1
-        
-        # Проверка валидности номера страницы
-        if page < 1:
-            page = 1
-        elif page > total_pages:
-            page = total_pages
-        
-        # Вычисляем индексы для выборки участников на текущей странице
-        start_idx = (page - 1) * per_page
-        end_idx = min(start_idx + per_page, total_participants)
-        
-        # Получаем участников для текущей страницы
-        participants = all_participants[start_idx:end_idx] if total_participants > 0 else []
-        
-        # Подготовка данных о пагинации
-        pagination = {
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages,
-            'total_participants': total_participants
-        }
+        # Догоняем журнал изменений: ревизия данных определяет ETag и ключ кэша ответа
+        load_participants()
+        revision = participants_state['revision']
         
-        # Подготовка данных о статистике
-        statistics = {
-            'total': total_participants,
-            'male': len([p for p in participants if p.get('gender') == 'male']),
-            'female': len([p for p in participants if p.get('gender') == 'female'])
-        }
+        def build():
+            # Тело строится только из кэша участников: папку приложения на Яндекс.Диске
+            # создает планировщик при захвате аренды и при смене токена
+            
+            # Keyset-пагинация: страница участников после переданного курсора
+            sort = request.args.get('sort', 'ticket')
+            order = request.args.get('order', 'asc')
+            cursor = request.args.get('cursor')
+            per_page = parse_page_size(request.args.get('per_page', ADMIN_PAGE_SIZE))
+            
+            filters = parse_participant_filters(request.args)
+            
+            participants, next_cursor, total_filtered = get_participants_page(
+                sort=sort, order=order, cursor=cursor, per_page=per_page, filters=filters)
+            total_participants = len(participants_index['by_ticket'])
+            
+            # Подготовка данных о пагинации
+            pagination = {
+                'sort': sort,
+                'order': order,
+                'per_page': per_page,
+                'filters': filters,
+                'cursor': cursor,
+                'next_cursor': next_cursor,
+                'total_filtered': total_filtered,
+                'total_participants': total_participants
+            }
+            
+            # Подготовка данных о статистике
+            statistics = {
+                'total': total_participants,
+                'male': participants_index['genders'].get('male', 0),
+                'female': participants_index['genders'].get('female', 0)
+            }
+            
+            return {
+                'success': True,
+                'revision': revision,
+                'participants': participants,
+                'pagination': pagination,
+                'statistics': statistics
+            }
         
-        return jsonify({
-            'success': True,
-            'participants': participants,
-            'pagination': pagination,
-            'statistics': statistics
-        })
+        return admin_json_response('admin-data', (revision, settings_revision), build)
     except Exception as e:
         app.logger.error(f'Ошибка при загрузке данных для админки: {str(e)}')
         return jsonify({
@@ -0,0 +1,154 @@
+"""Замер времени и пикового потребления памяти при выгрузке участников в Excel.
+
+Запуск: python bench_export.py [число_строк ...]
+Прежние построители книг (выгрузка из админки, ручная и плановая резервные
+копии) сравниваются с общим write_workbook из app.py на тех же наборах столбцов.
+Каждый замер выполняется в отдельном процессе, пиковая память считается
+как прирост максимального RSS после генерации тестовых участников.
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import xlsxwriter
+
+DEFAULT_ROWS = [100000, 1000000]
+CITIES = ['махачкала', 'каспийск', 'тарки', 'москва']
+CASES = ['legacy-export', 'export', 'legacy-backup', 'backup', 'legacy-full-backup', 'full-backup']
+
+
+def make_participants(count):
+    """Тестовые участники в формате participants.json"""
+    random.seed(count)
+    participants = []
+    for i in range(1, count + 1):
+        participant = {
+            'ticket_number': i,
+            'full_name': f'Участник Тестовый {i}',
+            'phone': f'+7 999 {i:07d}',
+            'age': random.randint(18, 70),
+            'gender': random.choice(['male', 'female']),
+            'registration_time': f'2026-10-{i % 28 + 1:02d} {i % 24:02d}:{i % 60:02d}:00',
+            'ip_address': '1.2.3.4',
+            'location': {'city': random.choice(CITIES), 'region': 'дагестан', 'country': 'россия'}
+        }
+        if i % 3 == 0:
+            participant['coordinates'] = {'city': random.choice(CITIES), 'latitude': 42.98, 'longitude': 47.5}
+        participants.append(participant)
+    return participants
+
+
+def city_of(participant):
+    return (participant.get('coordinates') or {}).get('city') or (participant.get('location') or {}).get('city', '')
+
+
+def legacy_export(participants, output):
+    """Прежняя выгрузка из админки: строки целиком строками с общим форматом"""
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Участники')
+    cell_format = workbook.add_format({'border': 1})
+    for row, participant in enumerate(participants, start=1):
+        coordinates = participant.get('coordinates') or {}
+        location = participant.get('location') or {}
+        worksheet.write_row(row, 0, [
+            str(participant.get('full_name', '')), str(participant.get('ticket_number', '')),
+            str(participant.get('phone', '')), str(participant.get('age', '')),
+            'Мужской' if participant.get('gender') == 'male' else 'Женский',
+            city_of(participant).capitalize(),
+            location.get('region', '').capitalize(), location.get('country', '').capitalize(),
+            str(participant.get('registration_time', '')),
+            f"{coordinates['latitude']}, {coordinates['longitude']}" if 'latitude' in coordinates else '',
+            str(participant.get('ip_address', ''))
+        ], cell_format)
+    workbook.close()
+
+
+def legacy_backup(participants, output):
+    """Прежний create_excel_backup: запись по ячейкам с форматом"""
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    worksheet = workbook.add_worksheet('Участники')
+    cell_format = workbook.add_format({'border': 1})
+    for row, participant in enumerate(participants, start=1):
+        worksheet.write(row, 0, row, cell_format)
+        worksheet.write(row, 1, participant.get('ticket_number', ''), cell_format)
+        worksheet.write(row, 2, participant.get('full_name', ''), cell_format)
+        worksheet.write(row, 3, participant.get('phone', ''), cell_format)
+        worksheet.write(row, 4, participant.get('age', ''), cell_format)
+        worksheet.write(row, 5, 'Мужской' if participant.get('gender') == 'male' else 'Женский', cell_format)
+        worksheet.write(row, 6, city_of(participant), cell_format)
+        worksheet.write(row, 7, participant.get('registration_time', ''), cell_format)
+        worksheet.write(row, 8, participant.get('ip_address', ''), cell_format)
+    workbook.close()
+
+
+def legacy_full_backup(participants, output):
+    """Прежняя книга плановой копии из create_backup: вся книга в памяти, запись по ячейкам"""
+    workbook = xlsxwriter.Workbook(output)
+    worksheet = workbook.add_worksheet()
+    for row, participant in enumerate(participants, start=1):
+        coordinates = participant.get('coordinates') or {}
+        worksheet.write(row, 0, participant.get('ticket_number', ''))
+        worksheet.write(row, 1, participant.get('full_name', ''))
+        worksheet.write(row, 2, participant.get('phone', ''))
+        worksheet.write(row, 3, participant.get('age', ''))
+        worksheet.write(row, 4, 'Мужской' if participant.get('gender') == 'male' else 'Женский')
+        worksheet.write(row, 5, city_of(participant))
+        worksheet.write(row, 6, participant.get('registration_time', ''))
+        worksheet.write(row, 7, participant.get('ip_address', ''))
+        worksheet.write(row, 8, f"{coordinates.get('latitude', '')}, {coordinates.get('longitude', '')}" if coordinates else '')
+        worksheet.write(row, 9, 'Браузер' if coordinates.get('city') else 'IP')
+    workbook.close()
+
+
+def get_builder(case):
+    """Функция записи книги для варианта замера"""
+    if case.startswith('legacy-'):
+        return {'legacy-export': legacy_export, 'legacy-backup': legacy_backup,
+                'legacy-full-backup': legacy_full_backup}[case]
+    import app
+    columns = {'export': app.EXCEL_EXPORT_COLUMNS, 'backup': app.BACKUP_EXCEL_COLUMNS,
+               'full-backup': app.FULL_BACKUP_EXCEL_COLUMNS}[case]
+    return lambda participants, output: app.write_workbook(output, columns, participants)
+
+
+def max_rss_mb():
+    # ru_maxrss в Linux - килобайты
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_single(case, rows):
+    """Один замер в текущем процессе"""
+    participants = make_participants(rows)
+    build = get_builder(case)  # импорт приложения не должен попадать в замер
+    baseline = max_rss_mb()
+    with tempfile.TemporaryFile() as output:
+        started = time.perf_counter()
+        build(participants, output)
+        elapsed = time.perf_counter() - started
+        size = output.seek(0, os.SEEK_END)
+    print(f'{case:>18} {rows:>8} строк: {elapsed:6.1f} с, {rows / elapsed:7.0f} строк/с, '
+          f'файл {size / 1024 / 1024:5.1f} МБ, пик памяти +{max_rss_mb() - baseline:7.1f} МБ')
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--single':
+        run_single(sys.argv[2], int(sys.argv[3]))
+        return
+
+    rows_list = [int(arg) for arg in sys.argv[1:]] or DEFAULT_ROWS
+    for rows in rows_list:
+        for case in CASES:
+            result = subprocess.run([sys.executable, __file__, '--single', case, str(rows)],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f'{case:>18} {rows:>8} строк: ошибка (код {result.returncode})')
+            else:
+                print(result.stdout.strip())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Сборка статики: файлы с хэшем содержимого, варианты изображений и сжатые копии.
+
+Использование: python build_assets.py
+1. Каждый файл static/ копируется в static/dist/ с хэшем содержимого в имени
+   (custom.3f2a9c01d4.css), поэтому такие файлы браузер кэширует на год.
+   Для изображений пишутся уменьшенные копии по IMAGE_WIDTHS в исходном
+   формате и в WebP (нужен Pillow). Соответствие логических имен файлам
+   записывается в static/dist/manifest.json - по нему url_for('static', ...)
+   и static_image() в шаблонах находят собранные файлы.
+2. Рядом с каждым текстовым файлом static/ пишутся file.gz и file.br (если
+   установлен Brotli) с максимальной степенью сжатия. Время изменения варианта
+   совпадает с исходным файлом: по нему сервер проверяет, что вариант не устарел.
+   Вариант, который не меньше исходного файла, не создается.
+"""
+import hashlib
+import json
+import os
+import shutil
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_FILE = os.path.join(DIST_DIR, 'manifest.json')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico')
+# Вариант меньше исходного файла хотя бы на 5% - иначе выигрыш не стоит распаковки
+MIN_RATIO = 0.95
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Ширины уменьшенных копий изображений (не больше исходной ширины)
+IMAGE_WIDTHS = (320, 480, 640, 960, 1280)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def gzip_compress(data):
+    # wbits=31 - формат gzip; время в заголовке нулевое, поэтому результат воспроизводим
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=11)
+
+
+def get_encoders():
+    encoders = [('.gz', gzip_compress)]
+    if brotli is not None:
+        encoders.append(('.br', brotli_compress))
+    return encoders
+
+
+def build_file(path, encoders):
+    """Сжатые варианты одного файла; возвращает число записанных вариантов"""
+    stat = os.stat(path)
+    written = 0
+    data = None
+    for suffix, compress in encoders:
+        target = path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime_ns == stat.st_mtime_ns:
+            continue
+        if data is None:
+            with open(path, 'rb') as file:
+                data = file.read()
+        compressed = compress(data)
+        if len(compressed) >= len(data) * MIN_RATIO:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        temp_path = target + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(compressed)
+        os.utime(temp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp_path, target)
+        written += 1
+        print(f'{target}: {len(data)} -> {len(compressed)} байт ({len(compressed) / len(data):.0%})')
+    return written
+
+
+def compress_assets(directory):
+    encoders = get_encoders()
+    written = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                written += build_file(os.path.join(root, name), encoders)
+    return written
+
+
+def iter_source_files():
+    """Исходные файлы static/ (без собранных и сжатых) - пути относительно static/"""
+    for root, dirs, files in os.walk(STATIC_DIR):
+        if os.path.abspath(root) == STATIC_DIR and 'dist' in dirs:
+            dirs.remove('dist')
+        for name in sorted(files):
+            if not name.endswith(('.gz', '.br', '.tmp', '.txt')):
+                yield os.path.relpath(os.path.join(root, name), STATIC_DIR).replace(os.sep, '/')
+
+
+def get_digest(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()[:10]
+
+
+def get_dist_name(logical, digest, suffix='', extension=None):
+    """Имя собранного файла: images/car.png -> dist/images/car<suffix>.<digest>.png"""
+    stem, ext = os.path.splitext(logical)
+    return f'dist/{stem}{suffix}.{digest}{extension or ext}'
+
+
+def save_image(image, path, image_format):
+    """Запись изображения в WebP, JPEG или PNG с настройками для веба"""
+    temp_path = path + '.tmp'
+    if image_format == 'WEBP':
+        image.save(temp_path, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif image_format == 'JPEG':
+        image.convert('RGB').save(temp_path, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(temp_path, 'PNG', optimize=True)
+    os.replace(temp_path, path)
+
+
+def add_variant(entry, mimetype, name, width, image, image_format, max_size):
+    """Запись варианта изображения; вариант не меньше исходного файла не нужен и не добавляется"""
+    path = os.path.join(STATIC_DIR, name)
+    if not os.path.exists(path):
+        save_image(image, path, image_format)
+    if os.path.getsize(path) >= max_size:
+        os.remove(path)
+        return
+    entry['srcset'][mimetype].append([name, width])
+
+
+def build_image(logical, digest, entry):
+    """Уменьшенные копии изображения в исходном формате и в WebP для entry['srcset']"""
+    source_size = os.path.getsize(os.path.join(STATIC_DIR, logical))
+    with Image.open(os.path.join(STATIC_DIR, logical)) as image:
+        image.load()
+        # Расширение может не совпадать с содержимым (файл .png с JPEG внутри)
+        image_format = 'JPEG' if image.format == 'JPEG' else 'PNG'
+        mimetype = 'image/jpeg' if image_format == 'JPEG' else 'image/png'
+        extension = '.jpg' if image_format == 'JPEG' else '.png'
+        width, height = image.size
+        entry.update(width=width, height=height, srcset={'image/webp': [], mimetype: []})
+
+        for target_width in sorted({w for w in IMAGE_WIDTHS if w < width} | {width}):
+            resized = image
+            if target_width != width:
+                resized = image.resize((target_width, round(height * target_width / width)), Image.LANCZOS)
+
+            webp_name = get_dist_name(logical, digest, f'-{target_width}w', '.webp')
+            add_variant(entry, 'image/webp', webp_name, target_width, resized, 'WEBP', source_size)
+
+            if target_width == width:
+                # В исходной ширине отдается сам исходный файл, без повторного сжатия
+                entry['srcset'][mimetype].append([entry['file'], width])
+            else:
+                fallback_name = get_dist_name(logical, digest, f'-{target_width}w', extension)
+                add_variant(entry, mimetype, fallback_name, target_width, resized, image_format, source_size)
+
+
+def remove_unused(manifest):
+    """Удаление собранных файлов прежних версий статики"""
+    used = {MANIFEST_FILE}
+    for entry in manifest.values():
+        used.add(os.path.join(STATIC_DIR, entry['file']))
+        for variants in entry.get('srcset', {}).values():
+            used.update(os.path.join(STATIC_DIR, name) for name, _ in variants)
+    for root, _, files in os.walk(DIST_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if (path[:-3] if name.endswith(('.gz', '.br')) else path) not in used:
+                os.remove(path)
+
+
+def build_dist():
+    """Копии статики с хэшем содержимого в имени, варианты изображений и манифест"""
+    manifest = {}
+    for logical in iter_source_files():
+        source = os.path.join(STATIC_DIR, logical)
+        digest = get_digest(source)
+        entry = manifest[logical] = {'file': get_dist_name(logical, digest)}
+        target = os.path.join(STATIC_DIR, entry['file'])
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source, target + '.tmp')
+            os.replace(target + '.tmp', target)
+        if Image is not None and logical.lower().endswith(IMAGE_EXTENSIONS):
+            build_image(logical, digest, entry)
+
+    remove_unused(manifest)
+    # Манифест подменяется атомарно: работающие процессы перечитывают его по времени изменения
+    with open(MANIFEST_FILE + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(MANIFEST_FILE + '.tmp', MANIFEST_FILE)
+    return manifest
+
+
+def main():
+    if Image is None:
+        print('Pillow не установлен, уменьшенные копии изображений и WebP не создаются')
+    if brotli is None:
+        print('Brotli не установлен, создаются только варианты .gz')
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = build_dist()
+    print(f'Файлов в манифесте: {len(manifest)}')
+    for logical, entry in manifest.items():
+        for mimetype, variants in entry.get('srcset', {}).items():
+            sizes = ', '.join(f'{width}w - {os.path.getsize(os.path.join(STATIC_DIR, name)) // 1024} КБ'
+                              for name, width in variants)
+            print(f'  {logical} {mimetype}: {sizes}')
+    print(f'Записано сжатых вариантов: {compress_assets(STATIC_DIR)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Восстановление участников из резервных копий на Яндекс.Диске.
+
+Использование:
+    python restore.py catalog                    - обновить и показать каталог копий
+    python restore.py plan [--at ВРЕМЯ]          - файлы, из которых будут восстановлены данные
+    python restore.py restore [--at ВРЕМЯ] [--yes]
+ВРЕМЯ - "ГГГГ-ММ-ДД ЧЧ:ММ:СС"; без --at восстанавливается последняя копия.
+Работающие процессы сервера подхватывают восстановленные данные по журналу изменений.
+"""
+import argparse
+import sys
+
+from app import get_backup_catalog, load_settings, parse_timeseries_time, refresh_backup_catalog, restore_backup
+
+
+def print_entries(entries):
+    for entry in entries:
+        chain = f"rev {entry['revision']}" if entry['revision'] is not None else ''
+        size = f"{entry['size'] / 1024 / 1024:.1f} МБ" if entry['size'] else ''
+        print(f"{entry['created_at']}  {entry['source']:>9}  {entry['type']:>5}  {size:>9}  {chain:>10}  {entry['path']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Восстановление участников из резервных копий')
+    parser.add_argument('command', choices=['catalog', 'plan', 'restore'])
+    parser.add_argument('--at', help='момент, на который восстанавливаются данные')
+    parser.add_argument('--yes', action='store_true', help='не спрашивать подтверждение')
+    args = parser.parse_args()
+
+    at = None
+    if args.at:
+        at_time = parse_timeseries_time(args.at)
+        if at_time is None:
+            parser.error('некорректное время --at')
+        at = at_time.strftime('%Y-%m-%d %H:%M:%S')
+
+    if args.command == 'catalog':
+        token = load_settings().get('backup_settings', {}).get('yandex_token')
+        if not token:
+            sys.exit('Не найден токен Яндекс.Диска')
+        print(f'Файлов копий в каталоге: {refresh_backup_catalog(token)}')
+        print_entries(get_backup_catalog())
+        return
+
+    try:
+        result = restore_backup(at, dry_run=True)
+    except (LookupError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(f"План восстановления на {at or 'текущий момент'}:")
+    print_entries(result['plan'])
+    if args.command == 'plan':
+        return
+
+    if not args.yes and input('Заменить текущих участников восстановленными? [y/N] ').strip().lower() != 'y':
+        return
+    result = restore_backup(at, refresh=False)
+    print(f"Восстановлено участников: {result['participants']}, ревизия {result['revision']}, "
+          f"скачано {result['bytes'] / 1024 / 1024:.1f} МБ")
+    for stage, seconds in result['timings'].items():
+        print(f'  {stage:>8}: {seconds:.3f} с')
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,12 @@
 
 import os
 import threading
-from app import app, run_scheduler, init_backup_settings, start_backup_scheduler
+from app import app, run_scheduler, init_backup_settings, start_backup_scheduler, start_warmup
 
 if __name__ == "__main__":
     # Инициализация настроек резервного копирования
     init_backup_settings()
+    start_warmup()
     
     # Запуск планировщика резервного копирования в отдельном потоке
     start_backup_scheduler()
@@ -0,0 +1,110 @@
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Пути данных задаются до импорта app: модуль читает их при загрузке
+TEST_ROOT = tempfile.mkdtemp(prefix='porsche-tests-')
+os.environ.setdefault('DATA_DIR', os.path.join(TEST_ROOT, 'data'))
+os.environ.setdefault('SETTINGS_FILE', os.path.join(TEST_ROOT, 'settings.json'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+def make_participant(ticket, **fields):
+    participant = {
+        'ticket_number': ticket,
+        'full_name': f'Участник {ticket}',
+        'phone': f'7999{ticket:07d}',
+        'age': 18 + ticket % 50,
+        'gender': 'male' if ticket % 2 else 'female',
+        'registration_time': f'2026-01-{1 + ticket % 28:02d} {ticket % 24:02d}:00:00',
+        'location': {'city': 'махачкала' if ticket % 3 else 'каспийск', 'region': 'Дагестан', 'country': 'Россия'}
+    }
+    participant.update(fields)
+    return participant
+
+
+def close_state_db():
+    conn = getattr(app_module.state_db_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        app_module.state_db_local.conn = None
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Приложение с пустым каталогом данных и настройками без токена Яндекс.Диска"""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    settings_file = tmp_path / 'settings.json'
+    settings_file.write_text(json.dumps({
+        'whatsapp_link': 'https://chat.whatsapp.com/test',
+        'backup_settings': {'enabled': False, 'yandex_token': '', 'interval': 'daily'}
+    }), encoding='utf-8')
+    
+    close_state_db()
+    participants_file = str(data_dir / 'participants.json')
+    monkeypatch.setattr(app_module, 'DATA_DIR', str(data_dir))
+    monkeypatch.setattr(app_module, 'PARTICIPANTS_FILE', participants_file)
+    monkeypatch.setattr(app_module, 'PARTICIPANTS_META_FILE', str(data_dir / 'participants.meta.json'))
+    monkeypatch.setattr(app_module, 'STATE_DB', str(data_dir / 'state.db'))
+    monkeypatch.setattr(app_module, 'EXPORT_CACHE_DIR', str(data_dir / 'exports'))
+    monkeypatch.setattr(app_module, 'RESTORE_DIR', str(data_dir / 'restore'))
+    monkeypatch.setattr(app_module, 'SETTINGS_FILE', str(settings_file))
+    monkeypatch.setattr(app_module, 'PARTICIPANTS_CACHE', None)
+    app_module.settings_cache.update(data=None, version=0, stat=None)
+    app_module.admin_response_cache.clear()
+    app_module.page_cache.clear()
+    app_module.store_sync_state['dirty_since'] = None
+    app_module.reset_participants_state([], 0)
+    app_module.rebuild_participants_index([])
+    
+    # Сеть в тестах недоступна: обращение к Яндекс.Диску - ошибка теста
+    def no_network(*args, **kwargs):
+        raise AssertionError('Обращение к сети в тесте')
+    monkeypatch.setattr(app_module.requests, 'get', no_network)
+    monkeypatch.setattr(app_module.requests, 'put', no_network)
+    
+    # Задания выгрузки выполняются в потоках этого процесса: процессы пула
+    # (spawn) не видят путей, подмененных для теста
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setitem(app_module.export_jobs, 'executor', executor)
+    monkeypatch.setitem(app_module.export_jobs, 'partition_executor', executor)
+    monkeypatch.setitem(app_module.export_jobs, 'futures', {})
+    
+    app_module.app.config['TESTING'] = True
+    yield app_module
+    executor.shutdown(wait=True)
+    close_state_db()
+
+
+@pytest.fixture
+def client(app):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['admin'] = True
+    return client
+
+
+@pytest.fixture
+def seed(app):
+    """Запись участников в файл данных до первой загрузки кэша"""
+    def seed(count):
+        participants = [make_participant(ticket) for ticket in range(1, count + 1)]
+        with open(app.PARTICIPANTS_FILE, 'w', encoding='utf-8') as file:
+            json.dump(participants, file, ensure_ascii=False)
+        return participants
+    return seed
+
+
+def reload_cold(app):
+    """Холодная загрузка, как в новом процессе: кэш сброшен, файлы и журнал те же"""
+    app.PARTICIPANTS_CACHE = None
+    app.reset_participants_state([], 0)
+    app.rebuild_participants_index([])
+    return app.load_participants()
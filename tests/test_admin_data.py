@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def token(app):
+    app.update_settings(lambda settings: settings['backup_settings'].update(yandex_token='test-token'))
+
+
+def test_admin_data_does_not_call_yandex(app, seed, client, token):
+    seed(12)
+    # Сеть в тестах запрещена: обращение к Диску из build() дало бы 500
+    response = client.get('/admin-data?per_page=5')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [p['ticket_number'] for p in body['participants']] == [1, 2, 3, 4, 5]
+    assert body['pagination']['next_cursor'] == '5'
+    assert body['statistics']['total'] == 12
+
+
+def test_admin_data_etag_and_revision(app, seed, client, token):
+    seed(6)
+    response = client.get('/admin-data?per_page=2&cursor=2')
+    etag = response.headers['ETag']
+    assert [p['ticket_number'] for p in response.get_json()['participants']] == [3, 4]
+    
+    cached = client.get('/admin-data?per_page=2&cursor=2', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    
+    # Новая ревизия данных меняет ETag
+    app.record_deletions([4])
+    fresh = client.get('/admin-data?per_page=2&cursor=2', headers={'If-None-Match': etag})
+    assert fresh.status_code == 200
+    assert fresh.headers['ETag'] != etag
+    assert [p['ticket_number'] for p in fresh.get_json()['participants']] == [3, 5]
+
+
+def test_admin_data_requires_admin(app, seed, token):
+    seed(1)
+    response = app.app.test_client().get('/admin-data')
+    assert response.status_code in (302, 401, 403)
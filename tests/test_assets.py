@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+
+MANIFEST = {
+    'custom.css': {'file': 'dist/custom.0123456789.css'},
+    'images/logo.png': {
+        'file': 'dist/images/logo.abcdef0123.png',
+        'width': 640,
+        'height': 320,
+        'srcset': {
+            'image/png': [['dist/images/logo-320w.abcdef0123.png', 320], ['dist/images/logo.abcdef0123.png', 640]],
+            'image/webp': [['dist/images/logo-320w.abcdef0123.webp', 320]]
+        }
+    }
+}
+
+
+@pytest.fixture
+def assets(app, tmp_path, monkeypatch):
+    """Каталог статики со сборкой build_assets.py: исходные файлы, файлы с хэшем и манифест"""
+    static = tmp_path / 'static'
+    (static / 'dist' / 'images').mkdir(parents=True)
+    (static / 'images').mkdir()
+    (static / 'custom.css').write_text('body { color: red; }')
+    (static / 'images' / 'logo.png').write_bytes(b'png')
+    (static / 'dist' / 'custom.0123456789.css').write_text('body { color: red; }')
+    (static / 'dist' / 'images' / 'logo.abcdef0123.png').write_bytes(b'png')
+    manifest = static / 'dist' / 'manifest.json'
+    manifest.write_text(json.dumps(MANIFEST))
+    monkeypatch.setattr(app.app, 'static_folder', str(static))
+    monkeypatch.setattr(app, 'ASSET_MANIFEST_FILE', str(manifest))
+    monkeypatch.setattr(app, 'asset_manifest', {'data': {}, 'mtime': None})
+    return manifest
+
+
+def test_static_image_uses_manifest(app, assets):
+    with app.app.test_request_context():
+        image = app.static_image('images/logo.png')
+        assert app.url_for('static', filename='custom.css') == '/static/dist/custom.0123456789.css'
+    assert image == {
+        'src': '/static/dist/images/logo.abcdef0123.png',
+        'webp': '/static/dist/images/logo-320w.abcdef0123.webp 320w',
+        'srcset': '/static/dist/images/logo-320w.abcdef0123.png 320w, /static/dist/images/logo.abcdef0123.png 640w',
+        'width': 640,
+        'height': 320
+    }
+
+
+def test_missing_manifest_falls_back_to_source_files(app, assets):
+    with app.app.test_request_context():
+        assert app.static_image('images/logo.png')['src'] == '/static/dist/images/logo.abcdef0123.png'
+        os.remove(assets)
+        image = app.static_image('images/logo.png')
+        assert app.url_for('static', filename='custom.css') == '/static/custom.css'
+    assert image == {'src': '/static/images/logo.png', 'webp': '', 'srcset': '', 'width': None, 'height': None}
+
+
+def test_rebuilt_manifest_is_reread(app, assets):
+    with app.app.test_request_context():
+        assert app.url_for('static', filename='custom.css') == '/static/dist/custom.0123456789.css'
+        assets.write_text(json.dumps({'custom.css': {'file': 'dist/custom.9876543210.css'}}))
+        os.utime(assets, ns=(1, 1))
+        assert app.url_for('static', filename='custom.css') == '/static/dist/custom.9876543210.css'
+
+
+@pytest.mark.parametrize('path, cache_control', [
+    ('/static/dist/custom.0123456789.css', 'public, max-age=31536000, immutable'),
+    ('/static/dist/images/logo.abcdef0123.png', 'public, max-age=31536000, immutable'),
+    ('/static/dist/manifest.json', 'public, no-cache'),
+    ('/static/custom.css', 'public, no-cache'),
+    ('/static/images/logo.png', 'public, no-cache')
+])
+def test_only_hashed_files_are_immutable(app, assets, path, cache_control):
+    response = app.app.test_client().get(path)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == cache_control
+    response.close()
+
+
+def test_missing_static_file_is_not_cached(app, assets):
+    response = app.app.test_client().get('/static/dist/missing.0123456789.css')
+    assert response.status_code == 404
+    assert response.headers['Cache-Control'] == 'no-cache'
@@ -0,0 +1,104 @@
+import re
+
+import pytest
+
+
+def run_backup(app, trigger='schedule', result=True, **fields):
+    def backup():
+        app.record_backup_timing('json', 0.25)
+        app.record_backup_timing('json', 0.25)
+        app.note_backup_run(**fields)
+        app.note_backup_run(bytes=5)
+        return result
+    return app.track_backup_run(trigger, backup)
+
+
+def test_run_is_recorded_with_timings_and_bytes(app):
+    assert run_backup(app, type='full', revision=7, records=3, bytes=10)
+    run = app.get_backup_runs(1)[0]
+    assert run['trigger'] == 'schedule' and run['outcome'] == 'success'
+    assert (run['type'], run['revision'], run['records'], run['bytes']) == ('full', 7, 3, 15)
+    assert run['timings']['json'] == 0.5
+    assert run['timings']['total'] >= 0 and run['duration'] >= 0
+    # Вне копии сведения никуда не пишутся
+    app.note_backup_run(bytes=100)
+    app.record_backup_timing('json', 1)
+    assert app.get_backup_runs(1)[0]['bytes'] == 15
+
+
+def test_failed_and_skipped_outcomes(app):
+    assert not run_backup(app, result=False)
+    assert not run_backup(app, trigger='registration', result=False, outcome='skipped')
+
+    def broken():
+        app.note_backup_run(error='первая ошибка')
+        raise RuntimeError('вторая ошибка')
+    with pytest.raises(RuntimeError):
+        app.track_backup_run('admin', broken)
+
+    runs = app.get_backup_runs()
+    assert [(run['trigger'], run['outcome']) for run in runs] == [
+        ('admin', 'failed'), ('registration', 'skipped'), ('schedule', 'failed')]
+    assert runs[0]['error'] == 'первая ошибка'
+
+
+def test_history_is_paged_newest_first(app, client):
+    for _ in range(5):
+        run_backup(app, type='delta')
+    first = client.get('/admin/backups/history?limit=2').get_json()
+    ids = [run['id'] for run in first['runs']]
+    assert ids == [5, 4] and first['next_before'] == 4
+    second = client.get(f"/admin/backups/history?limit=2&before={first['next_before']}").get_json()
+    assert [run['id'] for run in second['runs']] == [3, 2]
+    last = client.get(f"/admin/backups/history?limit=2&before={second['next_before']}").get_json()
+    assert [run['id'] for run in last['runs']] == [1]
+    assert last['next_before'] is None
+    assert first['summary']
+
+
+def test_history_retention(app, monkeypatch):
+    monkeypatch.setattr(app, 'BACKUP_RUNS_RETENTION', 3)
+    for _ in range(5):
+        run_backup(app)
+    assert [run['id'] for run in app.get_backup_runs()] == [5, 4, 3]
+
+
+@pytest.mark.parametrize('query', ['limit=abc', 'before=x'])
+def test_history_rejects_bad_paging(app, client, query):
+    assert client.get('/admin/backups/history?' + query).status_code == 400
+
+
+SAMPLE = re.compile(r'^[a-z_]+(\{([a-z_]+="[^"]*",?)+\})? -?[0-9.e+-]+$')
+
+
+def test_metrics_are_prometheus_text(app, client):
+    run_backup(app, type='full', records=3, bytes=10)
+    run_backup(app, type='delta', records=1, bytes=1)
+    run_backup(app, result=False)
+    response = client.get('/admin/backups/metrics')
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+
+    declared = set()
+    for line in lines:
+        if line.startswith('# HELP '):
+            declared.add(line.split()[2])
+        elif line.startswith('# TYPE '):
+            assert line.split()[2] in declared and line.split()[3] in ('gauge', 'counter')
+        else:
+            assert SAMPLE.match(line), line
+            assert line.split('{')[0].split()[0] in declared
+    assert 'backup_runs{trigger="schedule",outcome="success"} 2' in lines
+    assert 'backup_runs{trigger="schedule",outcome="failed"} 1' in lines
+    assert 'backup_last_bytes{type="full"} 15' in lines
+    assert 'backup_last_records{type="delta"} 1' in lines
+    assert 'backup_last_stage_seconds{type="full",stage="json"} 0.5' in lines
+
+
+def test_metrics_access(app, monkeypatch):
+    anonymous = app.app.test_client()
+    assert anonymous.get('/admin/backups/metrics').status_code == 403
+    assert anonymous.get('/admin/backups/history').status_code == 403
+    monkeypatch.setattr(app, 'METRICS_TOKEN', 'secret')
+    assert anonymous.get('/admin/backups/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert anonymous.get('/admin/backups/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
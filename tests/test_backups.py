@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from conftest import make_participant
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+        self.text = ''
+    
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def disk(app, monkeypatch):
+    """Яндекс.Диск в памяти: выгрузки записываются по путям"""
+    files = {}
+    
+    def get(url, headers=None, params=None, **kwargs):
+        if url.endswith('/resources/upload'):
+            return FakeResponse(200, {'href': 'upload:' + params['path']})
+        if url.endswith('/resources/download'):
+            return FakeResponse(404)
+        return FakeResponse(200, {})
+    
+    def put(url, data=None, **kwargs):
+        if url.startswith('upload:'):
+            if hasattr(data, 'read'):
+                data.seek(0)
+                data = data.read()
+            files[url[len('upload:'):]] = data
+        return FakeResponse(201)
+    
+    monkeypatch.setattr(app.requests, 'get', get)
+    monkeypatch.setattr(app.requests, 'put', put)
+    app.update_settings(lambda settings: settings['backup_settings'].update(yandex_token='test-token'))
+    return files
+
+
+@pytest.fixture
+def last_backup_writes(app, monkeypatch):
+    writes = []
+    original = app.set_last_backup
+    monkeypatch.setattr(app, 'set_last_backup', lambda backup_time: writes.append(backup_time) or original(backup_time))
+    return writes
+
+
+def backup_uploads(files):
+    return sorted(path for path in files if path.startswith('app:/backups/2'))
+
+
+def test_last_backup_is_written_once_per_run(app, seed, disk, last_backup_writes):
+    seed(5)
+    assert app.create_backup('schedule')
+    assert len(last_backup_writes) == 1
+    assert app.load_settings()['backup_settings']['last_backup'] is not None
+
+
+def test_unchanged_content_is_skipped_even_with_new_revision(app, seed, disk):
+    seed(5)
+    assert app.create_backup('schedule')
+    uploaded = backup_uploads(disk)
+    assert len(uploaded) == 2
+    
+    # Регистрация и удаление того же участника: ревизия выросла, содержимое прежнее
+    app.record_change('added', 6, make_participant(6))
+    app.record_deletions([6])
+    assert app.create_backup('schedule')
+    assert backup_uploads(disk) == uploaded
+    runs = app.get_backup_runs(2)
+    assert [run['outcome'] for run in runs] == ['skipped', 'success']
+
+
+def test_changed_content_uploads_delta_with_content_hash(app, seed, disk):
+    seed(5)
+    assert app.create_backup('schedule')
+    app.record_deletions([3])
+    disk.clear()
+    assert app.create_backup('schedule')
+    
+    assert [path for path in disk if path.endswith('.delta.json')]
+    manifest = json.loads(disk[app.BACKUP_MANIFEST_PATH])
+    full, delta = manifest['chains'][-1]['full'], manifest['chains'][-1]['deltas'][-1]
+    assert full['content_sha256'] != delta['content_sha256']
+    assert delta['content_sha256'] == app.get_participants_digest()
+
+
+def test_participants_digest_ignores_order(app, seed):
+    participants = seed(4)
+    app.load_participants()
+    digest = app.get_participants_digest()
+    app.rebuild_participants_index(list(reversed(participants)))
+    assert app.get_participants_digest() == digest
@@ -0,0 +1,96 @@
+import gzip
+import os
+import zlib
+
+import brotli
+import pytest
+
+from conftest import make_participant
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('gzip, deflate, br', 'br'),
+    ('gzip;q=1, br;q=0.5', 'gzip'),
+    ('br;q=0, gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('identity', None),
+    (None, None)
+])
+def test_choose_encoding(app, accept, expected):
+    assert app.choose_encoding(accept) == expected
+
+
+def test_choose_encoding_without_brotli(app, monkeypatch):
+    monkeypatch.setattr(app, 'brotli', None)
+    assert app.choose_encoding('br, gzip') == 'gzip'
+
+
+def test_json_response_is_compressed_with_weak_etag(app, client):
+    app.load_participants()
+    for ticket in range(1, 21):
+        app.record_change('added', ticket, make_participant(ticket))
+    plain = client.get('/check-data-updates?since=0', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert 'Accept-Encoding' in plain.headers['Vary']
+    
+    compressed = client.get('/check-data-updates?since=0', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] == 'W/' + plain.headers['ETag']
+    
+    preferred = client.get('/check-data-updates?since=0', headers={'Accept-Encoding': 'gzip, br'})
+    assert preferred.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(preferred.data) == plain.data
+    
+    # Слабый ETag сжатого ответа подходит для If-None-Match
+    revalidated = client.get('/check-data-updates?since=0', headers={
+        'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_small_responses_are_not_compressed(app, client):
+    response = client.get('/healthz', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streaming_export_is_not_recompressed(app, seed, client):
+    seed(20)
+    app.load_participants()
+    response = client.get('/export?format=jsonl', headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.count(b'\n') == 20
+    
+    # Выгрузка со сжатием сжимается один раз, самим обработчиком
+    response = client.get('/export?format=jsonl&gzip=1', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).count(b'\n') == 20
+
+
+def test_static_precompressed_variants(app, client, tmp_path, monkeypatch):
+    static = tmp_path / 'static'
+    static.mkdir()
+    source = static / 'app.js'
+    source.write_bytes(b'console.log(1);\n' * 200)
+    compressed = zlib.compressobj(9, zlib.DEFLATED, 31)
+    gz = static / 'app.js.gz'
+    gz.write_bytes(compressed.compress(source.read_bytes()) + compressed.flush())
+    stat = os.stat(source)
+    os.utime(gz, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    monkeypatch.setattr(app.app, 'static_folder', str(static))
+    
+    response = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype in ('text/javascript', 'application/javascript')
+    assert gzip.decompress(response.data) == source.read_bytes()
+    response.close()
+    
+    plain = client.get('/static/app.js', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == source.read_bytes()
+    plain.close()
+    
+    # Устаревший вариант (время изменения не совпадает) не отдается
+    os.utime(gz, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10 ** 9))
+    stale = client.get('/static/app.js', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in stale.headers
+    stale.close()
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from conftest import make_participant, reload_cold
+
+
+def read_store(app):
+    with open(app.PARTICIPANTS_FILE, encoding='utf-8') as file:
+        return sorted(p['ticket_number'] for p in json.load(file))
+
+
+@pytest.fixture
+def deferred_sync(app, monkeypatch):
+    """Планировщик запущен: запись хранилища откладывается, а не выполняется сразу"""
+    scheduled = []
+    monkeypatch.setitem(app.scheduler_state, 'running', True)
+    monkeypatch.setattr(app, 'schedule_job', lambda name, deadline, func: scheduled.append(name))
+    return scheduled
+
+
+def test_delete_survives_force_reload(app, seed, client, deferred_sync):
+    seed(5)
+    app.load_participants()
+    response = client.post('/admin/participants/2/delete')
+    assert response.get_json() == {'success': True, 'deleted': 1}
+    assert deferred_sync == ['store-sync']
+    assert read_store(app) == [1, 2, 3, 4, 5]
+    
+    # Принудительная перезагрузка сначала записывает отложенное удаление
+    assert 2 not in {p['ticket_number'] for p in app.load_participants(force_reload=True)}
+    assert read_store(app) == [1, 3, 4, 5]
+    assert app.store_sync_state['dirty_since'] is None
+
+
+def test_delete_survives_cold_load_before_store_sync(app, seed, client, deferred_sync):
+    seed(5)
+    app.load_participants()
+    assert client.post('/admin/participants/delete', json={'tickets': [1, 4]}).get_json()['deleted'] == 2
+    
+    # Новый процесс видит устаревший файл, но применяет удаления из журнала
+    assert [p['ticket_number'] for p in reload_cold(app)] == [2, 3, 5]
+    app.run_store_sync()
+    assert read_store(app) == [2, 3, 5]
+    assert [p['ticket_number'] for p in reload_cold(app)] == [2, 3, 5]
+
+
+def test_failed_store_sync_keeps_delete(app, seed, client, monkeypatch):
+    seed(4)
+    app.load_participants()
+    app.sync_participants_store()
+    monkeypatch.setattr(app, 'sync_participants_store', lambda: False)
+    monkeypatch.setitem(app.scheduler_state, 'running', False)
+    assert client.post('/admin/participants/3/delete').status_code == 200
+    assert app.store_sync_state['dirty_since'] is not None
+    
+    assert read_store(app) == [1, 2, 3, 4]
+    assert [p['ticket_number'] for p in reload_cold(app)] == [1, 2, 4]
+
+
+def test_force_reload_keeps_cache_when_snapshot_revision_unknown(app, seed, client):
+    seed(3)
+    app.load_participants()
+    assert client.post('/admin/participants/1/delete').status_code == 200
+    # Файл подменен снимком без сведений о ревизии
+    seed(3)
+    
+    assert [p['ticket_number'] for p in app.load_participants(force_reload=True)] == [2, 3]
+
+
+def test_readded_ticket_after_delete(app, seed, client):
+    seed(3)
+    app.load_participants()
+    assert client.post('/admin/participants/2/delete').status_code == 200
+    app.record_change('added', 2, make_participant(2, full_name='Новый'))
+    
+    participants = reload_cold(app)
+    assert [p['full_name'] for p in participants if p['ticket_number'] == 2] == ['Новый']
+    assert client.post('/admin/participants/2/delete').status_code == 200
+    assert client.post('/admin/participants/2/delete').status_code == 404
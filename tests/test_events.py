@@ -0,0 +1,59 @@
+import pytest
+
+
+@pytest.fixture
+def short_streams(app, monkeypatch):
+    """Поток событий закрывается сразу после отправки накопленных событий"""
+    monkeypatch.setattr(app, 'EVENTS_STREAM_DURATION', 0.05)
+    monkeypatch.setattr(app, 'EVENTS_POLL_INTERVAL', 0.01)
+    monkeypatch.setitem(app.events_streams, 'active', 0)
+
+
+def read_events(response):
+    """Пары (id, событие) из тела потока"""
+    events = []
+    for message in response.get_data(as_text=True).split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.splitlines() if ': ' in line and not line.startswith(':'))
+        if 'event' in fields:
+            events.append((int(fields['id']), fields['event']))
+    return events
+
+
+def test_events_require_admin(app):
+    assert app.app.test_client().get('/admin/events').status_code == 403
+
+
+def test_stream_resumes_after_last_event_id(app, client, short_streams):
+    ids = [app.publish_event('stats', {'total': 1}) for _ in range(3)]
+    response = client.get('/admin/events', headers={'Last-Event-ID': str(ids[0])})
+    assert response.mimetype == 'text/event-stream'
+    assert read_events(response) == [(ids[1], 'stats'), (ids[2], 'stats')]
+    
+    response = client.get(f'/admin/events?last_event_id={ids[2]}')
+    assert read_events(response) == []
+
+
+def test_stream_sends_reset_when_journal_was_pruned(app, client, short_streams):
+    ids = [app.publish_event('stats', {'total': 1}) for _ in range(5)]
+    app.get_state_db().execute('DELETE FROM events WHERE id <= ?', (ids[2],))
+    response = client.get('/admin/events', headers={'Last-Event-ID': str(ids[0])})
+    assert read_events(response) == [(ids[4], 'reset')]
+
+
+def test_streams_over_limit_get_503(app, client, short_streams, monkeypatch):
+    monkeypatch.setattr(app, 'EVENTS_MAX_STREAMS', 1)
+    first = client.get('/admin/events', buffered=False)
+    assert first.status_code == 200
+    
+    busy = client.get('/admin/events')
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == str(app.EVENTS_RETRY_AFTER)
+    assert busy.get_data(as_text=True) == f'retry: {app.EVENTS_RETRY_AFTER * 1000}\n\n'
+    
+    # Закрытое соединение освобождает место
+    first.close()
+    assert app.events_streams['active'] == 0
+    with client.get('/admin/events') as again:
+        assert again.status_code == 200
+        assert app.events_streams['active'] == 1
+    assert app.events_streams['active'] == 0
@@ -0,0 +1,40 @@
+import io
+import re
+import zipfile
+
+from conftest import make_participant
+
+
+def read_sheet(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+
+
+def test_formats_are_set_on_cells_not_columns(app):
+    participants = [make_participant(ticket) for ticket in range(1, 4)]
+    output = io.BytesIO()
+    assert app.write_workbook(output, app.BACKUP_EXCEL_COLUMNS, participants) == 3
+    sheet = read_sheet(output.getvalue())
+    
+    # Столбцы без стиля: пустые строки листа остаются без границ
+    cols = re.findall(r'<col [^>]*/>', sheet)
+    assert cols and not any('style=' in col for col in cols)
+    rows = re.findall(r'<row r="(\d+)"', sheet)
+    assert rows == ['1', '2', '3', '4']
+    # Все ячейки данных с форматом (границы), в том числе пустые
+    data_cells = re.findall(r'<c r="[A-Z]+[2-4]"([^>]*)', sheet)
+    assert len(data_cells) == 3 * len(app.BACKUP_EXCEL_COLUMNS)
+    assert all(' s="' in attributes for attributes in data_cells)
+
+
+def test_datetime_column_keeps_number_format(app):
+    columns = [
+        {'header': 'Номер', 'width': 10, 'type': 'number', 'value': lambda p: p['ticket_number']},
+        {'header': 'Время', 'width': 20, 'type': 'datetime', 'value': lambda p: p['registration_time']},
+        {'header': 'ФИО', 'width': 20, 'type': 'string', 'value': lambda p: p['full_name']}
+    ]
+    output = io.BytesIO()
+    app.write_workbook(output, columns, [make_participant(1)])
+    sheet = read_sheet(output.getvalue())
+    styles = dict(re.findall(r'<c r="([A-C]2)"[^>]* s="(\d+)"', sheet))
+    assert styles['A2'] == styles['C2'] != styles['B2']
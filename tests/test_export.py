@@ -0,0 +1,105 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from conftest import make_participant
+
+
+def export(client, query, **headers):
+    response = client.get('/export?' + query, headers=headers)
+    assert response.status_code == 200
+    return response
+
+
+def read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode('utf-8'))))
+
+
+@pytest.fixture
+def participants(app, seed):
+    participants = seed(40)
+    # Имя с переводом строки и запятой - запись CSV на нескольких строках
+    participants[4]['full_name'] = 'Иван\nПетров, мл.'
+    with open(app.PARTICIPANTS_FILE, 'w', encoding='utf-8') as file:
+        json.dump(participants, file, ensure_ascii=False)
+    app.load_participants()
+    return participants
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'jsonl'])
+def test_gzip_is_opt_in(app, participants, client, export_format):
+    plain = export(client, f'format={export_format}', **{'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data
+    # Повторная выгрузка отдается из кэша с известной длиной
+    cached = export(client, f'format={export_format}', **{'Accept-Encoding': 'gzip'})
+    assert int(cached.headers['Content-Length']) == len(plain.data) == len(cached.data)
+    
+    compressed = export(client, f'format={export_format}&gzip=1', **{'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    
+    # Клиент без gzip получает несжатые данные и с gzip=1
+    identity = export(client, f'format={export_format}&gzip=1', **{'Accept-Encoding': 'identity'})
+    assert identity.data == plain.data
+
+
+@pytest.mark.parametrize('export_format', ['csv', 'jsonl'])
+@pytest.mark.parametrize('cached', [True, False])
+def test_resume_continues_after_cursor(app, participants, client, export_format, cached):
+    full = export(client, f'format={export_format}').data
+    if not cached:
+        app.get_state_db().execute('DELETE FROM export_artifacts')
+    
+    resumed = export(client, f'format={export_format}&cursor=5').data
+    if export_format == 'csv':
+        rows = read_csv(full)
+        assert read_csv(resumed) == rows[6:]
+        # Начало до курсора и продолжение дают полный файл
+        head = read_csv(export(client, 'format=csv').data)[:6]
+        assert head + read_csv(resumed) == rows
+    else:
+        lines = full.decode('utf-8').splitlines()
+        assert resumed.decode('utf-8').splitlines() == lines[5:]
+
+
+def test_resume_uses_artifact_cache(app, participants, client, monkeypatch):
+    assert export(client, 'format=jsonl').data
+    monkeypatch.setattr(app, 'generate_export', lambda *args, **kwargs: pytest.fail('выгрузка собрана заново'))
+    resumed = export(client, 'format=jsonl&cursor=38&gzip=1', **{'Accept-Encoding': 'gzip'})
+    tickets = [json.loads(line)['ticket_number'] for line in gzip.decompress(resumed.data).decode('utf-8').splitlines()]
+    assert tickets == [39, 40]
+
+
+def test_resume_with_filters(app, participants, client):
+    query = 'format=jsonl&gender=female&age_from=30'
+    expected = [p['ticket_number'] for p in participants if p['gender'] == 'female' and p['age'] >= 30]
+    full = [json.loads(line)['ticket_number'] for line in export(client, query).data.decode('utf-8').splitlines()]
+    assert full == expected
+    
+    cursor = expected[2]
+    resumed = export(client, f'{query}&cursor={cursor}').data.decode('utf-8').splitlines()
+    assert [json.loads(line)['ticket_number'] for line in resumed] == expected[3:]
+    # Курсор после последнего участника - пустое продолжение
+    assert export(client, f'{query}&cursor={expected[-1]}').data == b''
+
+
+def test_cached_export_is_appended_after_registrations(app, participants, client):
+    first = export(client, 'format=csv').data
+    app.record_change('added', 41, make_participant(41))
+    second = export(client, 'format=csv').data
+    assert second.startswith(first)
+    assert read_csv(second)[-1][0] == '41'
+    
+    # После удаления файл собирается заново, без удаленного участника
+    app.record_deletions([2])
+    third = read_csv(export(client, 'format=csv').data)
+    assert '2' not in [row[0] for row in third[1:]]
+
+
+def test_invalid_cursor_and_format(app, participants, client):
+    assert client.get('/export?format=csv&cursor=abc').status_code == 400
+    assert client.get('/export?format=xml').status_code == 400
@@ -0,0 +1,93 @@
+import os
+import zipfile
+
+import pytest
+
+from conftest import make_participant
+
+
+@pytest.fixture
+def builds(app, monkeypatch):
+    """Счетчик полных сборок файлов выгрузки по виду"""
+    counts = {}
+    for kind in ('csv', 'xlsx'):
+        build = app.EXPORT_ARTIFACTS[kind]['build']
+        
+        def counted(f, filters, until, kind=kind, build=build):
+            counts[kind] = counts.get(kind, 0) + 1
+            return build(f, filters, until)
+        monkeypatch.setitem(app.EXPORT_ARTIFACTS[kind], 'build', counted)
+    return counts
+
+
+def read_artifact(app, kind, filters=None):
+    file_obj, size = app.get_export_artifact(kind, filters)
+    with file_obj:
+        data = file_obj.read()
+    assert len(data) == size
+    return file_obj.name, data
+
+
+def test_same_revision_is_served_from_cache(app, seed, builds):
+    seed(10)
+    app.load_participants()
+    path, data = read_artifact(app, 'csv')
+    assert read_artifact(app, 'csv') == (path, data)
+    assert builds == {'csv': 1}
+    assert app.get_export_artifact('csv', allow_build=False)[0].name == path
+
+
+def test_filters_have_separate_artifacts(app, seed, builds):
+    seed(9)
+    app.load_participants()
+    _, full = read_artifact(app, 'csv')
+    _, filtered = read_artifact(app, 'csv', {'city': ['каспийск']})
+    assert len(full.splitlines()) == 10
+    assert [line.split(b',')[0] for line in filtered.splitlines()[1:]] == [b'3', b'6', b'9']
+    assert builds == {'csv': 2}
+
+
+def test_new_revision_appends_or_rebuilds(app, seed, builds):
+    seed(5)
+    app.load_participants()
+    old_path, old_data = read_artifact(app, 'csv')
+    
+    app.record_change('added', 6, make_participant(6))
+    # CSV дописывается к копии прежнего файла, прежний файл удаляется
+    path, data = read_artifact(app, 'csv')
+    assert data.startswith(old_data) and data.splitlines()[-1].startswith(b'6,')
+    assert path != old_path and not os.path.exists(old_path)
+    assert builds == {'csv': 1}
+    
+    # Номер меньше последнего в файле - дописать нельзя, файл собирается заново
+    app.record_change('deleted', 3)
+    app.record_change('added', 3, make_participant(3, full_name='Заново'))
+    _, data = read_artifact(app, 'csv')
+    assert 'Заново'.encode('utf-8') in data
+    assert builds == {'csv': 2}
+
+
+def test_xlsx_is_rebuilt_on_new_revision(app, seed, builds):
+    seed(3)
+    app.load_participants()
+    read_artifact(app, 'xlsx')
+    app.record_change('added', 4, make_participant(4))
+    path, _ = read_artifact(app, 'xlsx')
+    assert builds == {'xlsx': 2}
+    with zipfile.ZipFile(path) as archive:
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+    assert 'Участник 4' in sheet
+
+
+def test_least_recently_used_artifacts_are_evicted(app, seed, monkeypatch):
+    seed(20)
+    app.load_participants()
+    first, _ = read_artifact(app, 'csv', {'gender': 'male'})
+    second, data = read_artifact(app, 'csv', {'gender': 'female'})
+    monkeypatch.setattr(app, 'EXPORT_CACHE_MAX_BYTES', len(data) + 1)
+    third, _ = read_artifact(app, 'jsonl')
+    
+    # Только что собранный файл остается даже сверх предела
+    assert os.path.exists(third)
+    assert not os.path.exists(first) and not os.path.exists(second)
+    assert app.get_export_artifact('csv', {'gender': 'male'}, allow_build=False) is None
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def warmup(app, monkeypatch):
+    """Прогрев, который запускает только сам тест"""
+    monkeypatch.setattr(app, 'warmup_state', dict(app.warmup_state, status='pending', error=None, started_at=None,
+                                                  finished_at=None, thread=None))
+    started = []
+    monkeypatch.setattr(app, 'start_warmup', lambda: started.append(True))
+    return started
+
+
+def test_readyz_is_503_until_warmup_finishes(app, seed, warmup):
+    seed(3)
+    client = app.app.test_client()
+    response = client.get('/readyz')
+    assert response.status_code == 503
+    assert response.get_json()['checks']['participants_loaded'] is False
+    # Процесс без прогрева при запуске начинает его с первой проверки
+    assert warmup == [True]
+    
+    app.run_warmup()
+    response = client.get('/readyz')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['status'] == 'ready'
+    assert body['checks']['warmup'] == 'done' and body['checks']['warmup_seconds'] >= 0
+
+
+def test_readyz_reports_failed_sync(app, warmup, monkeypatch):
+    app.run_warmup()
+    monkeypatch.setitem(app.participants_state, 'sync_error', 'database is locked')
+    monkeypatch.setattr(app, 'sync_participants', lambda: None)
+    assert app.app.test_client().get('/readyz').status_code == 503
+
+
+def test_healthz_does_no_io(app, monkeypatch):
+    def no_io(*args, **kwargs):
+        raise AssertionError('/healthz обращается к данным')
+    for name in ('get_state_db', 'load_participants', 'load_settings', 'sync_participants'):
+        monkeypatch.setattr(app, name, no_io)
+    monkeypatch.setattr('builtins.open', no_io)
+    response = app.app.test_client().get('/healthz')
+    assert response.status_code == 200
+    assert response.get_json() == {'status': 'ok'}
+
+
+def test_cold_load_runs_once_for_concurrent_requests(app, seed, monkeypatch):
+    seed(3)
+    read_local_snapshot = app.read_local_snapshot
+    reads = []
+    
+    def slow_read():
+        reads.append(threading.current_thread().name)
+        time.sleep(0.1)
+        return read_local_snapshot()
+    monkeypatch.setattr(app, 'read_local_snapshot', slow_read)
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(len(app.load_participants()))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(reads) == 1
+    assert results == [3, 3, 3, 3]
@@ -0,0 +1,133 @@
+import os
+from concurrent.futures import Future
+
+import pytest
+
+from conftest import make_participant
+
+
+class HeldExecutor:
+    """Пул, задания которого не выполняются, пока тест их не завершит"""
+    
+    def __init__(self):
+        self.futures = []
+    
+    def submit(self, func, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+
+def wait_job(app, job_id):
+    future = app.export_jobs['futures'].get(job_id)
+    if future is not None:
+        future.result(timeout=30)
+
+
+def test_job_runs_and_file_is_downloaded(app, seed, client):
+    seed(12)
+    app.load_participants()
+    response = client.post('/admin/jobs', data={'kind': 'csv', 'city': 'каспийск'})
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert job['filters'] == {'city': ['каспийск']}
+    assert response.headers['Location'].endswith(f"/admin/jobs/{job['id']}")
+    
+    wait_job(app, job['id'])
+    status = client.get(f"/admin/jobs/{job['id']}").get_json()['job']
+    assert status['status'] == 'done' and status['progress'] == 100
+    
+    download = client.get(status['download_url'])
+    assert download.status_code == 200
+    assert download.headers['Content-Disposition'].endswith('.csv')
+    assert [line.split(b',')[0] for line in download.data.splitlines()[1:]] == [b'3', b'6', b'9', b'12']
+    assert len(download.data) == status['size']
+    download.close()
+    
+    # Файл вытеснен из кэша - ссылка больше не действует
+    os.remove(app.get_state_db().execute('SELECT path FROM jobs WHERE id = ?', (job['id'],)).fetchone()[0])
+    assert client.get(status['download_url']).status_code == 410
+
+
+def test_pending_job_is_not_duplicated(app, seed, client, monkeypatch):
+    seed(3)
+    app.load_participants()
+    executor = HeldExecutor()
+    monkeypatch.setitem(app.export_jobs, 'executor', executor)
+    first = client.post('/admin/jobs', data={'kind': 'jsonl'}).get_json()['job']
+    second = client.post('/admin/jobs', data={'kind': 'jsonl'}).get_json()['job']
+    other = client.post('/admin/jobs', data={'kind': 'jsonl', 'gender': 'male'}).get_json()['job']
+    assert first['id'] == second['id'] != other['id']
+    assert len(executor.futures) == 2
+    assert first['status'] == 'queued'
+    # Задание не готово - скачать нечего
+    assert client.get(f"/admin/jobs/{first['id']}/download").status_code == 404
+
+
+def test_full_queue_is_rejected(app, client, monkeypatch):
+    monkeypatch.setitem(app.export_jobs, 'executor', HeldExecutor())
+    monkeypatch.setattr(app, 'EXPORT_JOB_MAX_PENDING', 1)
+    assert client.post('/admin/jobs', data={'kind': 'csv'}).status_code == 202
+    assert client.post('/admin/jobs', data={'kind': 'xlsx'}).status_code == 429
+
+
+def test_crashed_worker_marks_job_failed(app, client, monkeypatch):
+    executor = HeldExecutor()
+    monkeypatch.setitem(app.export_jobs, 'executor', executor)
+    job_id = client.post('/admin/jobs', data={'kind': 'csv'}).get_json()['job']['id']
+    executor.futures[0].set_exception(RuntimeError('процесс пула завершился'))
+    
+    job = client.get(f'/admin/jobs/{job_id}').get_json()['job']
+    assert job['status'] == 'failed'
+    assert job['error'] == 'процесс пула завершился'
+    assert job_id not in app.export_jobs['futures']
+
+
+@pytest.mark.parametrize('method, url', [
+    ('post', '/admin/jobs'),
+    ('get', '/admin/jobs/unknown'),
+    ('get', '/admin/jobs/unknown/download')
+])
+def test_jobs_require_admin(app, method, url):
+    response = getattr(app.app.test_client(), method)(url)
+    assert response.status_code == 403
+
+
+def test_unknown_job_and_kind(app, client):
+    assert client.get('/admin/jobs/unknown').status_code == 404
+    assert client.post('/admin/jobs', data={'kind': 'pdf'}).status_code == 400
+
+
+def test_excel_download_returns_job_when_not_ready(app, seed, client, monkeypatch):
+    seed(3)
+    app.load_participants()
+    executor = HeldExecutor()
+    monkeypatch.setitem(app.export_jobs, 'executor', executor)
+    monkeypatch.setattr(app, 'EXPORT_DOWNLOAD_WAIT', 0.01)
+    response = client.get('/export-to-excel?gender=male')
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert job['status'] == 'queued' and job['filters'] == {'gender': 'male'}
+    assert response.headers['Location'].endswith(f"/admin/jobs/{job['id']}")
+    # Повторный запрос не ставит второе задание
+    assert client.get('/export-to-excel?gender=male').get_json()['job']['id'] == job['id']
+    assert len(executor.futures) == 1
+
+
+def test_export_job_loads_local_snapshot_and_journal(app, seed, monkeypatch):
+    seed(3)
+    app.load_participants()
+    assert app.sync_participants_store()
+    app.record_change('added', 4, make_participant(4))
+    revision = app.get_data_revision()
+    
+    # Процесс пула: кэша нет, Яндекс.Диск не нужен
+    app.PARTICIPANTS_CACHE = None
+    app.reset_participants_state([], 0)
+    monkeypatch.setattr(app, 'load_participants', lambda *args: pytest.fail('полная загрузка в процессе пула'))
+    app.load_export_snapshot(revision)
+    assert app.participants_index['tickets'] == [1, 2, 3, 4]
+    assert app.participants_state['revision'] == revision
+    
+    with pytest.raises(RuntimeError):
+        app.load_export_snapshot(revision + 1)
@@ -0,0 +1,59 @@
+import time
+
+
+def test_lease_is_exclusive_until_expiry(app, monkeypatch):
+    assert app.acquire_lease('test', 60)
+    assert app.acquire_lease('test', 60)
+    
+    monkeypatch.setattr(app, 'get_lease_owner', lambda: 'other:1')
+    assert not app.acquire_lease('test', 60)
+    
+    # Просроченную аренду забирает другой процесс
+    app.get_state_db().execute("UPDATE leases SET expires_at = ? WHERE name = 'test'", (time.time() - 1,))
+    assert app.acquire_lease('test', 60)
+    assert app.get_lease('test')['owner'] == 'other:1'
+
+
+def test_release_lease_only_by_owner(app, monkeypatch):
+    assert app.acquire_lease('test', 60)
+    owner = app.get_lease_owner()
+    monkeypatch.setattr(app, 'get_lease_owner', lambda: 'other:1')
+    app.release_lease('test')
+    assert app.get_lease('test')['owner'] == owner
+    monkeypatch.setattr(app, 'get_lease_owner', lambda: owner)
+    app.release_lease('test')
+    assert app.get_lease('test') is None
+
+
+def test_backup_status_does_not_depend_on_worker(app, client, monkeypatch):
+    assert app.acquire_lease(app.SCHEDULER_LEASE_NAME, 60)
+    first = client.get('/get-backup-status')
+    assert first.status_code == 200
+    assert first.get_json()['scheduler']['owner'] == app.get_lease_owner()
+    
+    # Другой воркер: свои счетчики отложенных копий и свой pid
+    monkeypatch.setitem(app.backup_trigger, 'triggers', 42)
+    monkeypatch.setattr(app, 'get_lease_owner', lambda: 'other:1')
+    app.admin_response_cache.clear()
+    second = client.get('/get-backup-status')
+    assert second.get_json() == first.get_json()
+    assert second.headers['ETag'] == first.headers['ETag']
+
+
+def test_backup_status_etag_changes_with_lease_owner(app, client, monkeypatch):
+    assert app.acquire_lease(app.SCHEDULER_LEASE_NAME, 60)
+    etag = client.get('/check-backup-status').headers['ETag']
+    assert client.get('/check-backup-status', headers={'If-None-Match': etag}).status_code == 304
+    
+    app.get_state_db().execute('UPDATE leases SET expires_at = ?', (time.time() - 1,))
+    monkeypatch.setattr(app, 'get_lease_owner', lambda: 'other:1')
+    assert app.acquire_lease(app.SCHEDULER_LEASE_NAME, 60)
+    response = client.get('/check-backup-status', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['scheduler']['owner'] == 'other:1'
+
+
+def test_metrics_report_worker_debounce_counters(app, client, monkeypatch):
+    monkeypatch.setitem(app.backup_trigger, 'triggers', 3)
+    body = client.get('/admin/backups/metrics').get_data(as_text=True)
+    assert f'backup_debounce_events{{pid="{app.os.getpid()}",event="triggers"}} 3' in body
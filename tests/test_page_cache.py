@@ -0,0 +1,107 @@
+import copy
+
+import jinja2
+import pytest
+
+
+@pytest.fixture
+def renders(app, monkeypatch):
+    """Имена шаблонов, отрендеренных при запросах"""
+    rendered = []
+    render_template = app.render_template
+    
+    def counting(template, **context):
+        rendered.append(template)
+        return render_template(template, **context)
+    monkeypatch.setattr(app, 'render_template', counting)
+    return rendered
+
+
+def set_settings(app, **fields):
+    settings = copy.deepcopy(app.load_settings())
+    settings.update(fields)
+    app.save_settings(settings)
+
+
+def test_page_is_rendered_once(app, renders):
+    client = app.app.test_client()
+    first = client.get('/')
+    second = client.get('/')
+    assert first.status_code == second.status_code == 200
+    assert first.data == second.data
+    assert renders == ['index.html']
+    assert second.headers['Cache-Control'] == 'public, no-cache'
+    
+    cached = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+    assert renders == ['index.html']
+
+
+def test_page_follows_its_settings_only(app, renders):
+    client = app.app.test_client()
+    etag = client.get('/').headers['ETag']
+    
+    set_settings(app, backup_settings={'enabled': True, 'yandex_token': ''})
+    assert client.get('/').headers['ETag'] == etag
+    assert renders == ['index.html']
+    
+    set_settings(app, whatsapp_link='https://chat.whatsapp.com/changed')
+    response = client.get('/')
+    assert response.headers['ETag'] != etag
+    assert b'https://chat.whatsapp.com/changed' in response.data
+    assert renders == ['index.html', 'index.html']
+
+
+@pytest.fixture
+def templates(app, monkeypatch):
+    """Шаблоны страниц в памяти с перечитыванием, как при TEMPLATES_AUTO_RELOAD"""
+    mapping = {
+        'base.html': '<html>{% block content %}{% endblock %} v1</html>',
+        'index.html': "{% extends 'base.html' %}{% block content %}{{ whatsapp_link }}{% endblock %}"
+    }
+    env = app.app.jinja_env
+    monkeypatch.setattr(env, 'loader', jinja2.DictLoader(mapping))
+    monkeypatch.setattr(env, 'auto_reload', True)
+    return mapping
+
+
+def test_page_is_rerendered_after_parent_template_change(app, client, templates, renders):
+    assert client.get('/').data.endswith(b'v1</html>')
+    templates['base.html'] = templates['base.html'].replace('v1', 'v2')
+    assert client.get('/').data.endswith(b'v2</html>')
+    assert renders == ['index.html', 'index.html']
+    
+    assert client.get('/').data.endswith(b'v2</html>')
+    assert len(renders) == 2
+
+
+def test_template_change_without_auto_reload_keeps_page(app, client, templates, renders, monkeypatch):
+    monkeypatch.setattr(app.app.jinja_env, 'auto_reload', False)
+    body = client.get('/').data
+    templates['base.html'] = templates['base.html'].replace('v1', 'v2')
+    assert client.get('/').data == body
+    assert len(renders) == 1
+
+
+def test_flash_messages_bypass_the_cache(app, renders):
+    client = app.app.test_client()
+    etag = client.get('/').headers['ETag']
+    with client.session_transaction() as session:
+        session['_flashes'] = [('danger', 'Сообщение посетителю')]
+    
+    flashed = client.get('/')
+    assert 'Сообщение посетителю' in flashed.get_data(as_text=True)
+    assert 'ETag' not in flashed.headers
+    # Сообщение показано один раз, готовая страница не изменилась
+    after = client.get('/')
+    assert after.headers['ETag'] == etag
+    assert 'Сообщение посетителю' not in after.get_data(as_text=True)
+    assert renders == ['index.html', 'index.html']
+
+
+def test_admin_session_gets_the_same_page(app, client, renders):
+    anonymous = app.app.test_client().get('/')
+    admin = client.get('/')
+    assert admin.headers['ETag'] == anonymous.headers['ETag']
+    assert admin.data == anonymous.data
+    assert renders == ['index.html']
@@ -0,0 +1,81 @@
+import pytest
+
+from conftest import make_participant
+
+
+def collect_pages(app, sort, order, per_page, filters=None):
+    """Все страницы по курсорам подряд"""
+    tickets, cursor, pages = [], None, 0
+    while True:
+        page, cursor, total = app.get_participants_page(sort=sort, order=order, cursor=cursor, per_page=per_page, filters=filters)
+        tickets.extend(p['ticket_number'] for p in page)
+        pages += 1
+        if cursor is None:
+            return tickets, total, pages
+
+
+def expected_order(participants, sort, order):
+    keys = sorted(app_sort_key(sort, p) for p in participants)
+    if order == 'desc':
+        keys.reverse()
+    return [key if sort == 'ticket' else key[1] for key in keys]
+
+
+def app_sort_key(sort, participant):
+    if sort == 'time':
+        return (participant['registration_time'], participant['ticket_number'])
+    if sort == 'age':
+        return (participant['age'], participant['ticket_number'])
+    return participant['ticket_number']
+
+
+@pytest.fixture
+def participants(app, seed):
+    participants = seed(137)
+    app.load_participants()
+    return participants
+
+
+@pytest.mark.parametrize('sort', ['ticket', 'time', 'age'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('per_page', [1, 10, 50, 137, 500])
+def test_cursor_pages_cover_all_participants_once(app, participants, sort, order, per_page):
+    tickets, total, pages = collect_pages(app, sort, order, per_page)
+    assert tickets == expected_order(participants, sort, order)
+    assert total == len(participants)
+    assert pages == max(1, -(-len(participants) // per_page))
+
+
+@pytest.mark.parametrize('sort', ['ticket', 'time', 'age'])
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_cursor_pages_with_filters(app, participants, sort, order):
+    filters = {'gender': 'male', 'age_from': 20, 'age_to': 40}
+    matched = [p for p in participants if p['gender'] == 'male' and 20 <= p['age'] <= 40]
+    tickets, total, _ = collect_pages(app, sort, order, 7, filters)
+    assert tickets == expected_order(matched, sort, order)
+    assert total == len(matched)
+
+
+def test_cursor_stays_valid_after_changes(app, participants):
+    page, cursor, _ = app.get_participants_page(per_page=10)
+    assert cursor == '10'
+    # Удаление уже показанного и добавление нового не сдвигают следующую страницу
+    app.record_deletions([3])
+    app.record_change('added', 1000, make_participant(1000))
+    app.load_participants()
+    page, _, total = app.get_participants_page(cursor=cursor, per_page=5)
+    assert [p['ticket_number'] for p in page] == [11, 12, 13, 14, 15]
+    assert total == len(participants)
+
+
+def test_invalid_cursor_starts_from_first_page(app, participants):
+    page, _, _ = app.get_participants_page(sort='time', cursor='bogus', per_page=3)
+    assert [p['ticket_number'] for p in page] == expected_order(participants, 'time', 'asc')[:3]
+
+
+def test_admin_panel_uses_warm_cache(app, participants, client, monkeypatch):
+    calls = []
+    original = app.load_participants
+    monkeypatch.setattr(app, 'load_participants', lambda force_reload=False: calls.append(force_reload) or original(force_reload))
+    assert client.get('/admin').status_code == 200
+    assert calls and not any(calls)
@@ -0,0 +1,69 @@
+import hashlib
+import io
+import json
+import os
+import re
+import zipfile
+
+import pytest
+
+
+def export_zip(client, query):
+    response = client.get('/export-to-excel?' + query)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+    return zipfile.ZipFile(io.BytesIO(response.data))
+
+
+def sheet_names(archive, name):
+    sheet = zipfile.ZipFile(io.BytesIO(archive.read(name))).read('xl/worksheets/sheet1.xml').decode('utf-8')
+    return re.findall(r'Участник \d+', sheet)
+
+
+@pytest.fixture
+def loaded(app, seed):
+    seed(12)
+    app.load_participants()
+
+
+def test_partition_by_city(app, loaded, client):
+    archive = export_zip(client, 'partition=city')
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['partition_by'] == 'city'
+    assert manifest['total_rows'] == 12
+    assert [p['name'] for p in manifest['partitions']] == ['каспийск', 'махачкала']
+    
+    for partition in manifest['partitions']:
+        data = archive.read(partition['file'])
+        assert len(data) == partition['size']
+        assert hashlib.sha256(data).hexdigest() == partition['sha256']
+        assert len(sheet_names(archive, partition['file'])) == partition['rows']
+    assert sheet_names(archive, manifest['partitions'][0]['file']) == [f'Участник {t}' for t in (3, 6, 9, 12)]
+    # Временные файлы частей удалены
+    assert not [name for name in os.listdir(app.EXPORT_CACHE_DIR) if name.startswith('partition.')]
+
+
+def test_partition_by_tickets_with_filters(app, loaded, client, monkeypatch):
+    monkeypatch.setattr(app, 'EXPORT_PARTITION_MIN_SIZE', 1)
+    archive = export_zip(client, 'partition=tickets&partition_size=3&gender=male')
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['filters'] == {'gender': 'male'}
+    assert [p['name'] for p in manifest['partitions']] == ['1-5', '7-11']
+    assert [p['file'] for p in manifest['partitions']] == ['001_1-5.xlsx', '002_7-11.xlsx']
+    assert sheet_names(archive, '002_7-11.xlsx') == ['Участник 7', 'Участник 9', 'Участник 11']
+
+
+def test_partition_by_date(app, loaded):
+    revision, partitions = app.get_export_partitions('date', {})
+    assert revision == app.participants_state['revision']
+    assert [p['name'] for p in partitions][:2] == ['2026-01-02', '2026-01-03']
+    assert sum(len(p['tickets']) for p in partitions) == 12
+
+
+def test_invalid_partition_requests(app, loaded, client, monkeypatch):
+    response = client.get('/export-to-excel?partition=region')
+    assert response.status_code == 302
+    
+    monkeypatch.setattr(app, 'EXPORT_MAX_PARTITIONS', 1)
+    response = client.get('/export-to-excel?partition=city')
+    assert response.status_code == 302
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+from conftest import make_participant, reload_cold
+
+
+def get_tickets(participants):
+    return sorted(p['ticket_number'] for p in participants)
+
+
+def catalog_entry(path, created_at, type='full', chain=None, revision=None, base_revision=None):
+    return {'path': path, 'source': 'scheduled', 'type': type, 'chain': chain, 'revision': revision,
+            'base_revision': base_revision, 'sha256': None, 'md5': None, 'size': 1, 'created_at': created_at}
+
+
+def fill_catalog(app, entries):
+    fields = app.BACKUP_CATALOG_FIELDS
+    app.get_state_db().executemany(
+        f"INSERT INTO backup_catalog ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+        [tuple(entry[name] for name in fields) for entry in entries])
+
+
+def test_plan_takes_longest_unbroken_delta_chain(app):
+    fill_catalog(app, [
+        catalog_entry('a.json', '2026-03-01 00:00:00', revision=10),
+        catalog_entry('a1.delta.json', '2026-03-01 06:00:00', 'delta', 'a.json', 12, 10),
+        catalog_entry('b.json', '2026-03-01 09:00:00'),
+        catalog_entry('a2.delta.json', '2026-03-01 12:00:00', 'delta', 'a.json', 15, 12),
+        # Дельта с чужой базой обрывает цепочку
+        catalog_entry('a3.delta.json', '2026-03-01 18:00:00', 'delta', 'a.json', 20, 99)
+    ])
+    paths = lambda plan: [entry['path'] for entry in plan]
+    assert paths(app.plan_restore('2026-03-01 13:00:00')) == ['a.json', 'a1.delta.json', 'a2.delta.json']
+    assert paths(app.plan_restore('2026-03-01 20:00:00')) == ['a.json', 'a1.delta.json', 'a2.delta.json']
+    # Цепочка a заканчивается раньше снимка b без ревизии
+    assert paths(app.plan_restore('2026-03-01 10:00:00')) == ['b.json']
+    assert app.plan_restore('2026-02-01 00:00:00') is None
+
+
+def test_deltas_are_applied_in_order(app, tmp_path):
+    files = {
+        'full.json': [make_participant(1), make_participant(2), make_participant(3)],
+        'first.delta.json': {'added': [make_participant(4)], 'removed': [2]},
+        'second.delta.json': {'added': [make_participant(2, full_name='Вернулся')], 'removed': [4, 7]}
+    }
+    paths = []
+    for name, content in files.items():
+        (tmp_path / name).write_text(json.dumps(content, ensure_ascii=False), encoding='utf-8')
+        paths.append(str(tmp_path / name))
+    participants = app.merge_backup_files(paths)
+    assert get_tickets(participants) == [1, 2, 3]
+    assert next(p for p in participants if p['ticket_number'] == 2)['full_name'] == 'Вернулся'
+
+
+def test_restore_replaces_store_and_journal(app, seed):
+    seed(5)
+    app.load_participants()
+    since = app.get_data_revision()
+    revision = app.replace_participants_store([make_participant(7), make_participant(8)])
+
+    assert revision == app.get_data_revision()
+    assert get_tickets(app.load_participants()) == [7, 8]
+    with open(app.PARTICIPANTS_META_FILE, encoding='utf-8') as file:
+        assert json.load(file)['revision'] == revision
+    assert app.get_changes_since(since) is None
+    assert get_tickets(reload_cold(app)) == [7, 8]
+
+
+def test_restore_is_not_undone_by_stale_worker_file(app, seed):
+    seed(5)
+    app.load_participants()
+    stale_revision = app.get_data_revision()
+    stale = [make_participant(ticket) for ticket in range(1, 6)]
+    app.replace_participants_store([make_participant(7), make_participant(8)])
+
+    # Воркер с кэшем до восстановления переписал рабочий файл своим снимком
+    app.write_participants_file(stale, stale_revision)
+    assert get_tickets(reload_cold(app)) == [7, 8]
+
+
+def test_save_from_stale_cache_keeps_restore(app, seed):
+    seed(5)
+    app.load_participants()
+    stale_revision = app.get_data_revision()
+    app.replace_participants_store([make_participant(7), make_participant(8)])
+
+    # Регистрация в воркере, который еще не видел записи restored
+    stale = [make_participant(ticket) for ticket in range(1, 6)]
+    app.PARTICIPANTS_CACHE = stale
+    app.reset_participants_state(stale, stale_revision)
+    app.rebuild_participants_index(stale)
+    assert app.save_participant(make_participant(10))
+
+    assert get_tickets(app.load_participants()) == [7, 8, 10]
+    assert get_tickets(reload_cold(app)) == [7, 8, 10]
+
+
+def test_restore_during_registration_is_not_overwritten(app, seed, monkeypatch):
+    seed(5)
+    app.load_participants()
+    write_participants_file = app.write_participants_file
+    restorer = threading.Thread(target=app.replace_participants_store, args=([make_participant(7), make_participant(8)],))
+
+    def slow_write(participants, revision):
+        # Восстановление в другом потоке начинается, пока регистрация пишет файл
+        if not restorer.is_alive():
+            restorer.start()
+            time.sleep(0.2)
+        return write_participants_file(participants, revision)
+    monkeypatch.setattr(app, 'write_participants_file', slow_write)
+    assert app.save_participant(make_participant(10))
+    restorer.join()
+
+    assert get_tickets(app.load_participants()) == [7, 8]
+    assert get_tickets(reload_cold(app)) == [7, 8]
+
+
+def test_restore_waits_for_lease_of_other_worker(app, client):
+    now = time.time()
+    app.get_state_db().execute(
+        'INSERT INTO leases (name, owner, acquired_at, renewed_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+        (app.RESTORE_LEASE_NAME, 'other:1', now, now, now + 60))
+    response = client.post('/admin/restore')
+    assert response.status_code == 409
+    assert not app.restore_lock.locked()
+
+
+def test_restore_requires_admin(app):
+    assert app.app.test_client().post('/admin/restore').status_code == 403
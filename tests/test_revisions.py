@@ -0,0 +1,74 @@
+import json
+
+from conftest import make_participant, reload_cold
+
+
+def get_tickets(participants):
+    return sorted(p['ticket_number'] for p in participants)
+
+
+def test_cold_load_replays_changes_after_snapshot_revision(app, seed):
+    seed(5)
+    app.load_participants()
+    assert app.sync_participants_store()
+    with open(app.PARTICIPANTS_META_FILE, encoding='utf-8') as file:
+        meta = json.load(file)
+    assert meta['revision'] == app.get_data_revision()
+    
+    # Изменения другого процесса, не успевшего переписать хранилище
+    app.record_change('added', 6, make_participant(6))
+    app.record_deletions([2])
+    
+    assert get_tickets(reload_cold(app)) == [1, 3, 4, 5, 6]
+    assert app.participants_state['revision'] == app.get_data_revision()
+
+
+def test_snapshot_written_on_registration_replays_idempotently(app, seed):
+    seed(3)
+    app.load_participants()
+    assert app.save_participant(make_participant(4))
+    app.record_deletions([1])
+    
+    participants = reload_cold(app)
+    assert get_tickets(participants) == [2, 3, 4]
+    assert len(app.participants_index['by_ticket']) == 3
+
+
+def test_snapshot_revision_requires_matching_content(app, seed):
+    seed(3)
+    app.load_participants()
+    app.sync_participants_store()
+    with open(app.PARTICIPANTS_FILE, 'rb') as file:
+        data = file.read()
+    with open(app.PARTICIPANTS_META_FILE, encoding='utf-8') as file:
+        meta = json.load(file)
+    
+    assert app.get_snapshot_revision(data, meta) == meta['revision']
+    assert app.get_snapshot_revision(data + b' ', meta) is None
+    assert app.get_snapshot_revision(data, dict(meta, state_id='other')) is None
+
+
+def test_snapshot_without_revision_is_taken_as_current(app, seed):
+    seed(3)
+    app.record_change('added', 4, make_participant(4))
+    # Старый файл без сведений о снимке: журнал до загрузки уже учтен в нем
+    assert get_tickets(app.load_participants()) == [1, 2, 3]
+    app.record_change('added', 5, make_participant(5))
+    assert get_tickets(app.load_participants()) == [1, 2, 3, 5]
+
+
+def test_changes_since_returns_delta_and_requires_reload_after_clear(app, seed):
+    seed(3)
+    app.load_participants()
+    start = app.get_data_revision()
+    app.record_change('added', 4, make_participant(4))
+    app.record_deletions([1])
+    app.record_change('added', 5, make_participant(5))
+    app.record_deletions([5])
+    
+    changes = app.get_changes_since(start)
+    assert [p['ticket_number'] for p in changes['added']] == [4]
+    assert changes['removed'] == [1]
+    
+    app.record_change('cleared')
+    assert app.get_changes_since(start) is None
@@ -0,0 +1,267 @@
+import copy
+import json
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+
+def set_backup_settings(app, **fields):
+    settings = copy.deepcopy(app.load_settings())
+    settings.setdefault('backup_settings', {}).update(fields)
+    app.save_settings(settings)
+
+
+@pytest.fixture
+def heap(app, monkeypatch):
+    """Пустая куча планировщика и его состояние только для теста"""
+    monkeypatch.setattr(app, 'scheduler_jobs', [])
+    monkeypatch.setattr(app, 'scheduler_state', dict(app.scheduler_state, seq=0, settings_changed=False, leader=True,
+                                                     backup_settings=None))
+    return app.scheduler_jobs
+
+
+def test_schedule_job_replaces_job_with_same_name(app, heap):
+    app.schedule_job('backup', 300, print)
+    app.schedule_job('store-sync', 100, print)
+    app.schedule_job('backup', 200, len)
+    assert [(job[0], job[2]) for job in sorted(heap)] == [(100, 'store-sync'), (200, 'backup')]
+    assert heap[0][2] == 'store-sync'
+    assert [job[3] for job in heap if job[2] == 'backup'] == [len]
+    
+    # Срок None снимает задачу
+    app.schedule_job('backup', None, len)
+    assert [job[2] for job in heap] == ['store-sync']
+
+
+def test_schedule_job_wakes_waiting_scheduler(app, heap):
+    woke = threading.Event()
+    
+    def wait():
+        with app.scheduler_condition:
+            app.scheduler_condition.wait(5)
+        woke.set()
+    
+    thread = threading.Thread(target=wait)
+    with app.scheduler_condition:
+        thread.start()
+    # Поток уже ждет на условии, когда планировщик получит новую задачу
+    time.sleep(0.05)
+    app.schedule_job('backup', time.time(), print)
+    assert woke.wait(1)
+    thread.join()
+
+
+def test_notify_scheduler_marks_settings_changed(app, heap):
+    app.notify_scheduler()
+    assert app.scheduler_state['settings_changed']
+
+
+def test_only_backup_settings_changes_wake_scheduler(app, heap):
+    app.scheduler_state['backup_settings'] = {'enabled': False}
+    app.on_settings_changed({'whatsapp_link': 'https://example.com', 'backup_settings': {'enabled': False}})
+    assert not app.scheduler_state['settings_changed']
+    app.on_settings_changed({'backup_settings': {'enabled': True}})
+    assert app.scheduler_state['settings_changed']
+
+
+def test_schedule_backup_uses_next_backup_time_with_jitter(app, heap, monkeypatch):
+    set_backup_settings(app, enabled=True, interval='custom', custom_value=2, custom_unit='minutes',
+                        last_backup='2026-01-01 00:00:00')
+    monkeypatch.setattr(app.random, 'uniform', lambda low, high: high)
+    app.schedule_backup()
+    # Пропущенный срок - копия сразу; сдвиг не больше 10% периода
+    assert [job[2] for job in heap] == ['backup']
+    assert heap[0][0] - time.time() == pytest.approx(12, abs=2)
+    
+    set_backup_settings(app, enabled=False)
+    app.schedule_backup()
+    assert heap == []
+
+
+def test_follower_does_not_schedule_backups(app, heap):
+    app.scheduler_state['leader'] = False
+    set_backup_settings(app, enabled=True, interval='hourly')
+    app.schedule_backup()
+    assert heap == []
+
+
+@pytest.mark.parametrize('settings, expected', [
+    ({'enabled': False}, None),
+    ({'enabled': True, 'interval': 'daily', 'last_backup': '2026-03-10 03:00:05'}, datetime(2026, 3, 11, 3)),
+    # Пропущенная ночная копия делается сразу, если с ее срока прошло не больше полупериода
+    ({'enabled': True, 'interval': 'daily', 'last_backup': '2026-03-08 03:00:05'}, datetime(2026, 3, 10, 9)),
+    ({'enabled': True, 'interval': 'hourly', 'last_backup': '2026-03-10 09:00:01'}, datetime(2026, 3, 10, 10)),
+    ({'enabled': True, 'interval': 'custom', 'custom_value': 3, 'custom_unit': 'days',
+      'last_backup': '2026-03-09 12:00:00'}, datetime(2026, 3, 12, 12))
+])
+def test_compute_next_backup_time(app, settings, expected):
+    assert app.compute_next_backup_time(settings, now=datetime(2026, 3, 10, 9)) == expected
+
+
+@pytest.fixture
+def executors(app, monkeypatch):
+    monkeypatch.setattr(app, 'scheduler_executors', {})
+    yield app.scheduler_executors
+    for executor in app.scheduler_executors.values():
+        executor.shutdown(wait=True)
+
+
+def test_backup_jobs_do_not_block_scheduler_thread(app, executors):
+    release = threading.Event()
+    started = threading.Event()
+    
+    def slow_backup():
+        started.set()
+        release.wait(5)
+    
+    began = time.monotonic()
+    app.dispatch_scheduler_job((0, 1, 'backup', slow_backup))
+    assert started.wait(5)
+    # Поток планировщика свободен: продление аренды выполняется, пока идет копия
+    renewed = []
+    app.dispatch_scheduler_job((0, 2, 'lease', lambda: renewed.append(threading.current_thread())))
+    assert renewed == [threading.current_thread()]
+    assert time.monotonic() - began < 1
+    release.set()
+
+
+def test_backup_jobs_run_one_at_a_time(app, executors):
+    running, overlaps, done = [], [], threading.Semaphore(0)
+    
+    def backup():
+        running.append(1)
+        overlaps.append(len(running))
+        time.sleep(0.05)
+        running.pop()
+        done.release()
+    
+    for name in ('backup', 'debounced-backup', 'startup-backup'):
+        app.dispatch_scheduler_job((0, 1, name, backup))
+    for _ in range(3):
+        assert done.acquire(timeout=5)
+    assert overlaps == [1, 1, 1]
+
+
+def test_failed_scheduled_backup_is_retried(app, executors, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(app, 'schedule_job', lambda name, deadline, func: scheduled.append(name))
+    
+    def broken():
+        raise RuntimeError('сбой')
+    
+    app.run_scheduler_job((0, 1, 'backup', broken))
+    assert scheduled == ['backup']
+
+
+def test_store_sync_is_not_queued_behind_backup(app, executors):
+    release = threading.Event()
+    synced = threading.Event()
+    app.dispatch_scheduler_job((0, 1, 'backup', lambda: release.wait(5)))
+    app.dispatch_scheduler_job((0, 2, 'store-sync', synced.set))
+    assert synced.wait(1)
+    release.set()
+
+
+def test_pending_store_sync_is_flushed_at_exit(app, seed, tmp_path):
+    seed(3)
+    script = f'''
+import sys
+sys.path.insert(0, {repr(str(app.os.path.dirname(app.os.path.abspath(app.__file__))))})
+import app
+app.scheduler_state['running'] = True
+app.schedule_job = lambda name, deadline, func: None
+app.load_participants()
+app.delete_participants_by_ticket([2])
+assert app.store_sync_state['dirty_since'] is not None
+'''
+    env = dict(app.os.environ, DATA_DIR=app.DATA_DIR, DATA_FILE=app.PARTICIPANTS_FILE, SETTINGS_FILE=app.SETTINGS_FILE)
+    result = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    with open(app.PARTICIPANTS_FILE, encoding='utf-8') as file:
+        assert [p['ticket_number'] for p in json.load(file)] == [1, 3]
+
+
+@pytest.fixture
+def clock(app, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(app.time, 'time', lambda: now[0])
+    return now
+
+
+def debounced_deadline(heap):
+    return [job[0] for job in heap if job[2] == 'debounced-backup']
+
+
+def test_registrations_in_all_workers_coalesce_into_one_mark(app, heap, clock):
+    set_backup_settings(app, debounce_quiet=30, debounce_max_delay=300)
+    start = clock[0]
+    app.scheduler_state['leader'] = False
+    app.request_backup()
+    # Отметка другого воркера не попадает в его кучу, но видна в базе состояния
+    assert debounced_deadline(heap) == []
+    assert app.get_backup_debounce_state() == (start, start + 30)
+    
+    app.scheduler_state['leader'] = True
+    clock[0] += 10
+    app.request_backup()
+    assert app.get_backup_debounce_state() == (start, start + 40)
+    assert debounced_deadline(heap) == [start + 40]
+    assert app.backup_trigger['coalesced'] >= 1
+
+
+def test_debounce_deadline_is_capped_by_max_delay(app, heap, clock):
+    set_backup_settings(app, debounce_quiet=30, debounce_max_delay=100)
+    start = clock[0]
+    for _ in range(8):
+        app.request_backup()
+        clock[0] += 20
+    assert app.get_backup_debounce_state() == (start, start + 100)
+    assert debounced_deadline(heap) == [start + 100]
+
+
+def test_only_leader_runs_debounced_backup_after_deadline(app, heap, clock, monkeypatch):
+    runs = []
+    monkeypatch.setattr(app, 'create_backup', lambda trigger: runs.append(trigger) or True)
+    set_backup_settings(app, debounce_quiet=30, debounce_max_delay=300)
+    app.request_backup()
+    deadline = app.get_backup_debounce_state()[1]
+    
+    app.scheduler_state['leader'] = False
+    clock[0] = deadline
+    app.run_debounced_backup()
+    assert runs == []
+    
+    # Срок сдвинут другим воркером - ведущий переставляет задачу на новый срок
+    app.scheduler_state['leader'] = True
+    clock[0] = deadline - 5
+    app.run_debounced_backup()
+    assert runs == [] and debounced_deadline(heap) == [deadline]
+    
+    clock[0] = deadline
+    app.run_debounced_backup()
+    assert runs == ['registration']
+    assert app.get_backup_debounce_state() == (None, None)
+    # Без отметки ведущий периодически проверяет отметки других воркеров
+    assert debounced_deadline(heap) == [deadline + app.BACKUP_DEBOUNCE_POLL]
+    app.run_debounced_backup()
+    assert runs == ['registration']
+
+
+def test_failed_debounced_backup_keeps_first_mark(app, heap, clock, monkeypatch):
+    monkeypatch.setattr(app, 'create_backup', lambda trigger: False)
+    set_backup_settings(app, debounce_quiet=30, debounce_max_delay=300)
+    start = clock[0]
+    app.request_backup()
+    clock[0] += 30
+    app.run_debounced_backup()
+    assert app.get_backup_debounce_state() == (start, clock[0] + app.BACKUP_RETRY_DELAY)
+    assert debounced_deadline(heap) == [clock[0] + app.BACKUP_RETRY_DELAY]
+    
+    # Регистрация после неудачи не сдвигает начало отметки, max_delay считается от него
+    clock[0] += 1
+    app.request_backup()
+    assert app.get_backup_debounce_state() == (start, clock[0] + 30)
@@ -0,0 +1,77 @@
+import json
+import threading
+
+
+def read_file(app):
+    with open(app.SETTINGS_FILE, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def test_update_increments_version_and_writes_file(app):
+    version = app.load_settings().get('_version', 0)
+    settings = app.update_settings(lambda s: s.update(whatsapp_link='https://example.com/a'))
+    assert settings['_version'] == version + 1
+    assert read_file(app)['whatsapp_link'] == 'https://example.com/a'
+    assert app.load_settings()['_version'] == version + 1
+
+
+def test_compare_and_swap_rejects_stale_version(app):
+    version = app.load_settings().get('_version', 0)
+    assert app.save_settings(dict(read_file(app), whatsapp_link='https://example.com/first'), expected_version=version)
+    
+    # Второй писатель прочитал настройки до первой записи - его запись отклоняется
+    stale = dict(read_file(app), whatsapp_link='https://example.com/second')
+    assert not app.save_settings(stale, expected_version=version)
+    assert read_file(app)['whatsapp_link'] == 'https://example.com/first'
+    assert read_file(app)['_version'] == version + 1
+    
+    assert app.save_settings(stale, expected_version=version + 1)
+    assert read_file(app)['whatsapp_link'] == 'https://example.com/second'
+
+
+def test_concurrent_updates_are_not_lost(app):
+    def add_counter(settings):
+        settings['counter'] = settings.get('counter', 0) + 1
+    
+    def worker():
+        for _ in range(20):
+            app.update_settings(add_counter)
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert read_file(app)['counter'] == 80
+
+
+def test_external_write_is_seen_and_notifies_subscribers(app, monkeypatch):
+    app.load_settings()
+    received = []
+    monkeypatch.setattr(app, 'settings_subscribers', [received.append])
+    
+    # Запись из другого процесса: файл заменен целиком
+    data = dict(read_file(app), whatsapp_link='https://example.com/other', _version=99)
+    with open(app.SETTINGS_FILE + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    app.os.replace(app.SETTINGS_FILE + '.tmp', app.SETTINGS_FILE)
+    
+    assert app.load_settings()['whatsapp_link'] == 'https://example.com/other'
+    assert [settings['_version'] for settings in received] == [99]
+    # Повторное чтение без изменений файла подписчиков не вызывает
+    app.load_settings()
+    assert len(received) == 1
+
+
+def test_update_notifies_subscribers_once(app, monkeypatch):
+    received = []
+    monkeypatch.setattr(app, 'settings_subscribers', [received.append])
+    app.update_settings(lambda s: s.update(whatsapp_link='https://example.com/b'))
+    app.load_settings()
+    assert [settings['whatsapp_link'] for settings in received] == ['https://example.com/b']
+
+
+def test_settings_revision_changes_with_version(app):
+    before = app.get_settings_revision()
+    app.update_settings(lambda s: s.update(whatsapp_link='https://example.com/c'))
+    assert app.get_settings_revision() != before
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import make_participant
+
+
+# Начало текущей минуты: все времена теста считаются от одной точки
+NOW = datetime.now().replace(second=0, microsecond=0)
+
+
+def at(minutes_ago):
+    return (NOW - timedelta(minutes=minutes_ago, seconds=-10)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+@pytest.fixture
+def recent(app):
+    """Участники, зарегистрированные за последние минуты и трое суток назад"""
+    participants = [
+        make_participant(1, registration_time=at(5), gender='male'),
+        make_participant(2, registration_time=at(5), gender='female'),
+        make_participant(3, registration_time=at(3), gender='male'),
+        make_participant(4, registration_time=at(3 * 24 * 60), gender='female')
+    ]
+    with open(app.PARTICIPANTS_FILE, 'w', encoding='utf-8') as file:
+        json.dump(participants, file, ensure_ascii=False)
+    app.load_participants()
+    return participants
+
+
+def bucket(app, step, participant):
+    prefix = app.TIMESERIES_STEPS[step][0]
+    return app.timeseries_rollups[step].get(participant['registration_time'][:prefix], {})
+
+
+def test_rollups_count_registrations_by_dimension(app, recent):
+    minute = bucket(app, 'minute', recent[0])
+    assert minute['total'] == 2
+    assert minute['male'] == 1 and minute['female'] == 1
+    assert minute['allowed_ip'] == 2
+    day = recent[2]['registration_time'][:10]
+    assert bucket(app, 'day', recent[2])['total'] == sum(p['registration_time'][:10] == day for p in recent)
+
+
+def test_rollups_follow_changes_from_journal(app, recent):
+    app.record_change('added', 5, make_participant(5, registration_time=recent[2]['registration_time'], gender='female'))
+    app.sync_participants()
+    assert bucket(app, 'minute', recent[2])['total'] == 2
+    assert bucket(app, 'minute', recent[2])['female'] == 1
+
+    app.record_change('deleted', 1)
+    app.sync_participants()
+    minute = bucket(app, 'minute', recent[0])
+    assert minute['total'] == 1 and minute['male'] == 0
+
+
+def test_old_minute_buckets_are_compacted(app, recent):
+    # Поминутные счетчики старше 48 часов удаляются, часовые и дневные остаются
+    assert bucket(app, 'minute', recent[3]) == {}
+    assert bucket(app, 'hour', recent[3])['total'] == 1
+    assert bucket(app, 'day', recent[3])['total'] >= 1
+
+    old = (datetime.now() - timedelta(days=91)).strftime('%Y-%m-%d %H')
+    with app.data_lock:
+        app.timeseries_rollups['hour'][old] = {'total': 1}
+        app.compact_timeseries()
+    assert old not in app.timeseries_rollups['hour']
+
+
+def test_timeseries_endpoint_fills_empty_intervals(app, recent, client):
+    end = datetime.strptime(recent[2]['registration_time'], '%Y-%m-%d %H:%M:%S')
+    start = end - timedelta(minutes=4)
+    response = client.get('/admin/timeseries', query_string={
+        'step': 'minute', 'from': start.strftime('%Y-%m-%d %H:%M'), 'to': end.strftime('%Y-%m-%dT%H:%M')})
+    body = response.get_json()
+    assert body['success'] and not body['truncated']
+    assert [point['time'] for point in body['points']] == [
+        (start + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M') for i in range(5)]
+    assert [point.get('total', 0) for point in body['points']] == [0, 0, 2, 0, 1]
+    assert body['detail_available_from'] <= body['from']
+
+
+def test_timeseries_endpoint_caps_points(app, client):
+    body = client.get('/admin/timeseries?step=minute&from=2020-01-01&to=2021-01-01').get_json()
+    assert body['truncated']
+    assert len(body['points']) == app.TIMESERIES_MAX_POINTS
+    assert client.get('/admin/timeseries?step=day').get_json()['detail_available_from'] is None
+
+
+@pytest.mark.parametrize('query', [
+    'step=second',
+    'step=hour&from=вчера',
+    'step=hour&to=2026-13-01',
+    'step=hour&from=2026-02-01&to=2026-01-01'
+])
+def test_timeseries_endpoint_validates_query(app, client, query):
+    response = client.get('/admin/timeseries?' + query)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_timeseries_requires_admin(app):
+    assert app.app.test_client().get('/admin/timeseries').status_code == 403
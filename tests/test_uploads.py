@@ -0,0 +1,93 @@
+import io
+
+import pytest
+import requests
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def disk(app, monkeypatch):
+    """Яндекс.Диск с заданными ответами на загрузку: outcomes[путь] - очередь статусов или исключений"""
+    outcomes = {}
+    received = {}
+    sleeps = []
+
+    def get(url, headers=None, params=None, **kwargs):
+        assert headers == {'Authorization': 'OAuth test-token'}
+        return FakeResponse(200, {'href': 'upload:' + params['path']})
+
+    def put(url, data=None, **kwargs):
+        path = url[len('upload:'):]
+        body = data.read() if hasattr(data, 'read') else data
+        received.setdefault(path, []).append(body)
+        queue = outcomes.get(path) or [201]
+        outcome = queue.pop(0) if len(queue) > 1 else queue[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome)
+
+    monkeypatch.setattr(app.requests, 'get', get)
+    monkeypatch.setattr(app.requests, 'put', put)
+    monkeypatch.setattr(app.time, 'sleep', sleeps.append)
+    return outcomes, received, sleeps
+
+
+HEADERS = {'Authorization': 'OAuth test-token'}
+
+
+def test_upload_is_retried_on_server_error(app, disk):
+    outcomes, received, sleeps = disk
+    outcomes['app:/a.json'] = [503, 500, 201]
+    assert app.upload_to_yadisk(HEADERS, 'app:/a.json', b'data') is True
+    assert received['app:/a.json'] == [b'data'] * 3
+    assert sleeps == [app.YADISK_UPLOAD_RETRY_DELAY, app.YADISK_UPLOAD_RETRY_DELAY * 2]
+
+
+def test_upload_gives_up_after_max_attempts(app, disk):
+    outcomes, received, sleeps = disk
+    outcomes['app:/a.json'] = [502]
+    assert app.upload_to_yadisk(HEADERS, 'app:/a.json', b'data') is False
+    assert len(received['app:/a.json']) == app.YADISK_UPLOAD_RETRIES + 1
+    assert len(sleeps) == app.YADISK_UPLOAD_RETRIES
+
+
+@pytest.mark.parametrize('status', [400, 401, 409])
+def test_client_errors_are_not_retried(app, disk, status):
+    outcomes, received, sleeps = disk
+    outcomes['app:/a.json'] = [status]
+    assert app.upload_to_yadisk(HEADERS, 'app:/a.json', b'data') is False
+    assert len(received['app:/a.json']) == 1
+    assert sleeps == []
+
+
+def test_file_is_resent_from_start_after_network_error(app, disk):
+    outcomes, received, _ = disk
+    outcomes['app:/a.xlsx'] = [requests.ConnectionError('обрыв'), 201]
+    data = io.BytesIO(b'0123456789')
+    assert app.upload_to_yadisk(HEADERS, 'app:/a.xlsx', data) is True
+    assert received['app:/a.xlsx'] == [b'0123456789', b'0123456789']
+
+
+def test_batch_upload_reports_each_file(app, disk):
+    outcomes, received, _ = disk
+    outcomes['app:/b.json'] = [500]
+    outcomes['app:/c.json'] = [429, 201]
+    results = app.upload_files_to_yadisk(HEADERS, {
+        'app:/a.json': b'a',
+        'app:/b.json': b'b',
+        'app:/c.json': b'c'
+    })
+    assert results == {'app:/a.json': True, 'app:/b.json': False, 'app:/c.json': True}
+    assert len(received['app:/c.json']) == 2
+
+
+def test_single_file_upload(app, disk):
+    assert app.upload_files_to_yadisk(HEADERS, {'app:/a.json': b'a'}) == {'app:/a.json': True}
@@ -5,12 +5,17 @@ WSGI-файл для запуска приложения на продакшн-
 """
 
 import threading
-from app import app, run_scheduler, init_backup_settings
+from app import app, run_scheduler, init_backup_settings, start_warmup
 
-# Инициализация настроек резервного копирования
+# Инициализация настроек резервного копирования (только локальные файлы)
 init_backup_settings()
 
-# Запуск планировщика резервного копирования в отдельном потоке
+# Загрузка участников в фоне: воркер сразу принимает запросы, а балансировщик
+# направляет трафик только после готовности /readyz (живость - /healthz)
+start_warmup()
+
+# Запуск планировщика резервного копирования в отдельном потоке; он стартует
+# в каждом воркере, но плановые копии делает только владелец аренды в базе состояния
 backup_thread = threading.Thread(target=run_scheduler, daemon=True)
 backup_thread.start()
 